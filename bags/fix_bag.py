@@ -1,27 +1,35 @@
 import sys
 import os
+import json
+import time
+import shutil
+import struct
+import hashlib
 import argparse
 import subprocess
 import importlib
+from functools import lru_cache
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 def ensure_dependencies():
     """Automatically installs working libraries to a local folder to avoid system conflicts."""
     # Create a local hidden folder for libs next to this script
     lib_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".libs")
-    
+
     # Prioritize this folder in python path
     if lib_dir not in sys.path:
         sys.path.insert(0, lib_dir)
-    
+
     try:
-        import rosbags.ros1
+        import rosbags.rosbag1
     except ImportError:
         print(f"Installing standalone dependencies to {lib_dir}...")
         subprocess.check_call([
             sys.executable, "-m", "pip", "install",
             "--target", lib_dir,
             "--upgrade",
-            "rosbags==0.9.16", "lz4", "numpy<2.0"
+            "rosbags==0.9.16", "lz4", "numpy<2.0", "pyyaml"
         ])
         print("Dependencies ready. Restarting script...")
         # Re-execute the script to ensure the new packages are loaded correctly
@@ -46,31 +54,625 @@ uint8 tag
 uint8 line
 """
 
+LIVOX_ROS1_TYPE = 'livox_ros_driver/msg/CustomMsg'
+LIVOX_ROS2_TYPE = 'livox_ros_driver2/msg/CustomMsg'
+# Scan topics affected by --lidar-every
+LIDAR_TYPES = (LIVOX_ROS1_TYPE, 'sensor_msgs/msg/PointCloud2')
+
+# Keep every Nth point of each CustomMsg (set per process by init_worker)
+POINT_STRIDE = 1
+
+# Humble's yaml-cpp parser expects QoS profiles as a serialized string, not a nested YAML object.
+# /tf_static is latched (transient local); every other topic gets the default empty string.
+TF_STATIC_QOS = [{
+    'history': 1,
+    'depth': 1,
+    'reliability': 1,
+    'durability': 2,
+    'deadline': {'sec': 2147483647, 'nsec': 4294967295},
+    'lifespan': {'sec': 2147483647, 'nsec': 4294967295},
+    'liveliness': 1,
+    'liveliness_lease_duration': {'sec': 2147483647, 'nsec': 4294967295},
+    'avoid_ros_namespace_conventions': False
+}]
+
+# Messages handed to a worker in one go; large enough to amortise the inter-process pickling
+BATCH_SIZE = 256
+
+def register_livox_types():
+    """Registers the old and new Livox type names in this process's rosbags type registry."""
+    from rosbags.typesys import get_types_from_msg, register_types
+
+    # Register the OLD type name so we can read the ROS 1 bag
+    register_types(get_types_from_msg(LIVOX_MSG_DEF, LIVOX_ROS1_TYPE))
+
+    # Register the NEW type name so we can write the ROS 2 bag
+    # We replace the package name in the definition to match livox_ros_driver2
+    ros2_def = LIVOX_MSG_DEF.replace('livox_ros_driver', 'livox_ros_driver2')
+    register_types(get_types_from_msg(ros2_def, LIVOX_ROS2_TYPE))
+
+def bag_msgdefs(reader):
+    """(msgtype, msgdef) of every connection: the message definitions the ROS1 bag carries itself."""
+    return tuple(sorted({(conn.msgtype, conn.msgdef) for conn in reader.connections}))
+
+def register_bag_types(msgdefs):
+    """Registers the bag's own definitions of types rosbags does not know yet, as rosbags-convert does."""
+    from rosbags.typesys import get_types_from_msg, register_types
+    from rosbags.typesys import types
+
+    typs = {}
+    for msgtype, msgdef in msgdefs:
+        typs.update(get_types_from_msg(msgdef, msgtype))
+    # Built-in and Livox types keep their registered layout (the byte-level transcoders rely on it)
+    register_types({name: typ for name, typ in typs.items() if name not in types.FIELDDEFS})
+
+@lru_cache(maxsize=None)
+def init_worker(point_stride=1, msgdefs=()):
+    """Per-process setup, used as the pool initializer and once in the main process."""
+    global POINT_STRIDE
+    POINT_STRIDE = point_stride
+    register_livox_types()
+    register_bag_types(msgdefs)
+
+def keep_point_indices(count, stride):
+    """Every `stride`-th point, in source order, always including the last one.
+
+    FAST-LIO takes a scan's end time from its last point's offset_time, so dropping it would shorten the scan.
+    """
+    import numpy as np
+
+    idx = np.arange(0, count, stride)
+    if count and idx[-1] != count - 1:
+        idx = np.append(idx, count - 1)
+    return idx
+
+@lru_cache(maxsize=None)
+def point_dtypes():
+    """NumPy layouts of one CustomPoint: packed in ROS1, 4-byte aligned (20 byte stride) in CDR."""
+    import numpy as np
+
+    names = ['offset_time', 'x', 'y', 'z', 'reflectivity', 'tag', 'line']
+    formats = ['<u4', '<f4', '<f4', '<f4', 'u1', 'u1', 'u1']
+    ros1 = np.dtype({'names': names, 'formats': formats,
+                     'offsets': [0, 4, 8, 12, 16, 17, 18], 'itemsize': 19})
+    cdr = np.dtype({'names': names, 'formats': formats,
+                    'offsets': [0, 4, 8, 12, 16, 17, 18], 'itemsize': 20})
+    return ros1, cdr
+
+def read_ros1_header(data):
+    """Parses a ROS1 std_msgs/Header. Returns (sec, nanosec, frame_id bytes, end offset)."""
+    _seq, sec, nsec, frame_len = struct.unpack_from('<IIII', data, 0)
+    end = 16 + frame_len
+    return sec, nsec, bytes(data[16:end]), end
+
+def cdr_pad(out, size):
+    """Pads a CDR buffer so the next field is aligned (relative to the 4-byte encapsulation header)."""
+    out += bytes(-(len(out) - 4) % size)
+
+def cdr_header(sec, nsec, frame_id):
+    """Starts a little-endian CDR buffer with std_msgs/Header (ROS 2 has no seq)."""
+    out = bytearray(b'\x00\x01\x00\x00')
+    out += struct.pack('<iII', sec, nsec, len(frame_id) + 1)
+    out += frame_id + b'\x00'
+    return out
+
+def transcode_custom_msg(data):
+    """livox_ros_driver/CustomMsg (ROS1) -> livox_ros_driver2/CustomMsg (CDR) without per-point objects."""
+    import numpy as np
+
+    sec, nsec, frame_id, offset = read_ros1_header(data)
+    timebase, point_num, lidar_id, rsvd, count = struct.unpack_from('<QIB3sI', data, offset)
+    offset += 20
+
+    ros1_point, cdr_point = point_dtypes()
+    if offset + count * ros1_point.itemsize != len(data):
+        raise ValueError('unexpected CustomMsg layout')
+
+    src_points = np.frombuffer(data, dtype=ros1_point, count=count, offset=offset)
+    if POINT_STRIDE > 1:
+        src_points = src_points[keep_point_indices(count, POINT_STRIDE)]
+        count = point_num = len(src_points)
+
+    out = cdr_header(sec, nsec, frame_id)
+    cdr_pad(out, 8)
+    out += struct.pack('<QIB3s', timebase, point_num, lidar_id, rsvd)
+    cdr_pad(out, 4)
+    out += struct.pack('<I', count)
+
+    if count:
+        # Re-lay the packed 19-byte points onto the 20-byte CDR stride in one vector copy
+        points = np.zeros(count, dtype=cdr_point)
+        points[:] = src_points
+        # CDR only pads *between* elements, so the last point has no trailing byte
+        out += memoryview(points).cast('B')[:-1]
+    return bytes(out)
+
+def transcode_imu(data):
+    """sensor_msgs/Imu (ROS1) -> CDR: header re-encoding plus a fixed block of 37 float64."""
+    sec, nsec, frame_id, offset = read_ros1_header(data)
+    # orientation(4) + cov(9) + angular_velocity(3) + cov(9) + linear_acceleration(3) + cov(9)
+    body_len = 37 * 8
+    if offset + body_len != len(data):
+        raise ValueError('unexpected Imu layout')
+
+    out = cdr_header(sec, nsec, frame_id)
+    cdr_pad(out, 8)
+    out += data[offset:]
+    return bytes(out)
+
+# Byte-level fast paths: ros1 type -> (ros2 type, transcoder)
+TRANSCODERS = {
+    LIVOX_ROS1_TYPE: (LIVOX_ROS2_TYPE, transcode_custom_msg),
+    'sensor_msgs/msg/Imu': ('sensor_msgs/msg/Imu', transcode_imu),
+}
+
+def convert_message(msg_type, data):
+    """ROS1 -> CDR for a single message. Returns (ros2 msg type, cdr bytes)."""
+    from rosbags.serde import deserialize_ros1, serialize_cdr
+
+    if msg_type in TRANSCODERS:
+        out_type, transcode = TRANSCODERS[msg_type]
+        try:
+            return out_type, transcode(data)
+        except (struct.error, ValueError):
+            # Anything unexpected goes through the generic (de)serializer below
+            pass
+
+    # If this is the LiDAR topic, swap the type to the new driver
+    if msg_type == LIVOX_ROS1_TYPE:
+        msg = deserialize_ros1(data, LIVOX_ROS1_TYPE)
+        msg_type = LIVOX_ROS2_TYPE
+        if POINT_STRIDE > 1:
+            from dataclasses import replace
+            points = [msg.points[i] for i in keep_point_indices(len(msg.points), POINT_STRIDE)]
+            msg = replace(msg, points=points, point_num=len(points))
+    else:
+        # Convert standard messages (IMU, etc.)
+        msg = deserialize_ros1(data, msg_type)
+    return msg_type, bytes(serialize_cdr(msg, msg_type))
+
+def convert_batch(batch):
+    """Worker stage: converts a list of (topic, msg_type, timestamp, data) in order."""
+    out = []
+    for topic, msg_type, timestamp, data in batch:
+        out_type, cdr = convert_message(msg_type, data)
+        out.append((topic, out_type, timestamp, cdr))
+    return out
+
+def select_messages(reader, selection, resume_from=None):
+    """Reader stage filters: topic allow-list, [start, end] window (ns) and keeping every Nth LiDAR scan."""
+    topics = selection['topics']
+    connections = [c for c in reader.connections if not topics or c.topic in topics]
+    if not connections:
+        raise ValueError(f"None of the requested topics {topics} are in the bag.")
+
+    start = selection['start']
+    if resume_from is not None:
+        start = resume_from if start is None else max(start, resume_from)
+    # rosbags' stop is exclusive, our window end is inclusive
+    stop = selection['end'] + 1 if selection['end'] is not None else None
+
+    every = selection['lidar_every']
+    lidar_conns = [c for c in connections if c.msgtype in LIDAR_TYPES]
+    scans = 0
+    if every > 1 and resume_from is not None and lidar_conns:
+        # Recount the scans before the resume point so decimation keeps the same phase
+        scans = sum(1 for _ in reader.messages(connections=lidar_conns, start=selection['start'], stop=start))
+
+    for conn, timestamp, data in reader.messages(connections=connections, start=start, stop=stop):
+        if every > 1 and conn.msgtype in LIDAR_TYPES:
+            scans += 1
+            if (scans - 1) % every:
+                continue
+        yield conn, timestamp, data
+
+def count_selected(reader, selection):
+    """Messages inside the topic/time selection (before decimation), counted from the bag index alone."""
+    topics, start, end = selection['topics'], selection['start'], selection['end']
+    if not topics and start is None and end is None:
+        return reader.message_count
+    total = 0
+    for conn in reader.connections:
+        if topics and conn.topic not in topics:
+            continue
+        total += sum(1 for entry in reader.indexes[conn.id]
+                     if (start is None or entry.time >= start) and (end is None or entry.time <= end))
+    return total
+
+def read_batches(messages, stats):
+    """Reader stage: groups the selected source messages into fixed-size batches."""
+    batch = []
+    for conn, timestamp, data in messages:
+        batch.append((conn.topic, conn.msgtype, timestamp, data))
+        stats['msgs'] += 1
+        stats['bytes'] += len(data)
+        if len(batch) >= BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def convert_pipelined(messages, write, jobs, stats, point_stride=1, msgdefs=()):
+    """Fans batches out to a process pool and hands results to `write` in source order."""
+    if jobs <= 1:
+        for batch in read_batches(messages, stats):
+            write(convert_batch(batch))
+        return
+
+    # Bounded in-flight window: keeps every worker busy without buffering the whole bag in RAM
+    max_pending = jobs * 4
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=jobs, initializer=init_worker, initargs=(point_stride, msgdefs)) as pool:
+        for batch in read_batches(messages, stats):
+            pending.append(pool.submit(convert_batch, batch))
+            if len(pending) >= max_pending:
+                # Ordered writer stage: always drain the oldest batch first
+                write(pending.popleft().result())
+        while pending:
+            write(pending.popleft().result())
+
+def offered_qos_profiles(topic):
+    import yaml
+    if topic == '/tf_static':
+        return yaml.dump(TF_STATIC_QOS, default_flow_style=False)
+    return ''
+
+def write_humble_metadata(dst, db_files, topics):
+    """Writes a version 5 (ROS 2 Humble) metadata.yaml from the statistics gathered while writing.
+
+    db_files: list of {'path', 'start', 'end', 'count'}; topics: {name: {'type', 'qos', 'count'}}
+    """
+    import yaml
+
+    start = min(f['start'] for f in db_files) if db_files else 0
+    end = max(f['end'] for f in db_files) if db_files else 0
+    info = {
+        'version': 5,
+        # Never leave this empty, Humble refuses to open the bag otherwise
+        'storage_identifier': 'sqlite3',
+        'duration': {'nanoseconds': end - start},
+        'starting_time': {'nanoseconds_since_epoch': start},
+        'message_count': sum(f['count'] for f in db_files),
+        'topics_with_message_count': [{
+            'topic_metadata': {
+                'name': name,
+                'type': t['type'],
+                'serialization_format': 'cdr',
+                'offered_qos_profiles': t['qos'],
+            },
+            'message_count': t['count'],
+        } for name, t in topics.items()],
+        'compression_format': '',
+        'compression_mode': '',
+        'relative_file_paths': [f['path'] for f in db_files],
+        'files': [{
+            'path': f['path'],
+            'starting_time': {'nanoseconds_since_epoch': f['start']},
+            'duration': {'nanoseconds': f['end'] - f['start']},
+            'message_count': f['count'],
+        } for f in db_files],
+    }
+    with open(os.path.join(dst, 'metadata.yaml'), 'w') as f:
+        yaml.safe_dump({'rosbag2_bagfile_information': info}, f, sort_keys=False)
+
+def print_progress(done, total):
+    percent = min(100, 100 * done // total) if total else 100
+    print(f"\r[{'#' * (percent // 2):<50}] {percent}% ({done}/{total} msgs)", end='', flush=True)
+
+CHECKPOINT_NAME = '.fix_bag_checkpoint.json'
+
+class SplitWriter:
+    """Ordered writer stage: writes size/duration bounded .db3 splits and checkpoints each committed one.
+
+    A split is only committed (renamed into place, recorded in the checkpoint and metadata.yaml) once its
+    Writer is closed, so a crash loses at most the split in progress. Splits are only cut between distinct
+    timestamps, which makes 'last committed timestamp + 1' an exact resume point.
+    """
+
+    def __init__(self, src, dst, max_size=None, max_duration=None, total=0, options=None, show_progress=True):
+        self.dst = dst
+        self.name = os.path.basename(os.path.normpath(dst))
+        self.max_size = max_size
+        self.max_duration = int(max_duration * 1e9) if max_duration else None
+        self.total = total
+        self.progress_step = max(1, total // 100)
+        self.show_progress = show_progress
+        self.checkpoint_path = os.path.join(dst, CHECKPOINT_NAME)
+        self.writer = None
+
+        source = {'src': os.path.abspath(src), 'src_size': os.path.getsize(src), 'options': options or {}}
+        self.state = self.load_checkpoint(source)
+        if self.state is None:
+            if os.path.exists(dst) and os.listdir(dst):
+                raise FileExistsError(f"{dst} exists already and has no checkpoint, not overwriting.")
+            os.makedirs(dst, exist_ok=True)
+            self.state = dict(source, files=[], topics={}, last_timestamp=None, complete=False)
+        self.done = sum(f['count'] for f in self.state['files'])
+
+    def load_checkpoint(self, source):
+        if not os.path.exists(self.checkpoint_path):
+            return None
+        with open(self.checkpoint_path) as f:
+            state = json.load(f)
+        if state['src'] != source['src'] or state['src_size'] != source['src_size']:
+            raise ValueError(f"Checkpoint in {self.dst} belongs to a different source bag ({state['src']}).")
+        if state.get('options', {}) != source['options']:
+            raise ValueError(f"Checkpoint in {self.dst} was written with other slicing options: {state.get('options')}")
+        return state
+
+    def save_checkpoint(self):
+        tmp = self.checkpoint_path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.state, f, indent=1)
+        os.replace(tmp, self.checkpoint_path)
+
+    @property
+    def resume_from(self):
+        """First source timestamp that still has to be converted (None = from the beginning)."""
+        last = self.state['last_timestamp']
+        return last + 1 if last is not None else None
+
+    def open_split(self):
+        from rosbags.rosbag2 import Writer
+
+        index = len(self.state['files'])
+        # rosbags' Writer owns a whole directory; write into a scratch one and move the .db3 on commit
+        self.tmp_dir = os.path.join(self.dst, f'.split_{index}')
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+        self.writer = Writer(self.tmp_dir)
+        self.writer.open()
+        self.conn_map = {}
+        self.split = {'path': f'{self.name}_{index}.db3', 'start': None, 'end': None, 'count': 0}
+        self.split_bytes = 0
+        self.split_topics = {}
+
+    def commit_split(self):
+        self.writer.close()
+        self.writer = None
+        os.replace(os.path.join(self.tmp_dir, f'{os.path.basename(self.tmp_dir)}.db3'),
+                   os.path.join(self.dst, self.split['path']))
+        shutil.rmtree(self.tmp_dir)
+
+        for topic, count in self.split_topics.items():
+            self.state['topics'][topic]['count'] += count
+        self.state['files'].append(self.split)
+        self.state['last_timestamp'] = self.split['end']
+        # metadata.yaml always describes the committed splits, so a partial output is already playable
+        write_humble_metadata(self.dst, self.state['files'], self.state['topics'])
+        self.save_checkpoint()
+
+    def should_roll(self, timestamp):
+        if self.split['count'] == 0 or timestamp == self.split['end']:
+            return False
+        if self.max_size and self.split_bytes >= self.max_size:
+            return True
+        return bool(self.max_duration and timestamp - self.split['start'] >= self.max_duration)
+
+    def write(self, results):
+        for topic, msg_type, timestamp, data in results:
+            if self.writer is None:
+                self.open_split()
+            elif self.should_roll(timestamp):
+                self.commit_split()
+                self.open_split()
+
+            if topic not in self.state['topics']:
+                self.state['topics'][topic] = {'type': msg_type, 'qos': offered_qos_profiles(topic), 'count': 0}
+            if topic not in self.conn_map:
+                self.conn_map[topic] = self.writer.add_connection(
+                    topic, msg_type, offered_qos_profiles=self.state['topics'][topic]['qos'])
+            self.writer.write(self.conn_map[topic], timestamp, data)
+
+            if self.split['start'] is None:
+                self.split['start'] = timestamp
+            self.split['end'] = timestamp
+            self.split['count'] += 1
+            self.split_bytes += len(data)
+            self.split_topics[topic] = self.split_topics.get(topic, 0) + 1
+
+            # Progress comes from message counts, no need to poll the output size
+            self.done += 1
+            if self.show_progress and self.done % self.progress_step == 0:
+                print_progress(self.done, self.total)
+
+    def close(self):
+        if self.writer is not None:
+            if self.split['count']:
+                self.commit_split()
+            else:
+                self.writer.close()
+                shutil.rmtree(self.tmp_dir)
+        self.state['complete'] = True
+        write_humble_metadata(self.dst, self.state['files'], self.state['topics'])
+        self.save_checkpoint()
+        if self.show_progress:
+            print_progress(self.done, self.total)
+            print()
+
+    def summary(self):
+        """Message counts and time range of the committed output, as stored in the batch manifest."""
+        files = self.state['files']
+        start = min((f['start'] for f in files), default=None)
+        end = max((f['end'] for f in files), default=None)
+        return {
+            'output': os.path.abspath(self.dst),
+            'message_count': sum(f['count'] for f in files),
+            'topics': {t: {'type': v['type'], 'count': v['count']} for t, v in self.state['topics'].items()},
+            'start_ns': start,
+            'end_ns': end,
+            'duration': (end - start) / 1e9 if files else 0.0,
+        }
+
+def convert_bag(src, dst, jobs=1, max_split_size=None, max_split_duration=None, topics=None,
+                start=None, end=None, lidar_every=1, point_stride=1, show_progress=True):
+    """Converts one ROS1 bag into a Humble bag directory and returns its SplitWriter summary."""
+    from rosbags.rosbag1 import Reader
+
+    stats = {'msgs': 0, 'bytes': 0}
+    start_time = time.time()
+
+    with Reader(src) as reader:
+        # Register the Livox types and the bag's own message definitions in this process
+        # (workers do the same in their initializer)
+        msgdefs = bag_msgdefs(reader)
+        init_worker(point_stride, msgdefs)
+        # Time window arguments are relative to the bag start; the reader works in absolute ns
+        selection = {
+            'topics': sorted(topics) if topics else None,
+            'start': reader.start_time + int(start * 1e9) if start is not None else None,
+            'end': reader.start_time + int(end * 1e9) if end is not None else None,
+            'lidar_every': lidar_every,
+        }
+        options = dict(selection, point_stride=point_stride)
+        total = count_selected(reader, selection)
+
+        splits = SplitWriter(src, dst, max_split_size, max_split_duration, total, options, show_progress)
+        if splits.state['complete']:
+            print(f"{dst} is already fully converted (delete it to convert again).")
+            return splits.summary()
+        if splits.resume_from is not None:
+            print(f"Resuming {src} -> {dst} after {len(splits.state['files'])} committed splits "
+                  f"({splits.done}/{reader.message_count} msgs)...")
+        else:
+            print(f"Converting {src} -> {dst} ({jobs} jobs)...")
+
+        messages = select_messages(reader, selection, splits.resume_from)
+        convert_pipelined(messages, splits.write, jobs, stats, point_stride, msgdefs)
+        splits.close()
+
+    elapsed = max(time.time() - start_time, 1e-9)
+    print(f"Converted {stats['msgs']} messages ({stats['bytes'] / 1e6:.1f} MB) from {os.path.basename(src)} "
+          f"in {elapsed:.1f} s: {stats['msgs'] / elapsed:.0f} msgs/s, {stats['bytes'] / 1e6 / elapsed:.1f} MB/s")
+    return splits.summary()
+
+MANIFEST_NAME = 'manifest.json'
+# Bytes hashed from the head and tail of each source bag (same sampling as src/scripts/result_cache.py)
+HASH_SAMPLE_BYTES = 1024 * 1024
+
+def source_hash(path):
+    """Cheap content hash of a source bag: size plus its first and last HASH_SAMPLE_BYTES."""
+    size = os.path.getsize(path)
+    h = hashlib.sha256(str(size).encode())
+    with open(path, 'rb') as f:
+        if size <= 2 * HASH_SAMPLE_BYTES:
+            h.update(f.read())
+        else:
+            h.update(f.read(HASH_SAMPLE_BYTES))
+            f.seek(-HASH_SAMPLE_BYTES, os.SEEK_END)
+            h.update(f.read(HASH_SAMPLE_BYTES))
+    return h.hexdigest()[:32]
+
+def load_manifest(path):
+    if not os.path.exists(path):
+        return {'version': 1, 'bags': {}}
+    with open(path) as f:
+        return json.load(f)
+
+def save_manifest(path, manifest):
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+def batch_job(src, dst, options):
+    """Worker entry point of the batch queue: converts one bag quietly (no interleaved progress bars)."""
+    ensure_dependencies()
+    return convert_bag(src, dst, show_progress=False, **options)
+
+def convert_directory(src_dir, dst_dir, workers, options):
+    """Converts every .bag in src_dir with at most `workers` conversions in flight, skipping unchanged ones."""
+    os.makedirs(dst_dir, exist_ok=True)
+    manifest_path = os.path.join(dst_dir, MANIFEST_NAME)
+    manifest = load_manifest(manifest_path)
+    # --jobs only changes how fast a bag is converted, not what ends up in it
+    output_options = {k: v for k, v in options.items() if k != 'jobs'}
+
+    bags = sorted(f for f in os.listdir(src_dir) if f.endswith('.bag'))
+    if not bags:
+        print(f"No .bag files found in {src_dir}")
+        return True
+
+    pending = {}
+    for name in bags:
+        src = os.path.join(src_dir, name)
+        dst = os.path.join(dst_dir, name[:-len('.bag')] + '_fixed_ros2')
+        digest = source_hash(src)
+        entry = manifest['bags'].get(name)
+        if entry and entry['source_hash'] == digest and entry['options'] == output_options \
+                and os.path.exists(os.path.join(dst, 'metadata.yaml')):
+            print(f"Skipping {name}: unchanged since the last conversion ({entry['output']})")
+            continue
+        if entry and os.path.abspath(dst) == entry['output']:
+            # The source (or the slicing options) changed: the old output and its checkpoint are stale
+            shutil.rmtree(dst, ignore_errors=True)
+        pending[name] = (src, dst, digest)
+
+    print(f"Converting {len(pending)}/{len(bags)} bags with {workers} workers...")
+    failed = []
+    # The pool bounds the queue: at most `workers` bags are being read and written at any time
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(batch_job, src, dst, options): name for name, (src, dst, _) in pending.items()}
+        for done, future in enumerate(as_completed(futures), 1):
+            name = futures[future]
+            try:
+                summary = future.result()
+            except Exception as e:
+                print(f"[{done}/{len(futures)}] {name} failed: {e}")
+                failed.append(name)
+                continue
+            manifest['bags'][name] = dict(summary, source=os.path.abspath(pending[name][0]),
+                                          source_hash=pending[name][2], options=output_options,
+                                          converted_at=time.strftime('%Y-%m-%d %H:%M:%S'))
+            # Saved after every bag so an interrupted batch still skips what already finished
+            save_manifest(manifest_path, manifest)
+            print(f"[{done}/{len(futures)}] {name}: {summary['message_count']} msgs, {summary['duration']:.1f} s")
+
+    save_manifest(manifest_path, manifest)
+    print(f"Manifest: {manifest_path}")
+    if failed:
+        print(f"Failed ({len(failed)}): {', '.join(failed)} - run again to resume them.")
+    return not failed
+
 def main():
     # 1. Ensure libraries are present before importing them
     ensure_dependencies()
 
-    # 2. Import libraries (now guaranteed to work)
-    from rosbags.ros1 import Reader
-    from rosbags.ros2 import Writer
-    from rosbags.serde import deserialize_ros1, serialize_cdr
-    from rosbags.typesys import get_types_from_msg, register_types, get_typestore, stores
-
     parser = argparse.ArgumentParser(description='Convert Livox ROS1 bag to ROS2 with type renaming.')
-    parser.add_argument('--src', required=True, help='Source ROS1 bag file')
-    parser.add_argument('--dst', help='Destination ROS2 bag directory (optional)')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--src', help='Source ROS1 bag file')
+    source.add_argument('--src-dir', help='Convert every .bag in this directory (batch mode)')
+    parser.add_argument('--dst', help='Destination ROS2 bag directory, or the output root in batch mode (optional)')
+    parser.add_argument('--workers', type=int, default=2,
+                        help='Bags converted concurrently in batch mode')
+    parser.add_argument('--jobs', type=int, default=1,
+                        help=f'Worker processes for (de)serialization (1 = single-threaded, this machine has {os.cpu_count()} cores)')
+    parser.add_argument('--max-split-size', type=int,
+                        help='Start a new .db3 split after this many bytes of message data')
+    parser.add_argument('--max-split-duration', type=float,
+                        help='Start a new .db3 split after this many seconds of bag time')
+    parser.add_argument('--topics', nargs='+', help='Only convert these topics')
+    parser.add_argument('--start', type=float, help='Window start, seconds from the beginning of the bag')
+    parser.add_argument('--end', type=float, help='Window end, seconds from the beginning of the bag')
+    parser.add_argument('--lidar-every', type=int, default=1, help='Keep every Nth LiDAR scan')
+    parser.add_argument('--point-stride', type=int, default=1,
+                        help='Keep every Nth point of each Livox CustomMsg (the last point is always kept)')
     args = parser.parse_args()
 
-    # 3. Register the OLD type name so we can read the ROS 1 bag
-    register_types(get_types_from_msg(LIVOX_MSG_DEF, 'livox_ros_driver/msg/CustomMsg'))
+    options = {
+        'jobs': args.jobs,
+        'max_split_size': args.max_split_size,
+        'max_split_duration': args.max_split_duration,
+        'topics': sorted(args.topics) if args.topics else None,
+        'start': args.start,
+        'end': args.end,
+        'lidar_every': args.lidar_every,
+        'point_stride': args.point_stride,
+    }
 
-    # 4. Register the NEW type name so we can write the ROS 2 bag
-    # We replace the package name in the definition to match livox_ros_driver2
-    ros2_def = LIVOX_MSG_DEF.replace('livox_ros_driver', 'livox_ros_driver2')
-    register_types(get_types_from_msg(ros2_def, 'livox_ros_driver2/msg/CustomMsg'))
+    if args.src_dir:
+        ok = convert_directory(args.src_dir, args.dst or args.src_dir, args.workers, options)
+        sys.exit(0 if ok else 1)
 
-    typestore = get_typestore(stores.ros2)
-    
     # Input and Output filenames
     src = args.src
     if args.dst:
@@ -78,29 +680,8 @@ def main():
     else:
         dst = src.replace('.bag', '') + '_fixed_ros2'
 
-    print(f"Converting {src} -> {dst}...")
-
-    with Reader(src) as reader, Writer(dst) as writer:
-        conn_map = {}
-        for conn, timestamp, data in reader.messages():
-            topic = conn.topic
-            msg_type = conn.msgtype
-
-            # If this is the LiDAR topic, swap the type to the new driver
-            if msg_type == 'livox_ros_driver/msg/CustomMsg':
-                msg_type = 'livox_ros_driver2/msg/CustomMsg'
-                msg = deserialize_ros1(data, 'livox_ros_driver/msg/CustomMsg')
-                data = serialize_cdr(msg, msg_type, typestore)
-            else:
-                # Convert standard messages (IMU, etc.)
-                msg = deserialize_ros1(data, msg_type)
-                data = serialize_cdr(msg, msg_type, typestore)
-
-            if topic not in conn_map:
-                conn_map[topic] = writer.add_connection(topic, msg_type, typestore=typestore)
-            writer.write(conn_map[topic], timestamp, data)
-
+    convert_bag(src, dst, **options)
     print(f"Done! You can now play: ros2 bag play {dst}")
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
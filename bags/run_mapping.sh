@@ -45,8 +45,12 @@ echo "Starting FAST_LIO..."
 ros2 launch fast_lio mapping.launch.py config_file:=avia.yaml > /root/ros2_ws/log/fast_lio_run.log 2>&1 &
 LIO_PID=$!
 
-# Wait a few seconds for the node to initialize
-sleep 5
+# Wait until the node subscribes to its input topics and advertises /map_save
+if ! python3 /root/ros2_ws/src/scripts/node_ready.py avia.yaml --timeout 60; then
+    echo "FAST_LIO did not start, see /root/ros2_ws/log/fast_lio_run.log"
+    kill $LIO_PID
+    exit 1
+fi
 
 # 2. Play the bag
 echo "Playing bag: $BAG_NAME..."
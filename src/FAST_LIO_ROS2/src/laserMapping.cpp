@@ -60,20 +60,35 @@
 #include <geometry_msgs/msg/transform_stamped.hpp>
 #include <geometry_msgs/msg/vector3.hpp>
 #include <livox_ros_driver/msg/custom_msg.hpp>
+#include <fast_lio/msg/frame_timing.hpp>
 #include "preprocess.h"
 #include <ikd-Tree/ikd_Tree.h>
 
 #define INIT_TIME           (0.1)
 #define LASER_POINT_COV     (0.001)
-#define MAXN                (720000)
+#define TIME_LOG_RING       (256)    // time log rows buffered in memory before they are appended to the CSV
+#define TIME_LOG_FLUSH_SEC  (1.0)    // ... or at least this often (wall time), so a crash loses at most ~1 s
 #define PUBFRAME_PERIOD     (20)
 
 /*** Time Log Variables ***/
-double kdtree_incremental_time = 0.0, kdtree_search_time = 0.0, kdtree_delete_time = 0.0;
-double T1[MAXN], s_plot[MAXN], s_plot2[MAXN], s_plot3[MAXN], s_plot4[MAXN], s_plot5[MAXN], s_plot6[MAXN], s_plot7[MAXN], s_plot8[MAXN], s_plot9[MAXN], s_plot10[MAXN], s_plot11[MAXN], s_plot12[MAXN];
+struct TimeLogRow
+{
+    double time_stamp, math_time;
+    int    scan_points;
+    double incremental_time, search_time;
+    int    delete_size;
+    double delete_time;
+    int    tree_size_st, tree_size_end, add_point_size;
+    double preprocess_time, io_time;
+};
+double kdtree_incremental_time = 0.0, kdtree_search_time = 0.0, kdtree_delete_time = 0.0, preprocess_time_last = 0.0;
+TimeLogRow time_log_ring[TIME_LOG_RING];
+int    time_log_pending = 0;
+double time_log_last_flush = 0.0;
+FILE  *fp_time_log = NULL;
 double match_time = 0, solve_time = 0, solve_const_H_time = 0;
 int    kdtree_size_st = 0, kdtree_size_end = 0, add_point_size = 0, kdtree_delete_counter = 0;
-bool   runtime_pos_log = false, pcd_save_en = false, time_sync_en = false, extrinsic_est_en = true, path_en = true;
+bool   runtime_pos_log = false, pcd_save_en = false, time_sync_en = false, extrinsic_est_en = true, path_en = true, telemetry_en = true;
 /**************************/
 
 float res_last[100000] = {0.0};
@@ -85,14 +100,14 @@ mutex mtx_buffer;
 condition_variable sig_buffer;
 
 string root_dir = ROOT_DIR;
-string map_file_path, lid_topic, imu_topic;
+string map_file_path, lid_topic, imu_topic, log_dir;
 
 double res_mean_last = 0.05, total_residual = 0.0;
 double last_timestamp_lidar = 0, last_timestamp_imu = -1.0;
 double gyr_cov = 0.1, acc_cov = 0.1, b_gyr_cov = 0.0001, b_acc_cov = 0.0001;
 double filter_size_corner_min = 0, filter_size_surf_min = 0, filter_size_map_min = 0, fov_deg = 0;
 double cube_len = 0, HALF_FOV_COS = 0, FOV_DEG = 0, total_distance = 0, lidar_end_time = 0, first_lidar_time = 0.0;
-int    effct_feat_num = 0, time_log_counter = 0, scan_count = 0, publish_count = 0;
+int    effct_feat_num = 0, scan_count = 0, publish_count = 0;
 int    iterCount = 0, feats_down_size = 0, NUM_MAX_ITERATIONS = 0, laserCloudValidNum = 0, pcd_save_interval = -1, pcd_index = 0;
 bool   point_selected_surf[100000] = {0};
 bool   lidar_pushed, flg_first_scan = true, flg_exit = false, flg_EKF_inited;
@@ -167,6 +182,47 @@ inline void dump_lio_state_to_log(FILE *fp)
     fflush(fp);
 }
 
+void open_time_log()
+{
+    string time_log_path = log_dir + "/fast_lio_time_log.csv";
+    fp_time_log = fopen(time_log_path.c_str(), "w");
+    if (fp_time_log == NULL) return;
+    fprintf(fp_time_log, "time_stamp, math_time, scan point size, incremental time, search time, delete size, delete time, tree size st, tree size end, add point size, preprocess time, io_time\n");
+    fflush(fp_time_log);
+    time_log_pending = 0;
+    time_log_last_flush = omp_get_wtime();
+}
+
+void flush_time_log()
+{
+    if (fp_time_log == NULL) return;
+    for (int i = 0; i < time_log_pending; i++)
+    {
+        const TimeLogRow &r = time_log_ring[i];
+        fprintf(fp_time_log, "%0.8f,%0.8f,%d,%0.8f,%0.8f,%d,%0.8f,%d,%d,%d,%0.8f,%0.8f\n", r.time_stamp, r.math_time, r.scan_points, r.incremental_time,
+                r.search_time, r.delete_size, r.delete_time, r.tree_size_st, r.tree_size_end, r.add_point_size, r.preprocess_time, r.io_time);
+    }
+    // Whole rows only, so a reader tailing the file never sees a half-written line from a completed flush
+    fflush(fp_time_log);
+    time_log_pending = 0;
+    time_log_last_flush = omp_get_wtime();
+}
+
+void append_time_log(const TimeLogRow &row)
+{
+    time_log_ring[time_log_pending++] = row;
+    if (time_log_pending == TIME_LOG_RING || omp_get_wtime() - time_log_last_flush >= TIME_LOG_FLUSH_SEC)
+        flush_time_log();
+}
+
+void close_time_log()
+{
+    if (fp_time_log == NULL) return;
+    flush_time_log();
+    fclose(fp_time_log);
+    fp_time_log = NULL;
+}
+
 void pointBodyToWorld_ikfom(PointType const * const pi, PointType * const po, state_ikfom &s)
 {
     V3D p_body(pi->x, pi->y, pi->z);
@@ -301,7 +357,7 @@ void standard_pcl_cbk(const sensor_msgs::msg::PointCloud2::UniquePtr msg)
     lidar_buffer.push_back(ptr);
     time_buffer.push_back(cur_time);
     last_timestamp_lidar = cur_time;
-    s_plot11[scan_count] = omp_get_wtime() - preprocess_start_time;
+    preprocess_time_last = omp_get_wtime() - preprocess_start_time;
     mtx_buffer.unlock();
     sig_buffer.notify_all();
 }
@@ -342,7 +398,7 @@ void livox_pcl_cbk(const livox_ros_driver::msg::CustomMsg::UniquePtr msg)
     lidar_buffer.push_back(ptr);
     time_buffer.push_back(last_timestamp_lidar);
     
-    s_plot11[scan_count] = omp_get_wtime() - preprocess_start_time;
+    preprocess_time_last = omp_get_wtime() - preprocess_start_time;
     mtx_buffer.unlock();
     sig_buffer.notify_all();
 }
@@ -803,8 +859,10 @@ public:
         this->declare_parameter<bool>("publish.scan_publish_en", true);
         this->declare_parameter<bool>("publish.dense_publish_en", true);
         this->declare_parameter<bool>("publish.scan_bodyframe_pub_en", true);
+        this->declare_parameter<bool>("publish.telemetry_en", true);
         this->declare_parameter<int>("max_iteration", 4);
         this->declare_parameter<string>("map_file_path", "");
+        this->declare_parameter<string>("log_dir", "");
         this->declare_parameter<string>("common.lid_topic", "/livox/lidar");
         this->declare_parameter<string>("common.imu_topic", "/livox/imu");
         this->declare_parameter<bool>("common.time_sync_en", false);
@@ -839,8 +897,12 @@ public:
         this->get_parameter_or<bool>("publish.scan_publish_en", scan_pub_en, true);
         this->get_parameter_or<bool>("publish.dense_publish_en", dense_pub_en, true);
         this->get_parameter_or<bool>("publish.scan_bodyframe_pub_en", scan_body_pub_en, true);
+        this->get_parameter_or<bool>("publish.telemetry_en", telemetry_en, true);
         this->get_parameter_or<int>("max_iteration", NUM_MAX_ITERATIONS, 4);
         this->get_parameter_or<string>("map_file_path", map_file_path, "");
+        this->get_parameter_or<string>("log_dir", log_dir, "");
+        // Empty keeps the package Log/ folder; concurrent runs pass their own directory
+        if (log_dir.empty()) log_dir = root_dir + "/Log";
         this->get_parameter_or<string>("common.lid_topic", lid_topic, "/livox/lidar");
         this->get_parameter_or<string>("common.imu_topic", imu_topic,"/livox/imu");
         this->get_parameter_or<bool>("common.time_sync_en", time_sync_en, false);
@@ -904,13 +966,14 @@ public:
 
         /*** debug record ***/
         // FILE *fp;
-        string pos_log_dir = root_dir + "/Log/pos_log.txt";
+        string pos_log_dir = log_dir + "/pos_log.txt";
         fp = fopen(pos_log_dir.c_str(),"w");
+        if (runtime_pos_log) open_time_log();
 
         // ofstream fout_pre, fout_out, fout_dbg;
-        fout_pre.open(DEBUG_FILE_DIR("mat_pre.txt"),ios::out);
-        fout_out.open(DEBUG_FILE_DIR("mat_out.txt"),ios::out);
-        fout_dbg.open(DEBUG_FILE_DIR("dbg.txt"),ios::out);
+        fout_pre.open(log_dir + "/mat_pre.txt",ios::out);
+        fout_out.open(log_dir + "/mat_out.txt",ios::out);
+        fout_dbg.open(log_dir + "/dbg.txt",ios::out);
         if (fout_pre && fout_out)
             cout << "~~~~"<<ROOT_DIR<<" file opened" << endl;
         else
@@ -935,6 +998,8 @@ public:
         pubLaserCloudMap_ = this->create_publisher<sensor_msgs::msg::PointCloud2>("/Laser_map", 20);
         pubOdomAftMapped_ = this->create_publisher<nav_msgs::msg::Odometry>("/Odometry", 20);
         pubPath_ = this->create_publisher<nav_msgs::msg::Path>("/path", 20);
+        // Reliable with a deep queue: the harness must see every frame, records are ~130 bytes
+        pubFrameTiming_ = this->create_publisher<fast_lio::msg::FrameTiming>("/frame_timing", rclcpp::QoS(rclcpp::KeepLast(1000)).reliable());
         tf_broadcaster_ = std::make_unique<tf2_ros::TransformBroadcaster>(*this);
 
         //------------------------------------------------------------------------------------------------------
@@ -1078,6 +1143,34 @@ private:
             // if (map_pub_en) publish_map(pubLaserCloudMap_);
             t6 = omp_get_wtime();
 
+            /******* Per-frame telemetry *******/
+            if (telemetry_en)
+            {
+                fast_lio::msg::FrameTiming rec;
+                rec.lidar_beg_time = Measures.lidar_beg_time;
+                rec.lidar_end_time = Measures.lidar_end_time;
+                rec.imu_map_downsample = t1 - t0;
+                rec.match_time = match_time;
+                rec.solve_time = solve_time;
+                rec.solve_h_time = solve_H_time;
+                rec.icp_time = t_update_end - t_update_start;
+                rec.map_incre_time = t5 - t3;
+                rec.total_time = t5 - t0;
+                rec.publish_time = t6 - t5;
+                rec.kdtree_search_time = kdtree_search_time;
+                rec.kdtree_delete_time = kdtree_delete_time;
+                rec.kdtree_incremental_time = kdtree_incremental_time;
+                rec.seq = telemetry_seq++;
+                rec.scan_points = feats_undistort->points.size();
+                rec.down_points = feats_down_size;
+                rec.effect_points = effct_feat_num;
+                rec.tree_size_st = kdtree_size_st;
+                rec.tree_size_end = ikdtree.size();
+                rec.add_points = add_point_size;
+                rec.delete_points = kdtree_delete_counter;
+                pubFrameTiming_->publish(rec);
+            }
+
             /*** Debug variables ***/
             if (runtime_pos_log)
             {
@@ -1089,19 +1182,9 @@ private:
                 aver_time_incre = aver_time_incre * (frame_num - 1)/frame_num + (kdtree_incremental_time)/frame_num;
                 aver_time_solve = aver_time_solve * (frame_num - 1)/frame_num + (solve_time + solve_H_time)/frame_num;
                 aver_time_const_H_time = aver_time_const_H_time * (frame_num - 1)/frame_num + solve_time / frame_num;
-                T1[time_log_counter] = Measures.lidar_beg_time;
-                s_plot[time_log_counter] = t5 - t0;
-                s_plot2[time_log_counter] = feats_undistort->points.size();
-                s_plot3[time_log_counter] = kdtree_incremental_time;
-                s_plot4[time_log_counter] = kdtree_search_time;
-                s_plot5[time_log_counter] = kdtree_delete_counter;
-                s_plot6[time_log_counter] = kdtree_delete_time;
-                s_plot7[time_log_counter] = kdtree_size_st;
-                s_plot8[time_log_counter] = kdtree_size_end;
-                s_plot9[time_log_counter] = aver_time_consu;
-                s_plot10[time_log_counter] = add_point_size;
-                s_plot12[time_log_counter] = t6 - t5;
-                time_log_counter ++;
+                append_time_log({Measures.lidar_beg_time, t5 - t0, int(feats_undistort->points.size()),
+                                 kdtree_incremental_time, kdtree_search_time, kdtree_delete_counter, kdtree_delete_time,
+                                 kdtree_size_st, kdtree_size_end, add_point_size, preprocess_time_last, t6 - t5});
                 printf("[ mapping ]: time: IMU + Map + Input Downsample: %0.6f ave match: %0.6f ave solve: %0.6f  ave ICP: %0.6f  map incre: %0.6f ave total: %0.6f icp: %0.6f construct H: %0.6f \n",t1-t0,aver_time_match,aver_time_solve,t3-t1,t5-t3,aver_time_consu,aver_time_icp, aver_time_const_H_time);
                 ext_euler = SO3ToEuler(state_point.offset_R_L_I);
                 fout_out << setw(20) << Measures.lidar_beg_time - first_lidar_time << " " << euler_cur.transpose() << " " << state_point.pos.transpose()<< " " << ext_euler.transpose() << " "<<state_point.offset_T_L_I.transpose()<<" "<< state_point.vel.transpose() \
@@ -1139,6 +1222,7 @@ private:
     rclcpp::Publisher<sensor_msgs::msg::PointCloud2>::SharedPtr pubLaserCloudMap_;
     rclcpp::Publisher<nav_msgs::msg::Odometry>::SharedPtr pubOdomAftMapped_;
     rclcpp::Publisher<nav_msgs::msg::Path>::SharedPtr pubPath_;
+    rclcpp::Publisher<fast_lio::msg::FrameTiming>::SharedPtr pubFrameTiming_;
     rclcpp::Subscription<sensor_msgs::msg::Imu>::SharedPtr sub_imu_;
     rclcpp::Subscription<sensor_msgs::msg::PointCloud2>::SharedPtr sub_pcl_pc_;
     rclcpp::Subscription<livox_ros_driver::msg::CustomMsg>::SharedPtr sub_pcl_livox_;
@@ -1150,6 +1234,7 @@ private:
 
     bool effect_pub_en = false, map_pub_en = false;
     int effect_feat_num = 0, frame_num = 0;
+    uint32_t telemetry_seq = 0;
     double deltaT, deltaR, aver_time_consu = 0, aver_time_icp = 0, aver_time_match = 0, aver_time_incre = 0, aver_time_solve = 0, aver_time_const_H_time = 0;
     bool flg_EKF_converged, EKF_stop_flg = 0;
     double epsi[23] = {0.001};
@@ -1168,6 +1253,10 @@ int main(int argc, char** argv)
 
     if (rclcpp::ok())
         rclcpp::shutdown();
+
+    // The time log is streamed during the run; only the last partially filled ring is left to write
+    close_time_log();
+
     /**************** save map ****************/
     /* 1. make sure you have enough memories
     /* 2. pcd save will largely influence the real-time performences **/
@@ -1180,23 +1269,5 @@ int main(int argc, char** argv)
         pcd_writer.writeBinary(all_points_dir, *pcl_wait_save);
     }
 
-    if (runtime_pos_log)
-    {
-        vector<double> t, s_vec, s_vec2, s_vec3, s_vec4, s_vec5, s_vec6, s_vec7;    
-        FILE *fp2;
-        string log_dir = root_dir + "/Log/fast_lio_time_log.csv";
-        fp2 = fopen(log_dir.c_str(),"w");
-        fprintf(fp2,"time_stamp, math_time, scan point size, incremental time, search time, delete size, delete time, tree size st, tree size end, add point size, preprocess time, io_time\n");
-        for (int i = 0;i<time_log_counter; i++){
-            fprintf(fp2,"%0.8f,%0.8f,%d,%0.8f,%0.8f,%d,%0.8f,%d,%d,%d,%0.8f,%0.8f\n",T1[i],s_plot[i],int(s_plot2[i]),s_plot3[i],s_plot4[i],int(s_plot5[i]),s_plot6[i],int(s_plot7[i]),int(s_plot8[i]), int(s_plot10[i]), s_plot11[i], s_plot12[i]);
-            t.push_back(T1[i]);
-            s_vec.push_back(s_plot9[i]);
-            s_vec2.push_back(s_plot3[i] + s_plot6[i]);
-            s_vec3.push_back(s_plot4[i]);
-            s_vec5.push_back(s_plot[i]);
-        }
-        fclose(fp2);
-    }
-
     return 0;
 }
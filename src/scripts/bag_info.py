@@ -0,0 +1,89 @@
+# Purpose: In-process replacement for 'ros2 bag info'. Combines metadata.yaml (duration, message counts)
+#          with the storage index (first/last stamp per topic) without starting the ROS 2 CLI.
+#          Usage: python3 bag_info.py [BAG_PATH]
+
+import sys
+import sqlite3
+from pathlib import Path
+import yaml
+from bag_access import read_metadata, read_manifest_entry, open_bag
+
+def _ms(ns):
+    return ns / 1e6
+
+def bag_info(bag_path):
+    """Returns duration, start/end stamps (ms) and per-topic type/count/rate/start/end of a bag.
+
+    Raises FileNotFoundError / ValueError instead of guessing a duration when the bag cannot be read.
+    """
+    try:
+        return _read_info(Path(bag_path))
+    except (sqlite3.Error, yaml.YAMLError, ImportError) as e:
+        # Corrupt or locked .db3, broken metadata.yaml, no mcap reader: callers only handle OSError / ValueError
+        raise ValueError(f"Cannot read bag {bag_path}: {e}") from e
+
+def _read_info(bag_path):
+    meta = read_metadata(bag_path) if bag_path.is_dir() else None
+    # metadata.yaml already carries the counts; only bags without one need counting queries
+    meta_counts = {}
+    if meta:
+        for t in meta.get("topics_with_message_count", []):
+            meta_counts[t["topic_metadata"]["name"]] = t["message_count"]
+
+    with open_bag(bag_path) as reader:
+        types = reader.topics()
+        ranges = reader.time_ranges()
+        topics = {}
+        for name, msg_type in sorted(types.items()):
+            count = meta_counts[name] if name in meta_counts else reader.count([name])
+            first, last = ranges.get(name, (None, None))
+            span = (last - first) / 1e9 if first is not None else 0.0
+            topics[name] = {
+                "type": msg_type,
+                "count": count,
+                # Messages per second over the topic's own span (n - 1 intervals)
+                "rate_hz": (count - 1) / span if count > 1 and span > 0 else 0.0,
+                "start_ms": _ms(first) if first is not None else None,
+                "end_ms": _ms(last) if last is not None else None,
+            }
+
+    if not ranges:
+        raise ValueError(f"Bag {bag_path} contains no messages")
+    start = min(r[0] for r in ranges.values())
+    end = max(r[1] for r in ranges.values())
+
+    if meta and "duration" in meta:
+        # Same number 'ros2 bag info' prints as "Duration:"
+        duration = meta["duration"]["nanoseconds"] / 1e9
+    else:
+        duration = (end - start) / 1e9
+
+    return {
+        "path": str(bag_path),
+        "duration": duration,
+        "start_ms": _ms(start),
+        "end_ms": _ms(end),
+        "message_count": sum(t["count"] for t in topics.values()),
+        "topics": topics,
+        # Source bag / hash if the bag came out of 'fix_bag.py --src-dir'
+        "conversion": read_manifest_entry(bag_path),
+    }
+
+def get_bag_duration(bag_path):
+    """Bag duration in seconds (raises if the bag cannot be read)."""
+    return bag_info(bag_path)["duration"]
+
+def print_bag_info(info):
+    print(f"Bag:       {info['path']}")
+    print(f"Duration:  {info['duration']:.3f}s")
+    print(f"Start:     {info['start_ms']:.3f} ms")
+    print(f"End:       {info['end_ms']:.3f} ms")
+    print(f"Messages:  {info['message_count']}")
+    for name, t in info["topics"].items():
+        print(f"  {name:<30} {t['type']:<40} {t['count']:>8} msgs {t['rate_hz']:>9.2f} Hz")
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python3 bag_info.py [BAG_PATH]")
+    else:
+        print_bag_info(bag_info(sys.argv[1]))
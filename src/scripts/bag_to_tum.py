@@ -1,74 +1,127 @@
 import sys
-from pathlib import Path
+import struct
+import numpy as np
 from rclpy.serialization import deserialize_message
 from rosidl_runtime_py.utilities import get_message
-import rosbag2_py
+from bag_access import open_bag
 
-def get_rosbag_options(path, storage_id='sqlite3'):
-    storage_options = rosbag2_py.StorageOptions(uri=path, storage_id=storage_id)
-    converter_options = rosbag2_py.ConverterOptions(
-        input_serialization_format='cdr',
-        output_serialization_format='cdr')
-    return storage_options, converter_options
+# One TUM line: timestamp tx ty tz qx qy qz qw ('%r' keeps the full float repr)
+TUM_LINE_FMT = "%.6f %r %r %r %r %r %r %r\n"
 
-def extract_odometry(bag_path, output_file, topic_name='/Odometry'):
-    print(f"Reading: {bag_path}")
-    
-    # Handle both direct file (.db3) or folder path inputs
-    bag_path_obj = Path(bag_path)
-    if bag_path_obj.is_file():
-        read_path = str(bag_path_obj.parent) # ROS 2 reader needs the folder
-    else:
-        read_path = str(bag_path_obj)
+def _align(offset, size):
+    # CDR aligns primitives relative to the end of the 4-byte encapsulation header
+    return 4 + ((offset - 4 + size - 1) // size) * size
+
+def odometry_layout(blob):
+    """Returns the numpy dtype describing a raw CDR nav_msgs/Odometry blob, or None if unsupported."""
+    # Encapsulation header: 0x00 0x01 = CDR little endian
+    if len(blob) < 16 or blob[0] != 0 or blob[1] != 1:
+        return None
+
+    # header.stamp (int32 sec, uint32 nanosec) + header.frame_id (uint32 length incl. NUL)
+    (frame_len,) = struct.unpack_from('<I', blob, 12)
+    offset = _align(16 + frame_len, 4)
+    if offset + 4 > len(blob):
+        return None
+    (child_len,) = struct.unpack_from('<I', blob, offset)
+
+    # pose.pose.position (3 doubles) followed by pose.pose.orientation (4 doubles)
+    pose_offset = _align(offset + 4 + child_len, 8)
+    if pose_offset + 7 * 8 > len(blob):
+        return None
+
+    return np.dtype({
+        'names': ['sec', 'nanosec', 'frame_len', 'child_len', 'pose'],
+        'formats': ['<i4', '<u4', '<u4', '<u4', ('<f8', 7)],
+        'offsets': [4, 8, 12, offset, pose_offset],
+        'itemsize': len(blob),
+    })
+
+def decode_odometry_batch(blobs):
+    """Decodes raw Odometry blobs straight into an (N, 8) TUM array, or returns None if the layout varies."""
+    if not blobs:
+        return np.empty((0, 8))
+
+    layout = odometry_layout(blobs[0])
+    if layout is None:
+        return None
+
+    # Every message must share the exact same byte layout for the strided view to be valid
+    size = layout.itemsize
+    if any(len(b) != size or b[:2] != blobs[0][:2] for b in blobs):
+        return None
+
+    records = np.frombuffer(b''.join(blobs), dtype=layout)
+    first = records[0]
+    if np.any(records['frame_len'] != first['frame_len']) or np.any(records['child_len'] != first['child_len']):
+        return None
+
+    tum = np.empty((len(records), 8))
+    tum[:, 0] = records['sec'] + records['nanosec'] * 1e-9
+    tum[:, 1:] = records['pose']
+    return tum
+
+def decode_odometry_slow(blobs, msg_class):
+    """Fallback: full rclpy deserialization of every message."""
+    tum = np.empty((len(blobs), 8))
+    for i, data in enumerate(blobs):
+        msg = deserialize_message(data, msg_class)
+        position = msg.pose.pose.position
+        orientation = msg.pose.pose.orientation
+        tum[i] = (msg.header.stamp.sec + msg.header.stamp.nanosec * 1e-9,
+                  position.x, position.y, position.z,
+                  orientation.x, orientation.y, orientation.z, orientation.w)
+    return tum
 
+def write_tum(output_file, tum):
+    # Build the whole file in memory and write it once
+    with open(output_file, 'w') as f:
+        f.write(''.join(TUM_LINE_FMT % tuple(row) for row in tum.tolist()))
+
+def read_odometry(bag_path, topic_name='/Odometry', start=None, end=None):
+    """Reads an odometry topic into an (N, 8) TUM array, or returns None on error."""
+    # Handles both direct file (.db3 / .mcap) and folder path inputs
     try:
-        storage_opts, converter_opts = get_rosbag_options(read_path)
-        reader = rosbag2_py.SequentialReader()
-        reader.open(storage_opts, converter_opts)
+        reader = open_bag(bag_path)
     except Exception as e:
         print(f"Error opening bag: {e}")
-        return
+        return None
 
-    # Dynamic topic type discovery
-    topic_types = reader.get_all_topics_and_types()
-    type_map = {t.name: t.type for t in topic_types}
-    
-    if topic_name not in type_map:
-        print(f"Error: Topic '{topic_name}' not found.")
-        print(f"Available topics: {list(type_map.keys())}")
-        return
+    with reader:
+        # Dynamic topic type discovery
+        type_map = reader.topics()
+
+        if topic_name not in type_map:
+            print(f"Error: Topic '{topic_name}' not found.")
+            print(f"Available topics: {list(type_map.keys())}")
+            return None
+
+        msg_type_str = type_map[topic_name]
 
-    msg_type_str = type_map[topic_name]
-    msg_class = get_message(msg_type_str)
+        # Topic and time-window (ns) filters run inside the storage query; decoding happens in one batch afterwards
+        blobs = [bytes(data) for _, _, data in reader.messages(topics=[topic_name], start=start, end=end)]
 
-    # Filter for our topic
-    storage_filter = rosbag2_py.StorageFilter(topics=[topic_name])
-    reader.set_filter(storage_filter)
+    tum = None
+    if msg_type_str == 'nav_msgs/msg/Odometry':
+        tum = decode_odometry_batch(blobs)
+    if tum is None:
+        print("Unexpected message layout, falling back to per-message deserialization...")
+        tum = decode_odometry_slow(blobs, get_message(msg_type_str))
+    return tum
 
+def extract_odometry(bag_path, output_file, topic_name='/Odometry', start=None, end=None):
+    print(f"Reading: {bag_path}")
     print(f"Extracting {topic_name} to {output_file}...")
-    
-    count = 0
-    with open(output_file, 'w') as f:
-        while reader.has_next():
-            (topic, data, t) = reader.read_next()
-            msg = deserialize_message(data, msg_class)
-            
-            # Format: timestamp tx ty tz qx qy qz qw
-            # Time must be in seconds (float)
-            timestamp = msg.header.stamp.sec + msg.header.stamp.nanosec * 1e-9
-            
-            tx = msg.pose.pose.position.x
-            ty = msg.pose.pose.position.y
-            tz = msg.pose.pose.position.z
-            qx = msg.pose.pose.orientation.x
-            qy = msg.pose.pose.orientation.y
-            qz = msg.pose.pose.orientation.z
-            qw = msg.pose.pose.orientation.w
-            
-            f.write(f"{timestamp:.6f} {tx} {ty} {tz} {qx} {qy} {qz} {qw}\n")
-            count += 1
-
-    print(f"Done! Extracted {count} poses.")
+
+    tum = read_odometry(bag_path, topic_name, start, end)
+    if tum is None:
+        return
+
+    # Format: timestamp tx ty tz qx qy qz qw
+    # Time must be in seconds (float)
+    write_tum(output_file, tum)
+
+    print(f"Done! Extracted {len(tum)} poses.")
 
 if __name__ == "__main__":
     if len(sys.argv) < 3:
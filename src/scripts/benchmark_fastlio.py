@@ -4,13 +4,19 @@
 #          It calculates average processing times and saves the results to CSV and log files.
 
 import subprocess  # Import subprocess to run shell commands
-import re  # Import re for regular expression matching
 import os  # Import os for operating system dependent functionality
 import csv  # Import csv for reading and writing CSV files
 import time  # Import time for time-related functions
 import sys  # Import sys for system-specific parameters and functions
 import signal # Import signal for SIGINT
 from pathlib import Path  # Import Path for object-oriented filesystem paths
+from bag_info import bag_info  # In-process bag introspection (replaces 'ros2 bag info')
+import stream_health  # Input stream (IMU / LiDAR timestamp) health check
+import telemetry  # Per-frame timing records from /frame_timing
+from node_ready import wait_for_mapping_node  # Graph query for node readiness (replaces the startup sleep)
+from latency_hist import LatencyHistogram, format_summary  # Fixed-memory percentile / deadline statistics
+from results_db import record_run  # Run metadata and per-frame timings in the SQLite results store
+from orchestrator import Orchestrator, stop_process  # In-process player / odometry subscriber (replaces the ros2 CLI)
 
 def run_benchmark(bag_path, config="avia.yaml"):  # Define the main benchmark function taking bag path and config file
     # 1. Setup Paths - Directing to your specific results folder
@@ -28,12 +34,20 @@ def run_benchmark(bag_path, config="avia.yaml"):  # Define the main benchmark fu
     
     # 2. Get bag duration for progress bar
     print(f" Analyzing bag: {bag_name}...")  # Print status message
-    info_proc = subprocess.run(['ros2', 'bag', 'info', bag_path], capture_output=True, text=True)  # Run 'ros2 bag info' to get bag metadata
-    duration_match = re.search(r"Duration:\s+(\d+\.\d+)s", info_proc.stdout)  # Search for the duration in the output using regex
-    if not duration_match:  # Check if duration was found
-        print("Could not determine bag duration. Check if the bag path is correct.")  # Print error if not found
+    try:
+        info = bag_info(bag_path)  # Read metadata.yaml and the storage index in-process
+    except (OSError, ValueError) as e:  # Unreadable or empty bag
+        print(f"Could not determine bag duration ({e}). Check if the bag path is correct.")  # Print error
         return  # Exit the function
-    total_duration = float(duration_match.group(1))  # Parse the duration string to a float
+    total_duration = info["duration"]  # Bag duration in seconds
+
+    # Check the input streams first so drops can be told apart from input gaps / reorderings
+    try:
+        health, scans = stream_health.analyze_bag(bag_path)  # Vectorized timestamp analysis (seconds for a 1 h bag)
+        stream_health.print_report(health)  # Print rates, jitter and warnings
+        stream_health.save_report(health, scans, results_dir / f"{bag_name}_stream_health")  # Save JSON + per-scan CSV
+    except (OSError, ValueError) as e:  # Missing IMU / LiDAR topic or unreadable bag
+        print(f"Stream health check skipped: {e}")  # Not fatal for the benchmark itself
 
     # 3. Open files
     log_file = open(log_file_path, "w")  # Open the log file for writing
@@ -41,26 +55,36 @@ def run_benchmark(bag_path, config="avia.yaml"):  # Define the main benchmark fu
     csv_writer = csv.writer(csv_file)  # Create a CSV writer object
     csv_writer.writerow(["IMU_Map_Downsample", "ave_match", "ave_solve", "ave_ICP", "map_incre", "ave_total", "icp", "construct_H"])  # Write the header row to the CSV
 
-    # 4. Start FAST-LIO
+    # 4. Start FAST-LIO (the telemetry subscriber listens before the node starts publishing)
+    listener = telemetry.TelemetryListener().start()  # Collects raw /frame_timing records in a background thread
+    orchestrator = Orchestrator().start()  # rclpy executor thread for playback control and /Odometry
+    orchestrator.write_trajectory(results_dir / f"{bag_name}_trajectory.tum")  # TUM poses appended while mapping runs
     print(f"Launching FAST-LIO with config: {config}")  # Print launch status
     # Using stdbuf to prevent output buffering so we can parse logs in real-time
     mapping_cmd = ['stdbuf', '-oL', 'ros2', 'launch', 'fast_lio', 'mapping.launch.py', f'config_file:={config}', 'rviz:=false']  # Construct the launch command
     mapping_proc = subprocess.Popen(mapping_cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)  # Start the process, capturing stdout
    
-    # === ADDING THIS BLOCK TO FIX THE STARTUP DROP ISSUE ===
-    print("Waiting 20 seconds for node to initialise...")
-    time.sleep(20) 
-   
+    # Playback starts the moment the node subscribes to its inputs and serves /map_save (no startup drops)
+    print("Waiting for node to initialise...")  # Print readiness status
+    waited = wait_for_mapping_node(config, proc=mapping_proc)  # Poll the ROS graph until fastlio_mapping is ready
+    if waited is None:  # Launch failed or the node never subscribed
+        print("FAST-LIO did not become ready, aborting.")  # Report the failure
+        mapping_proc.send_signal(signal.SIGINT)  # Stop whatever did start
+        listener.stop()  # Shut the subscriber down
+        orchestrator.close()  # Shut the orchestrator node down
+        log_file.close()  # Close the log file
+        csv_file.close()  # Close the CSV file
+        return  # Nothing to benchmark
+    print(f"Node ready after {waited:.2f} s")  # Print how long startup took
+
 
     # 5. Start Bag Playback (Removed 
     print(f" Playing bag...")  # Print playback status
-    bag_cmd = ['ros2', 'bag', 'play', bag_path]  # Construct the bag play command
-    # Redirect bag output to DEVNULL so it doesn't clutter the progress bar
-    subprocess.Popen(bag_cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)  # Start bag playback in background, silencing output
+    play_proc = orchestrator.play(bag_path)  # rosbag2_py player child, output silenced so it doesn't clutter the progress bar
 
     # 6. Monitor and Parse
     start_time = time.time()  # Record the start time
-    latencies = []  # Initialize list to store latency values
+    hist = LatencyHistogram()  # Per-frame latencies in constant memory
     
     print(f"Benchmarking in progress...")  # Print benchmark status
     
@@ -69,16 +93,7 @@ def run_benchmark(bag_path, config="avia.yaml"):  # Define the main benchmark fu
             line = mapping_proc.stdout.readline()  # Read a line from the FAST-LIO process output
             if not line: break  # Break loop if no more output (process ended)
             
-            if "ave total:" in line:  # Check if the line contains timing information
-                log_file.write(line)  # Write the raw line to the log file
-                # Regex to grab the timing values
-                pattern = r"Downsample:\s*([\d\.]+).*match:\s*([\d\.]+).*solve:\s*([\d\.]+).*ICP:\s*([\d\.]+).*incre:\s*([\d\.]+).*total:\s*([\d\.]+).*icp:\s*([\d\.]+).*H:\s*([\d\.]+)"  # Define regex pattern for metrics
-                match = re.search(pattern, line)  # Search for pattern in the line
-                
-                if match:  # If pattern matches
-                    vals = [float(x) for x in match.groups()]  # Convert matched groups to floats
-                    csv_writer.writerow(vals)  # Write values to CSV
-                    latencies.append(vals[5]) # ave_total  # Append total time to latencies list
+            log_file.write(line)  # Write the raw line to the log file (timing values come from telemetry)
             
             if "DIAGNOSTIC" in line or "Buffer Clears" in line or "Received Msgs" in line or "Processed Frames" in line:
                 print(f"\r{line.strip()}")
@@ -96,6 +111,7 @@ def run_benchmark(bag_path, config="avia.yaml"):  # Define the main benchmark fu
     except KeyboardInterrupt:  # Handle Ctrl+C interruption
         print("\n\nStopping benchmark...")  # Print stopping message
     finally:  # Execute cleanup code
+        stop_process(play_proc)  # End playback if the loop was left early
         # Graceful shutdown to allow destructor to print stats
         if mapping_proc.poll() is None:
             mapping_proc.send_signal(signal.SIGINT)
@@ -109,23 +125,29 @@ def run_benchmark(bag_path, config="avia.yaml"):  # Define the main benchmark fu
             except:
                 mapping_proc.terminate()
         
+        # Decode every timing record received during the run in one go
+        frames = listener.frames()  # Structured array, one row per processed frame
+        listener.stop()  # Shut the subscriber down
+        orchestrator.close()  # Flushes the last TUM poses
+        dropped = telemetry.dropped_records(frames)  # Gaps in the record sequence numbers
+        if dropped:  # Report lost records instead of silently skipping frames
+            print(f"\nWarning: {dropped} telemetry records were dropped")
+        table = telemetry.benchmark_table(frames)  # Same 8 columns as the old stdout timing line
+        csv_writer.writerows(table.tolist())  # Write all rows to the CSV
+        telemetry.save_frames_csv(frames, results_dir / f"{bag_name}_frame_timing.csv")  # Exact per-frame values for compare_results.py
+        hist.record(frames["total_time"])  # Per-frame total time (t5 - t0)
+        hist.save(results_dir / f"{bag_name}_latency_hist.json")  # Mergeable with other runs (latency_hist.py)
+
         log_file.close()  # Close the log file
         csv_file.close()  # Close the CSV file
 
    # 7. Final Statistics
-    if latencies:  # Check if any latency data was collected
-        avg_v = sum(latencies) / len(latencies)  # Calculate average latency
-        max_v = max(latencies)  # Find maximum latency
-        min_v = min(latencies)  # Find minimum latency
-        
+    if hist.count:  # Check if any latency data was collected
         summary = (  # Create summary string
             f"===============================================\n"
             f"   FINAL STATISTICS: {bag_name}\n"
             f"===============================================\n"
-            f"Average Processing Time: {avg_v:.6f} s ({avg_v*1000:.2f} ms)\n"
-            f"Maximum (Peak) Time:     {max_v:.6f} s ({max_v*1000:.2f} ms)\n"
-            f"Minimum Time:            {min_v:.6f} s ({min_v*1000:.2f} ms)\n"
-            f"Total Frames Processed:  {len(latencies)}\n"
+            + format_summary(hist.summary()) +  # Percentiles, 100 ms budget misses and jitter
             f"===============================================\n\n"
         )
         
@@ -138,6 +160,8 @@ def run_benchmark(bag_path, config="avia.yaml"):  # Define the main benchmark fu
             f.write(summary + "--- RAW LOG DATA ---\n" + original_content)  # Write summary followed by original content
             
         print(summary)  # Print summary to console
+        record_run("benchmark_fastlio", bag_name, config, hist.summary(), results_dir, frames,  # Indexed history for trend queries
+                   tum=orchestrator.trajectory())  # Trajectory metrics from the live TUM poses
         print(f"✅ Results saved to: {results_dir}")  # Print save location
 
 if __name__ == "__main__":  # Check if script is run directly
@@ -0,0 +1,180 @@
+# Purpose: Runs run_full_analysis.py over a matrix of bags x config files x parameter overrides, several cells at once.
+#          Every cell gets its own ROS_DOMAIN_ID, a generated config overlay (overrides, map file, log dir),
+#          its own output directory and a disjoint CPU set, so parallel cells neither see each other's topics
+#          nor compete for the same cores.
+#          Usage: python3 benchmark_matrix.py --bags A B --configs avia.yaml --set filter_size_surf=0.3,0.5
+
+import os
+import sys
+import csv
+import json
+import time
+import queue
+import argparse
+import itertools
+import subprocess
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import yaml
+
+RESULTS_BASE = Path("/root/ros2_ws/src/results/full_analysis_results")
+CONFIG_DIR = Path("/root/ros2_ws/src/FAST_LIO_ROS2/config")
+ANALYZER = Path(__file__).parent / "run_full_analysis.py"
+# Domain 0 is left to interactive use; IDs above 101 collide with ephemeral ports on Linux
+FIRST_DOMAIN_ID = 1
+MAX_DOMAIN_ID = 101
+
+def parse_override(text):
+    """'filter_size_surf=0.3,0.5' -> ('filter_size_surf', [0.3, 0.5])"""
+    key, _, values = text.partition("=")
+    if not key or not values:
+        raise argparse.ArgumentTypeError(f"Expected KEY=V1[,V2...], got '{text}'")
+    return key.strip(), [yaml.safe_load(v) for v in values.split(",")]
+
+def expand_cells(bags, configs, overrides):
+    """Cartesian product of bags, configs and every combination of override values."""
+    keys = [k for k, _ in overrides]
+    combos = list(itertools.product(*(v for _, v in overrides))) or [()]
+    for bag, config, combo in itertools.product(bags, configs, combos):
+        params = dict(zip(keys, combo))
+        tag = "_".join(f"{k.split('.')[-1]}-{v}" for k, v in params.items())
+        name = "__".join(p for p in (Path(bag).stem, Path(config).stem, tag) if p)
+        yield {"name": name, "bag": str(bag), "config": config, "overrides": params}
+
+def cpu_sets(cpus_per_cell, cells, capture=False):
+    """Splits the CPUs this process may use into `cells` disjoint (taskset list, capture cpu) pairs.
+
+    With capture, every cell also gets a core of its own for the cloud capture process; otherwise that
+    process would land on a core pinned to a neighbouring cell. The capture cpu is None without capture.
+    """
+    available = sorted(os.sched_getaffinity(0))
+    per_cell = cpus_per_cell + (1 if capture else 0)
+    count = min(cells, len(available) // per_cell)
+    if count < 1:
+        raise ValueError(f"Only {len(available)} CPUs available, {per_cell} requested per cell")
+    sets = []
+    for i in range(count):
+        cell = available[i * per_cell:(i + 1) * per_cell]
+        sets.append((",".join(map(str, cell[:cpus_per_cell])), str(cell[-1]) if capture else None))
+    return sets
+
+def set_param(params, key, value):
+    """Sets a dotted parameter ('preprocess.blind') keeping the base config's type (ROS rejects int for double)."""
+    *parents, leaf = key.split(".")
+    for p in parents:
+        params = params.setdefault(p, {})
+    if isinstance(params.get(leaf), float) and isinstance(value, int):
+        value = float(value)
+    params[leaf] = value
+
+def write_overlay(cell, config_dir, work_dir, output_dir):
+    """Writes the cell's config: base config + overrides, with the map and logs redirected into the cell."""
+    with open(config_dir / cell["config"], "r") as f:
+        config = yaml.safe_load(f)
+    params = config["/**"]["ros__parameters"]
+    for key, value in cell["overrides"].items():
+        set_param(params, key, value)
+    params["map_file_path"] = str(output_dir / "final_map.pcd")
+    params["log_dir"] = str(output_dir)
+
+    path = work_dir / f"{cell['name']}.yaml"
+    with open(path, "w") as f:
+        yaml.safe_dump(config, f, sort_keys=False)
+    return path
+
+def run_cell(cell, slot, matrix_dir, config_dir, capture="off"):
+    domain_id, cpus, capture_cpu = slot
+    output_dir = matrix_dir / cell["name"]
+    # Separate working directory: the analyzer wipes output_dir on start and relative map paths land in the cwd
+    work_dir = matrix_dir / "configs" / cell["name"]
+    work_dir.mkdir(parents=True, exist_ok=True)
+    overlay = write_overlay(cell, config_dir, work_dir, output_dir)
+
+    env = dict(os.environ, ROS_DOMAIN_ID=str(domain_id))
+    cmd = [sys.executable, str(ANALYZER), cell["bag"], overlay.name,
+           "--output-dir", str(output_dir), "--config-path", str(work_dir),
+           "--cpus", cpus, "--time-log", str(output_dir / "fast_lio_time_log.csv"), "--capture", capture]
+    if capture_cpu is not None:
+        cmd += ["--capture-cpu", capture_cpu]
+    start = time.time()
+    with open(work_dir / "run.log", "w") as log:
+        returncode = subprocess.run(cmd, env=env, cwd=work_dir, stdout=log, stderr=subprocess.STDOUT).returncode
+
+    result = dict(cell, domain_id=domain_id, cpus=cpus, returncode=returncode, wall_time_s=time.time() - start)
+    summary_path = output_dir / "summary.json"
+    if summary_path.exists():
+        with open(summary_path, "r") as f:
+            result["summary"] = json.load(f)
+    return result
+
+def run_matrix(cells, parallel, cpus_per_cell, config_dir=CONFIG_DIR, capture="off"):
+    cells = list(cells)
+    sets = cpu_sets(cpus_per_cell, min(parallel, len(cells)), capture != "off")
+    if len(sets) > MAX_DOMAIN_ID - FIRST_DOMAIN_ID + 1:
+        sets = sets[:MAX_DOMAIN_ID - FIRST_DOMAIN_ID + 1]
+    # A slot is a (domain id, cpu set, capture cpu) triple held by one running cell at a time
+    slots = queue.Queue()
+    for i, (cpus, capture_cpu) in enumerate(sets):
+        slots.put((FIRST_DOMAIN_ID + i, cpus, capture_cpu))
+
+    matrix_dir = RESULTS_BASE / f"matrix_{time.strftime('%Y%m%d_%H%M%S')}"
+    matrix_dir.mkdir(parents=True, exist_ok=True)
+    print(f"Running {len(cells)} cells, {len(sets)} at a time ({cpus_per_cell} CPUs each) -> {matrix_dir}")
+
+    def job(cell):
+        slot = slots.get()
+        try:
+            return run_cell(cell, slot, matrix_dir, config_dir, capture)
+        finally:
+            slots.put(slot)
+
+    results = []
+    with ThreadPoolExecutor(max_workers=len(sets)) as pool:
+        futures = [pool.submit(job, cell) for cell in cells]
+        for n, future in enumerate(as_completed(futures), 1):
+            r = future.result()
+            results.append(r)
+            s = r.get("summary")
+            status = (f"{s['frames']} frames, p50 {s['latency']['p50_ms']:.1f} ms, p99 {s['latency']['p99_ms']:.1f} ms, "
+                      f"{s['latency']['over_deadline']} over budget"
+                      if s else f"FAILED (exit {r['returncode']})")
+            print(f"[{n}/{len(cells)}] {r['name']} (domain {r['domain_id']}, cpus {r['cpus']}): {status}")
+
+    save_results(results, matrix_dir)
+    return results
+
+def save_results(results, matrix_dir):
+    keys = sorted({k for r in results for k in r["overrides"]})
+    with open(matrix_dir / "matrix_results.csv", "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Cell", "Bag Name", "Config"] + keys + ["Domain ID", "CPUs", "Exit Code", "Wall Time (s)",
+                        "Frames", "Avg Latency (ms)", "P99 Latency (ms)", "Max Latency (ms)", "Over Budget",
+                        "Peak RAM (MB)", "Avg CPU (%)"])
+        for r in sorted(results, key=lambda r: r["name"]):
+            s = r.get("summary", {})
+            writer.writerow([r["name"], Path(r["bag"]).stem, r["config"]] + [r["overrides"].get(k, "") for k in keys] +
+                            [r["domain_id"], r["cpus"], r["returncode"], f"{r['wall_time_s']:.1f}",
+                             s.get("frames", ""),
+                             f"{s['avg_latency_ms']:.2f}" if s else "", f"{s['latency']['p99_ms']:.2f}" if s else "",
+                             f"{s['max_latency_ms']:.2f}" if s else "", s["latency"]["over_deadline"] if s else "",
+                             f"{s['peak_ram_mb']:.2f}" if s else "", f"{s['avg_cpu']:.2f}" if s else ""])
+    with open(matrix_dir / "matrix_results.json", "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Matrix results saved to {matrix_dir / 'matrix_results.csv'}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run FAST-LIO full analyses over bags x configs x parameter overrides.")
+    parser.add_argument("--bags", nargs="+", required=True, help="ROS 2 bag directories or .db3/.mcap files")
+    parser.add_argument("--configs", nargs="+", default=["velodyne.yaml"], help="Base config files in --config-dir")
+    parser.add_argument("--set", dest="overrides", action="append", type=parse_override, default=[],
+                        metavar="KEY=V1,V2", help="Parameter values to sweep, e.g. filter_size_surf=0.3,0.5 "
+                        "(also filter_size_map, point_filter_num, max_iteration, dotted keys like preprocess.blind)")
+    parser.add_argument("--parallel", type=int, default=2, help="Cells running at the same time")
+    parser.add_argument("--cpus-per-cell", type=int, default=2, help="Cores pinned to each running cell")
+    parser.add_argument("--config-dir", type=Path, default=CONFIG_DIR)
+    parser.add_argument("--capture", choices=["off", "voxel", "every-nth", "full"], default="off",
+                        help="Cloud capture profile of every cell (its process gets one extra core per cell)")
+    args = parser.parse_args()
+
+    run_matrix(expand_cells(args.bags, args.configs, args.overrides), args.parallel, args.cpus_per_cell, args.config_dir,
+               args.capture)
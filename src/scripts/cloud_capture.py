@@ -0,0 +1,289 @@
+# Purpose: Low-overhead capture of /cloud_registered in its own process, replacing full-density bag recording.
+#          Profiles: off, voxel (one point per voxel), every-nth (every Nth frame at full density) and full.
+#          The subscription callback only decimates frames and queues the raw CDR; a writer thread decodes
+#          x/y/z/intensity, voxel-filters and appends float32 records to chunked binary files. The process is
+#          pinned to its own core and writes its CPU time and bytes written to capture_stats.json on exit,
+#          so the run summary can subtract its cost.
+#          Usage: python3 cloud_capture.py record OUTPUT_DIR [--profile voxel] [--voxel 0.5] [--every 5]
+#                 python3 cloud_capture.py pcd CAPTURE_DIR OUTPUT.pcd
+
+import os
+import sys
+import json
+import time
+import queue
+import struct
+import argparse
+import resource
+import threading
+import subprocess
+from pathlib import Path
+import numpy as np
+
+CLOUD_TOPIC = "/cloud_registered"
+CLOUD_TYPE = "sensor_msgs/msg/PointCloud2"
+PROFILES = ["off", "voxel", "every-nth", "full"]
+DEFAULT_VOXEL = 0.5
+DEFAULT_EVERY = 5
+# Frames waiting for the writer; beyond this frames are dropped (and counted) instead of blocking DDS
+MAX_PENDING = 64
+CHUNK_BYTES = 256 * 1024 * 1024
+FILE_MAGIC = b"FLCLOUD1"
+# One record: stamp (float64 s), point count (uint32), then count x (x, y, z, intensity) float32
+RECORD_HEADER = struct.Struct("<dI")
+STATS_NAME = "capture_stats.json"
+POINTFIELD_FLOAT32 = 7
+
+def _align(offset, size):
+    # CDR aligns primitives relative to the end of the 4-byte encapsulation header
+    return 4 + ((offset - 4 + size - 1) // size) * size
+
+def _string(blob, offset):
+    (length,) = struct.unpack_from("<I", blob, offset)
+    return blob[offset + 4:offset + 3 + length].decode(), offset + 4 + length
+
+def parse_cloud(blob):
+    """(stamp, points (N, 4) float32 x/y/z/intensity) of a raw little-endian CDR PointCloud2."""
+    sec, nanosec = struct.unpack_from("<iI", blob, 4)
+    _, offset = _string(blob, 12)
+    offset = _align(offset, 4)
+    height, width, n_fields = struct.unpack_from("<III", blob, offset)
+    offset += 12
+    fields = {}
+    for _ in range(n_fields):
+        name, offset = _string(blob, offset)
+        offset = _align(offset, 4)
+        field_offset, datatype = struct.unpack_from("<IB", blob, offset)
+        offset = _align(offset + 5, 4) + 4  # skip count
+        fields[name] = (field_offset, datatype)
+    offset += 1  # is_bigendian
+    offset = _align(offset, 4)
+    point_step, _, data_len = struct.unpack_from("<III", blob, offset)
+    offset += 12
+
+    names = ["x", "y", "z", "intensity"]
+    if any(fields.get(n, (0, 0))[1] != POINTFIELD_FLOAT32 for n in names):
+        raise ValueError(f"Expected float32 x/y/z/intensity fields, got {sorted(fields)}")
+    layout = np.dtype({"names": names, "formats": ["<f4"] * 4,
+                       "offsets": [fields[n][0] for n in names], "itemsize": point_step})
+    records = np.frombuffer(blob, dtype=layout, count=height * width, offset=offset)
+    points = np.empty((len(records), 4), dtype=np.float32)
+    for i, n in enumerate(names):
+        points[:, i] = records[n]
+    return sec + nanosec * 1e-9, points
+
+def voxel_filter(points, voxel):
+    """First point of every occupied voxel (no averaging, so intensities stay measured values)."""
+    if len(points) == 0:
+        return points
+    keys = np.floor(points[:, :3] / voxel).astype(np.int64)
+    keys -= keys.min(axis=0)
+    # 21 bits per axis: 2^21 voxels of 0.5 m is ~1000 km, far beyond a scan
+    packed = (keys[:, 0] << 42) | (keys[:, 1] << 21) | keys[:, 2]
+    _, first = np.unique(packed, return_index=True)
+    return points[np.sort(first)]
+
+class ChunkWriter:
+    """Appends point records to cloud_NNNNN.bin files, starting a new file every CHUNK_BYTES."""
+
+    def __init__(self, output_dir, chunk_bytes=CHUNK_BYTES):
+        self.output_dir = Path(output_dir)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.chunk_bytes = chunk_bytes
+        self.file = None
+        self.chunks = 0
+        self.bytes_written = 0
+
+    def write(self, stamp, points):
+        if self.file is None or self.file.tell() >= self.chunk_bytes:
+            self._next_chunk()
+        header = RECORD_HEADER.pack(stamp, len(points))
+        self.file.write(header)
+        self.file.write(points.tobytes())
+        self.bytes_written += len(header) + points.nbytes
+
+    def _next_chunk(self):
+        if self.file:
+            self.file.close()
+        self.file = open(self.output_dir / f"cloud_{self.chunks:05d}.bin", "wb")
+        self.file.write(FILE_MAGIC)
+        self.bytes_written += len(FILE_MAGIC)
+        self.chunks += 1
+
+    def close(self):
+        if self.file:
+            self.file.close()
+
+def read_capture(capture_dir):
+    """Yields (stamp, points (N, 4) float32) for every captured frame, in order."""
+    for path in sorted(Path(capture_dir).glob("cloud_*.bin")):
+        data = np.fromfile(path, dtype=np.uint8)
+        if bytes(data[:len(FILE_MAGIC)]) != FILE_MAGIC:
+            raise ValueError(f"{path} is not a cloud capture chunk")
+        offset = len(FILE_MAGIC)
+        while offset + RECORD_HEADER.size <= len(data):
+            stamp, count = RECORD_HEADER.unpack_from(data, offset)
+            offset += RECORD_HEADER.size
+            points = data[offset:offset + count * 16].view(np.float32).reshape(-1, 4)
+            offset += count * 16
+            yield stamp, points
+
+def write_pcd(path, points):
+    """Binary PCD (x y z intensity) readable by PCL / CloudCompare."""
+    header = (f"# .PCD v0.7 - Point Cloud Data file format\nVERSION 0.7\nFIELDS x y z intensity\nSIZE 4 4 4 4\n"
+              f"TYPE F F F F\nCOUNT 1 1 1 1\nWIDTH {len(points)}\nHEIGHT 1\nVIEWPOINT 0 0 0 1 0 0 0\n"
+              f"POINTS {len(points)}\nDATA binary\n")
+    with open(path, "wb") as f:
+        f.write(header.encode())
+        f.write(np.ascontiguousarray(points, dtype=np.float32).tobytes())
+
+class CloudCapture:
+    """Subscription side (frame decimation, queueing) and writer thread of the capture process."""
+
+    def __init__(self, output_dir, profile="voxel", voxel=DEFAULT_VOXEL, every=DEFAULT_EVERY):
+        self.writer = ChunkWriter(output_dir)
+        self.output_dir = Path(output_dir)
+        self.profile = profile
+        self.voxel = voxel
+        self.every = every if profile == "every-nth" else 1
+        self.pending = queue.Queue(maxsize=MAX_PENDING)
+        self.received = 0
+        self.dropped = 0
+        self.frames_written = 0
+        self.points_in = 0
+        self.points_written = 0
+        self.thread = threading.Thread(target=self._write_loop, daemon=True)
+
+    def on_message(self, data):
+        self.received += 1
+        if (self.received - 1) % self.every:
+            return
+        try:
+            self.pending.put_nowait(data)
+        except queue.Full:
+            self.dropped += 1
+
+    def _write_loop(self):
+        while True:
+            data = self.pending.get()
+            if data is None:
+                return
+            stamp, points = parse_cloud(data)
+            self.points_in += len(points)
+            if self.profile == "voxel":
+                points = voxel_filter(points, self.voxel)
+            self.writer.write(stamp, points)
+            self.frames_written += 1
+            self.points_written += len(points)
+
+    def start(self):
+        self.start_wall = time.monotonic()
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.pending.put(None)
+        self.thread.join()
+        self.writer.close()
+
+    def stats(self):
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        wall = time.monotonic() - self.start_wall
+        cpu = usage.ru_utime + usage.ru_stime
+        return {
+            "profile": self.profile, "voxel": self.voxel if self.profile == "voxel" else None,
+            "every": self.every, "cpu": sorted(os.sched_getaffinity(0)),
+            "frames_received": self.received, "frames_written": self.frames_written, "frames_dropped": self.dropped,
+            "points_in": self.points_in, "points_written": self.points_written,
+            "bytes_written": self.writer.bytes_written, "chunks": self.writer.chunks,
+            "wall_time_s": wall, "cpu_time_s": cpu, "cpu_percent": cpu / wall * 100 if wall > 0 else 0.0,
+            "max_rss_mb": usage.ru_maxrss / 1024,
+        }
+
+def run_capture(output_dir, profile, voxel=DEFAULT_VOXEL, every=DEFAULT_EVERY, topic=CLOUD_TOPIC):
+    """Capture process body: spins until SIGINT, then drains the queue and writes capture_stats.json."""
+    import rclpy
+    from rclpy.executors import ExternalShutdownException
+    from rclpy.qos import QoSProfile, ReliabilityPolicy
+    from rosidl_runtime_py.utilities import get_message
+
+    capture = CloudCapture(output_dir, profile, voxel, every).start()
+    rclpy.init()
+    node = rclpy.create_node("fastlio_cloud_capture")
+    qos = QoSProfile(depth=MAX_PENDING, reliability=ReliabilityPolicy.RELIABLE)
+    node.create_subscription(get_message(CLOUD_TYPE), topic, capture.on_message, qos, raw=True)
+    try:
+        rclpy.spin(node)
+    except (KeyboardInterrupt, ExternalShutdownException):
+        pass
+    finally:
+        node.destroy_node()
+        rclpy.try_shutdown()
+        capture.stop()
+        with open(Path(output_dir) / STATS_NAME, "w") as f:
+            json.dump(capture.stats(), f, indent=2)
+
+def cpu_list(spec):
+    """CPUs of a taskset list ("0,2,4-7") as a set."""
+    cpus = set()
+    for part in (spec or "").split(","):
+        if "-" in part:
+            lo, hi = part.split("-")
+            cpus.update(range(int(lo), int(hi) + 1))
+        elif part:
+            cpus.add(int(part))
+    return cpus
+
+def capture_cpu(exclude=None):
+    """Highest CPU this process may use that is not in the taskset list `exclude` (the node's cores)."""
+    free = sorted(set(os.sched_getaffinity(0)) - cpu_list(exclude))
+    return str(free[-1]) if free else None
+
+def start_capture(output_dir, profile, voxel=DEFAULT_VOXEL, every=DEFAULT_EVERY, cpu=None):
+    """Starts the capture process (None for profile 'off'); stop it with orchestrator.stop_process()."""
+    if profile == "off":
+        return None
+    cmd = [sys.executable, str(Path(__file__).resolve()), "record", str(output_dir), "--profile", profile,
+           "--voxel", str(voxel), "--every", str(every)]
+    if cpu is not None:
+        cmd = ["taskset", "-c", str(cpu)] + cmd
+    return subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+def load_capture_stats(output_dir):
+    path = Path(output_dir) / STATS_NAME
+    if not path.exists():
+        return None
+    with open(path, "r") as f:
+        return json.load(f)
+
+def format_capture_stats(s):
+    """Report line shared by the analysis scripts."""
+    return (f" Cloud Capture ({s['profile']}):  {s['cpu_percent']:.1f} % CPU ({s['cpu_time_s']:.1f} s), "
+            f"{s['bytes_written'] / 1e6:.1f} MB, {s['frames_written']}/{s['frames_received']} frames, "
+            f"{s['frames_dropped']} dropped\n")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Capture /cloud_registered at reduced cost, or export a capture to PCD.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("record")
+    p.add_argument("output_dir")
+    p.add_argument("--profile", choices=PROFILES, default="voxel")
+    p.add_argument("--voxel", type=float, default=DEFAULT_VOXEL, help="Voxel size (m) of the 'voxel' profile")
+    p.add_argument("--every", type=int, default=DEFAULT_EVERY, help="Frame stride of the 'every-nth' profile")
+    p.add_argument("--topic", default=CLOUD_TOPIC)
+    p = sub.add_parser("pcd")
+    p.add_argument("capture_dir")
+    p.add_argument("output")
+    p.add_argument("--voxel", type=float, help="Voxel-filter the merged cloud")
+    args = parser.parse_args()
+
+    if args.command == "record":
+        if args.profile != "off":
+            run_capture(args.output_dir, args.profile, args.voxel, args.every, args.topic)
+    else:
+        clouds = [points for _, points in read_capture(args.capture_dir)]
+        merged = np.concatenate(clouds) if clouds else np.empty((0, 4), dtype=np.float32)
+        if args.voxel:
+            merged = voxel_filter(merged, args.voxel)
+        write_pcd(args.output, merged)
+        print(f"{len(clouds)} frames, {len(merged)} points -> {args.output}")
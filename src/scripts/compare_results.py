@@ -0,0 +1,209 @@
+# Purpose: Statistical regression check between benchmark result sets (e.g. *_timing_results vs *_timing_results_baseline).
+#          Loads per-frame stage timings, aligns frames by index or LiDAR timestamp and reports per-stage mean deltas
+#          with block-bootstrap confidence intervals and a rank test (Wilcoxon signed-rank when paired,
+#          Mann-Whitney U otherwise). Exits 1 when a stage regresses past the threshold.
+#          Usage: python3 compare_results.py BASELINE CANDIDATE [CANDIDATE ...] [--threshold PCT]
+
+import sys
+import math
+import argparse
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+STAGES = ["ave_match", "ave_solve", "ave_ICP", "map_incre", "construct_H"]
+# Columns of the stdout timing line (and *_data.csv) that are running averages, not per-frame values
+RUNNING_MEAN_COLUMNS = ["ave_match", "ave_solve", "ave_total", "icp", "construct_H"]
+# Frames are autocorrelated (map growth, scene changes); resample blocks of consecutive frames
+BLOCK_FRAMES = 50
+BOOTSTRAP_SAMPLES = 2000
+DEFAULT_THRESHOLD = 5.0     # % change of a stage mean that counts as a regression
+DEFAULT_ALPHA = 0.01
+DEFAULT_CONFIDENCE = 0.95
+
+def undo_running_mean(m):
+    """Per-frame values from a running average: x_k = k * m_k - (k - 1) * m_(k-1).
+
+    The CSV keeps 6 decimals, so the recovered values carry up to k * 0.5 us of rounding noise.
+    """
+    m = np.asarray(m, dtype=np.float64)
+    return np.diff(m * np.arange(1, len(m) + 1), prepend=0.0)
+
+def frames_from_telemetry(df):
+    """Per-frame stage values in the stdout column names, from a frame_timing.csv (telemetry.save_frames_csv)."""
+    return pd.DataFrame({
+        "time": df["lidar_beg_time"],
+        "IMU_Map_Downsample": df["imu_map_downsample"],
+        "ave_match": df["match_time"],
+        "ave_solve": df["solve_time"] + df["solve_h_time"],
+        "ave_ICP": df["total_time"] - df["imu_map_downsample"] - df["map_incre_time"],
+        "map_incre": df["map_incre_time"],
+        "ave_total": df["total_time"],
+        "icp": df["icp_time"],
+        "construct_H": df["solve_time"],
+    })
+
+def frames_from_benchmark(df):
+    """Per-frame stage values from a benchmark *_data.csv (running averages are undone, no timestamps)."""
+    out = df.copy()
+    for c in RUNNING_MEAN_COLUMNS:
+        if c in out.columns:
+            out[c] = undo_running_mean(out[c])
+    return out
+
+def load_result_set(path):
+    """(per-frame DataFrame, source file) of a result directory or CSV; exact telemetry is preferred."""
+    path = Path(path)
+    if path.is_dir():
+        for pattern in ("frame_timing.csv", "*_frame_timing.csv", "*_data.csv"):
+            found = sorted(path.glob(pattern))
+            if found:
+                path = found[0]
+                break
+        else:
+            raise FileNotFoundError(f"No frame_timing.csv or *_data.csv in {path}")
+    df = pd.read_csv(path, skipinitialspace=True)
+    if "total_time" in df.columns:
+        return frames_from_telemetry(df), path
+    if "ave_match" in df.columns:
+        return frames_from_benchmark(df), path
+    raise ValueError(f"{path} is neither a FrameTiming CSV nor a benchmark *_data.csv")
+
+def align(base, cand, how):
+    """Returns (base, cand, paired): frames matched by index, by LiDAR timestamp, or left unpaired ('none')."""
+    if how == "none":
+        return base, cand, False
+    if how == "timestamp":
+        if "time" not in base.columns or "time" not in cand.columns:
+            raise ValueError("Timestamp alignment needs per-frame telemetry (frame_timing.csv) on both sides")
+        # Same bag -> identical scan stamps; round away float noise. Each side is made unique per key before
+        # intersecting, so both keep exactly the common keys, in the same order
+        sides = []
+        for df in (base, cand):
+            key = (df["time"] * 1000).round().astype(np.int64)
+            sides.append(df.assign(key=key).drop_duplicates("key").sort_values("key", kind="mergesort"))
+        common = np.intersect1d(sides[0]["key"], sides[1]["key"])
+        base, cand = (df[df["key"].isin(common)].drop(columns="key").reset_index(drop=True) for df in sides)
+        return base, cand, True
+    n = min(len(base), len(cand))
+    return base.iloc[:n].reset_index(drop=True), cand.iloc[:n].reset_index(drop=True), True
+
+def rankdata(x):
+    """Average ranks (1-based) and the size of every tie group."""
+    order = np.argsort(x, kind="mergesort")
+    xs = x[order]
+    group = np.cumsum(np.r_[True, xs[1:] != xs[:-1]]) - 1
+    ties = np.bincount(group)
+    ends = np.cumsum(ties)
+    ranks = np.empty(len(x))
+    ranks[order] = ((ends - ties + 1 + ends) / 2)[group]
+    return ranks, ties
+
+def _two_sided_p(z):
+    return math.erfc(abs(z) / math.sqrt(2))
+
+def wilcoxon_signed_rank(d):
+    """Two-sided p-value of paired differences (normal approximation with tie correction)."""
+    d = d[d != 0]
+    n = len(d)
+    if n < 10:
+        return 1.0
+    ranks, ties = rankdata(np.abs(d))
+    w_plus = ranks[d > 0].sum()
+    mean = n * (n + 1) / 4
+    var = n * (n + 1) * (2 * n + 1) / 24 - np.sum(ties ** 3 - ties) / 48
+    return _two_sided_p((w_plus - mean) / math.sqrt(var)) if var > 0 else 1.0
+
+def mann_whitney_u(a, b):
+    """Two-sided p-value that a and b come from the same distribution (normal approximation)."""
+    na, nb = len(a), len(b)
+    if na < 10 or nb < 10:
+        return 1.0
+    ranks, ties = rankdata(np.concatenate([a, b]))
+    u = ranks[na:].sum() - nb * (nb + 1) / 2
+    n = na + nb
+    var = na * nb / 12 * ((n + 1) - np.sum(ties ** 3 - ties) / (n * (n - 1)))
+    return _two_sided_p((u - na * nb / 2) / math.sqrt(var)) if var > 0 else 1.0
+
+def block_indices(rng, n, samples, block=BLOCK_FRAMES):
+    """Moving-block bootstrap: (samples, n) frame indices built from random runs of `block` frames."""
+    block = max(min(block, n), 1)
+    blocks = -(-n // block)
+    starts = rng.integers(0, n - block + 1, size=(samples, blocks, 1))
+    return (starts + np.arange(block)).reshape(samples, -1)[:, :n]
+
+def bootstrap_change(a, b, paired, samples=BOOTSTRAP_SAMPLES, confidence=DEFAULT_CONFIDENCE, seed=0):
+    """Confidence interval (%) of mean(b) / mean(a) - 1."""
+    rng = np.random.default_rng(seed)
+    changes = []
+    # Batches keep the index matrix small for long runs
+    for batch in np.array_split(np.arange(samples), max(samples // 200, 1)):
+        ia = block_indices(rng, len(a), len(batch))
+        ib = ia if paired else block_indices(rng, len(b), len(batch))
+        changes.append(b[ib].mean(axis=1) / a[ia].mean(axis=1) - 1)
+    changes = np.concatenate(changes) * 100
+    tail = (1 - confidence) / 2 * 100
+    return tuple(np.percentile(changes, [tail, 100 - tail]))
+
+def compare_stage(a, b, paired, threshold, alpha, confidence):
+    a, b = np.asarray(a, dtype=np.float64), np.asarray(b, dtype=np.float64)
+    change = (b.mean() / a.mean() - 1) * 100 if a.mean() else 0.0
+    ci_low, ci_high = bootstrap_change(a, b, paired, confidence=confidence)
+    p = wilcoxon_signed_rank(b - a) if paired else mann_whitney_u(a, b)
+    # A verdict needs both: the whole interval beyond the threshold and a significant rank test
+    if p < alpha and ci_low > threshold:
+        verdict = "REGRESSION"
+    elif p < alpha and ci_high < -threshold:
+        verdict = "IMPROVEMENT"
+    else:
+        verdict = "no change"
+    return {"base_ms": a.mean() * 1000, "cand_ms": b.mean() * 1000, "delta_ms": (b.mean() - a.mean()) * 1000,
+            "change_pct": change, "ci_low_pct": ci_low, "ci_high_pct": ci_high, "p_value": p, "verdict": verdict}
+
+def compare(base_path, cand_path, stages=STAGES, how="index", threshold=DEFAULT_THRESHOLD, alpha=DEFAULT_ALPHA,
+            confidence=DEFAULT_CONFIDENCE):
+    base, base_src = load_result_set(base_path)
+    cand, cand_src = load_result_set(cand_path)
+    base, cand, paired = align(base, cand, how)
+    rows = {}
+    for stage in stages:
+        # Nothing to resample or rank when a side has no (aligned) frames; reported as "no frames"
+        if len(base) and len(cand) and stage in base.columns and stage in cand.columns:
+            rows[stage] = compare_stage(base[stage], cand[stage], paired, threshold, alpha, confidence)
+    return {"baseline": str(base_src), "candidate": str(cand_src), "frames": (len(base), len(cand)),
+            "paired": paired, "stages": rows}
+
+def print_comparison(result, confidence):
+    print(f"\nBaseline:  {result['baseline']}")
+    print(f"Candidate: {result['candidate']}")
+    print(f"Frames:    {result['frames'][0]} vs {result['frames'][1]} ({'paired' if result['paired'] else 'unpaired'})")
+    if not all(result["frames"]):
+        print("No frames to compare")
+        return
+    print(f"{'Stage':<20}{'Base ms':>9}{'Cand ms':>9}{'Delta ms':>10}{'Change':>9}  {confidence * 100:.0f}% CI{'':>10}{'p':>9}  Verdict")
+    for stage, r in result["stages"].items():
+        print(f"{stage:<20}{r['base_ms']:>9.3f}{r['cand_ms']:>9.3f}{r['delta_ms']:>+10.3f}{r['change_pct']:>+8.1f}%"
+              f"  [{r['ci_low_pct']:+6.1f}%, {r['ci_high_pct']:+6.1f}%]{r['p_value']:>9.1e}  {r['verdict']}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare benchmark result sets stage by stage.")
+    parser.add_argument("baseline", help="Baseline result directory or CSV")
+    parser.add_argument("candidates", nargs="+", help="Result directories or CSVs compared against the baseline")
+    parser.add_argument("--align", choices=["index", "timestamp", "none"], default="index",
+                        help="Pair frames by index, by LiDAR timestamp (telemetry CSVs) or not at all (different bags)")
+    parser.add_argument("--stages", nargs="+", default=STAGES, help="Columns to compare")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Regression threshold in %% of the stage mean")
+    parser.add_argument("--alpha", type=float, default=DEFAULT_ALPHA, help="Significance level of the rank test")
+    parser.add_argument("--confidence", type=float, default=DEFAULT_CONFIDENCE)
+    args = parser.parse_args()
+
+    regressions = []
+    for cand in args.candidates:
+        result = compare(args.baseline, cand, args.stages, args.align, args.threshold, args.alpha, args.confidence)
+        print_comparison(result, args.confidence)
+        regressions += [f"{Path(cand).name}: {s}" for s, r in result["stages"].items() if r["verdict"] == "REGRESSION"]
+
+    if regressions:
+        print(f"\nVERDICT: REGRESSION (> {args.threshold:g}% at p < {args.alpha:g}) in " + ", ".join(regressions))
+        sys.exit(1)
+    print(f"\nVERDICT: OK (no stage regressed by more than {args.threshold:g}%)")
@@ -0,0 +1,178 @@
+# Purpose: Fixed-memory, mergeable latency histogram (HDR-style log-linear buckets, 1 us unit, < 0.8 % error).
+#          Records any number of frames in ~20 KB, reports p50/p90/p99/p99.9, misses of the 100 ms (10 Hz)
+#          frame budget, the longest run of consecutive misses and jitter. Histograms saved as JSON can be
+#          merged across runs.
+#          Usage: python3 latency_hist.py [HIST_JSON ...]   (merges and prints the combined summary)
+
+import sys
+import json
+import numpy as np
+
+# Frame budget of a 10 Hz LiDAR
+DEADLINE = 0.1
+PERCENTILES = [50, 90, 99, 99.9]
+# 2^SUB_BITS exact unit buckets, then 2^(SUB_BITS-1) buckets per power of two (2 significant digits)
+SUB_BITS = 8
+UNIT = 1e-6
+MAX_SECONDS = 60.0
+
+def bucket_index(units):
+    """Bucket of each integer value (in units): exact below 2^SUB_BITS, log-linear above."""
+    units = np.asarray(units, dtype=np.int64)
+    # frexp's exponent is the bit length for positive integers below 2^53
+    shift = np.maximum(np.frexp(units.astype(np.float64))[1] - SUB_BITS, 0)
+    return (shift << (SUB_BITS - 1)) + (units >> shift)
+
+def bucket_upper(index):
+    """Highest value (in units) that lands in each bucket, as HDR reports percentiles."""
+    index = np.asarray(index, dtype=np.int64)
+    shift = np.maximum((index >> (SUB_BITS - 1)) - 1, 0)
+    mantissa = index - (shift << (SUB_BITS - 1))
+    return ((mantissa + 1) << shift) - 1
+
+class LatencyHistogram:
+    """Constant-memory latency recorder; record() takes seconds (scalar or array, in frame order)."""
+
+    def __init__(self, deadline=DEADLINE, max_seconds=MAX_SECONDS):
+        self.deadline = deadline
+        self.max_units = int(max_seconds / UNIT)
+        self.counts = np.zeros(int(bucket_index(self.max_units)) + 1, dtype=np.int64)
+        self.count = 0
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+        self.over_deadline = 0
+        self.longest_over_run = 0
+        self.current_over_run = 0
+        # Jitter: mean absolute difference between consecutive frames' latencies
+        self.abs_diff_sum = 0.0
+        self.last = None
+        # Recordings merged into this one (each contributes one fewer consecutive pair than frames)
+        self.runs = 1
+
+    def record(self, seconds):
+        values = np.atleast_1d(np.asarray(seconds, dtype=np.float64))
+        if len(values) == 0:
+            return
+        units = np.clip(np.rint(values / UNIT), 0, self.max_units)
+        self.counts += np.bincount(bucket_index(units), minlength=len(self.counts))
+        self.count += len(values)
+        self.total += float(values.sum())
+        self.total_sq += float(np.square(values).sum())
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+        over = values > self.deadline
+        self.over_deadline += int(over.sum())
+        # Run lengths of consecutive misses, continuing the run left open by the previous call
+        edges = np.diff(np.concatenate([[0], over.astype(np.int8), [0]]))
+        starts, ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+        runs = ends - starts
+        if len(runs):
+            if starts[0] == 0:
+                runs[0] += self.current_over_run
+            self.longest_over_run = max(self.longest_over_run, int(runs.max()))
+        self.current_over_run = int(runs[-1]) if over[-1] else 0
+
+        chain = values if self.last is None else np.concatenate([[self.last], values])
+        self.abs_diff_sum += float(np.abs(np.diff(chain)).sum())
+        self.last = float(values[-1])
+
+    def merge(self, other):
+        """Adds another histogram (e.g. another run); miss runs do not continue across runs."""
+        self.counts += other.counts
+        self.count += other.count
+        self.total += other.total
+        self.total_sq += other.total_sq
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.over_deadline += other.over_deadline
+        self.longest_over_run = max(self.longest_over_run, other.longest_over_run)
+        self.abs_diff_sum += other.abs_diff_sum
+        self.runs += other.runs
+        return self
+
+    def percentile(self, q):
+        if self.count == 0:
+            return 0.0
+        rank = max(int(np.ceil(q / 100 * self.count)), 1)
+        index = int(np.searchsorted(np.cumsum(self.counts), rank))
+        # Never report more than the exact maximum
+        return min(float(bucket_upper(index)) * UNIT, self.max)
+
+    def summary(self):
+        n = self.count
+        mean = self.total / n if n else 0.0
+        pairs = n - self.runs
+        result = {
+            "frames": n,
+            "mean_ms": mean * 1000,
+            "min_ms": self.min * 1000 if n else 0.0,
+            "max_ms": self.max * 1000,
+            "stdev_ms": float(np.sqrt(max(self.total_sq / n - mean ** 2, 0.0))) * 1000 if n else 0.0,
+            "jitter_ms": self.abs_diff_sum / pairs * 1000 if pairs > 0 else 0.0,
+            "deadline_ms": self.deadline * 1000,
+            "over_deadline": self.over_deadline,
+            "over_deadline_pct": self.over_deadline / n * 100 if n else 0.0,
+            "longest_over_run": self.longest_over_run,
+        }
+        for q in PERCENTILES:
+            result[f"p{q:g}_ms"] = self.percentile(q) * 1000
+        return result
+
+    def to_dict(self):
+        nonzero = np.flatnonzero(self.counts)
+        return {
+            "unit": UNIT, "sub_bits": SUB_BITS, "deadline": self.deadline, "max_units": self.max_units,
+            "buckets": nonzero.tolist(), "counts": self.counts[nonzero].tolist(),
+            "count": self.count, "total": self.total, "total_sq": self.total_sq,
+            "min": self.min if self.count else None, "max": self.max,
+            "over_deadline": self.over_deadline, "longest_over_run": self.longest_over_run,
+            "abs_diff_sum": self.abs_diff_sum, "runs": self.runs,
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        if d["unit"] != UNIT or d["sub_bits"] != SUB_BITS:
+            raise ValueError("Histogram was written with a different bucket layout")
+        hist = cls(d["deadline"], d["max_units"] * UNIT)
+        hist.counts[d["buckets"]] = d["counts"]
+        hist.count, hist.total, hist.total_sq = d["count"], d["total"], d["total_sq"]
+        hist.min = d["min"] if d["min"] is not None else float("inf")
+        hist.max = d["max"]
+        hist.over_deadline, hist.longest_over_run = d["over_deadline"], d["longest_over_run"]
+        hist.abs_diff_sum = d["abs_diff_sum"]
+        hist.runs = d["runs"]
+        return hist
+
+    def save(self, path):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "r") as f:
+            return cls.from_dict(json.load(f))
+
+def format_summary(s):
+    """Report lines shared by the analysis scripts."""
+    return (
+        f" Processed Frames:       {s['frames']}\n"
+        f" Latency p50 / p90:      {s['p50_ms']:.2f} / {s['p90_ms']:.2f} ms\n"
+        f" Latency p99 / p99.9:    {s['p99_ms']:.2f} / {s['p99.9_ms']:.2f} ms\n"
+        f" Latency mean / max:     {s['mean_ms']:.2f} / {s['max_ms']:.2f} ms\n"
+        f" Jitter / Std Dev:       {s['jitter_ms']:.2f} / {s['stdev_ms']:.2f} ms\n"
+        f" Over {s['deadline_ms']:.0f} ms Budget:     {s['over_deadline']} ({s['over_deadline_pct']:.2f} %), "
+        f"longest run {s['longest_over_run']}\n"
+    )
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python3 latency_hist.py [HIST_JSON ...]")
+        sys.exit(1)
+    combined = LatencyHistogram.load(sys.argv[1])
+    for path in sys.argv[2:]:
+        combined.merge(LatencyHistogram.load(path))
+    print(f"Merged {len(sys.argv) - 1} histogram(s)")
+    print(format_summary(combined.summary()), end="")
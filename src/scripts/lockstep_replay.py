@@ -0,0 +1,291 @@
+# Purpose: Closed-loop ("lockstep") bag replayer for pure compute-throughput measurement.
+#          Publishes the IMU messages up to each scan's end time, then the scan, then waits for the mapping node
+#          to finish that frame (/frame_timing, or /Odometry) before sending anything else. Nothing is dropped or
+#          queued, the run goes as fast as FAST-LIO can compute, and the input sequence is identical on every run.
+#          With --fixtures, every mini-bag of an outlier_bags.py manifest is replayed and its outlier scan's round
+#          trip is reported next to the latency of the original run.
+#          Usage: python3 lockstep_replay.py [BAG_PATH] [CONFIG_FILE]
+#                 python3 lockstep_replay.py --fixtures RESULT_DIR/outlier_bags/outliers.json [CONFIG_FILE]
+
+import sys
+import json
+import time
+import signal
+import argparse
+import threading
+import subprocess
+from collections import deque
+from pathlib import Path
+import numpy as np
+from bag_access import open_bag
+from stream_health import find_topics, scan_span, LIVOX_TYPES
+from results_db import record_run
+
+RESULTS_DIR = Path("/root/ros2_ws/src/results")
+# FAST-LIO's IMU subscription keeps only 10 messages; publish in small chunks so none are overwritten
+IMU_CHUNK = 5
+IMU_CHUNK_PAUSE = 0.001
+# A scan that produces no output (first scan, map initialisation, too few points) is released after this
+DEFAULT_TIMEOUT = 2.0
+NODE_READY_TIMEOUT = 60.0
+# /frame_timing carries lidar_beg_time as float64 seconds; anything this close to the scan stamp is that scan
+STAMP_TOLERANCE_NS = 1_000_000
+
+class LockstepReplayer:
+    """rclpy node that feeds one scan at a time and waits for the mapping node's per-frame output."""
+
+    def __init__(self, imu_topic, imu_type, lidar_topic, lidar_type, done_topic, timeout, publish_clock=False):
+        import rclpy
+        from rclpy.executors import SingleThreadedExecutor
+        from rclpy.qos import QoSProfile, ReliabilityPolicy
+        from rosidl_runtime_py.utilities import get_message
+
+        # Own context, as in telemetry.py / orchestrator.py: nothing global is initialised or shut down
+        self.context = rclpy.Context()
+        rclpy.init(context=self.context)
+        self.node = rclpy.create_node("lockstep_replayer", context=self.context)
+        qos = QoSProfile(depth=1000, reliability=ReliabilityPolicy.RELIABLE)
+        # Serialized bytes go straight from the bag to the publisher, nothing is deserialized
+        self.imu_pub = self.node.create_publisher(get_message(imu_type), imu_topic, qos)
+        self.lidar_pub = self.node.create_publisher(get_message(lidar_type), lidar_topic, qos)
+        self.clock_pub = None
+        if publish_clock:
+            from rosgraph_msgs.msg import Clock
+            self.Clock = Clock
+            self.clock_pub = self.node.create_publisher(Clock, "/clock", 10)
+
+        done_type = "fast_lio/msg/FrameTiming" if done_topic == "/frame_timing" else "nav_msgs/msg/Odometry"
+        self.frame_timing = done_topic == "/frame_timing"
+        # Newest frame stamp (ns) the mapping node reported done; step() waits until it reaches its own scan
+        self.done = threading.Condition()
+        self.done_stamp = -1
+        self.node.create_subscription(get_message(done_type), done_topic, self._on_done,
+                                      QoSProfile(depth=100, reliability=ReliabilityPolicy.RELIABLE), raw=True)
+        self.imu_topic, self.lidar_topic, self.timeout = imu_topic, lidar_topic, timeout
+
+        self.executor = SingleThreadedExecutor(context=self.context)
+        self.executor.add_node(self.node)
+        self.spin_thread = threading.Thread(target=self.executor.spin, daemon=True)
+        self.spin_thread.start()
+
+    def _on_done(self, data):
+        if self.frame_timing:
+            # FrameTiming starts with lidar_beg_time (float64 s) right after the CDR header
+            stamp = int(round(np.frombuffer(data, dtype="<f8", count=1, offset=4)[0] * 1e9))
+        else:
+            # Odometry header stamp: lidar_end_time, about the next scan's begin stamp
+            stamp, _ = scan_span(data, False)
+        with self.done:
+            self.done_stamp = max(self.done_stamp, stamp)
+            self.done.notify_all()
+
+    def wait_for_subscribers(self, timeout=NODE_READY_TIMEOUT):
+        """Blocks until the mapping node subscribes to both inputs (instead of a fixed sleep)."""
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if self.imu_pub.get_subscription_count() and self.lidar_pub.get_subscription_count():
+                return True
+            time.sleep(0.1)
+        return False
+
+    def publish_clock(self, stamp_ns):
+        if self.clock_pub:
+            msg = self.Clock()
+            msg.clock.sec, msg.clock.nanosec = divmod(stamp_ns, 1_000_000_000)
+            self.clock_pub.publish(msg)
+
+    def publish_imu(self, blobs):
+        for i in range(0, len(blobs), IMU_CHUNK):
+            for data in blobs[i:i + IMU_CHUNK]:
+                self.imu_pub.publish(data)
+            time.sleep(IMU_CHUNK_PAUSE)
+
+    def step(self, imu_blobs, scan_begin, scan_end, scan_data):
+        """Publishes one frame's input and returns (round-trip seconds, whether the frame completed).
+
+        Only the output of this scan releases it: a late record of an earlier, timed-out frame has an older stamp.
+        /frame_timing is matched on the scan's begin stamp. /Odometry carries the scan end, and the previous
+        frame's end is already about this scan's begin, so it must get past the middle of this scan.
+        """
+        if self.frame_timing:
+            target = scan_begin - STAMP_TOLERANCE_NS
+        else:
+            # Half a scan of slack: PointCloud2 scan ends are only estimated (one nominal period)
+            target = scan_end - (scan_end - scan_begin) // 2
+        self.publish_imu(imu_blobs)
+        self.publish_clock(scan_end)
+        with self.done:
+            start = time.perf_counter()
+            self.lidar_pub.publish(scan_data)
+            completed = self.done.wait_for(lambda: self.done_stamp >= target, self.timeout)
+        return time.perf_counter() - start, completed
+
+    def close(self):
+        self.executor.shutdown()
+        self.node.destroy_node()
+        self.context.try_shutdown()
+
+def lockstep_frames(reader, imu_topic, lidar_topic, livox, scan_period_ns):
+    """Yields (imu blobs, scan_end_ns, scan blob) per scan: every IMU up to the scan end plus the first one after it.
+
+    FAST-LIO's sync_packages only releases a scan once it has seen an IMU stamp >= the scan end.
+    """
+    imu = deque()       # (stamp_ns, data) not yet published
+    scans = deque()     # (end_ns, data) waiting for IMU coverage
+    for topic, _, data in reader.messages(topics=[imu_topic, lidar_topic]):
+        data = bytes(data)
+        if topic == lidar_topic:
+            _, end = scan_span(data, livox, scan_period_ns)
+            scans.append((end, data))
+        else:
+            _, stamp = scan_span(data, False)
+            imu.append((stamp, data))
+
+        while scans and imu and imu[-1][0] >= scans[0][0]:
+            end, scan = scans.popleft()
+            batch = []
+            while imu and imu[0][0] <= end:
+                batch.append(imu.popleft()[1])
+            if imu:
+                # The first sample past the scan end is what unblocks sync_packages
+                batch.append(imu.popleft()[1])
+            yield batch, end, scan
+
+    # Trailing scans without IMU coverage can never be processed; send them so the run is complete
+    for end, scan in scans:
+        yield [d for _, d in imu], end, scan
+        imu.clear()
+
+def summarize(round_trips, completed, wall_time):
+    rt = np.asarray(round_trips) * 1000
+    done = int(np.sum(completed))
+    return {
+        "frames_sent": len(rt),
+        "frames_completed": done,
+        "timeouts": len(rt) - done,
+        "wall_time_s": wall_time,
+        "frames_per_s": done / wall_time if wall_time > 0 else 0.0,
+        "round_trip_ms": {
+            "mean": float(rt[completed].mean()) if done else 0.0,
+            "p50": float(np.percentile(rt[completed], 50)) if done else 0.0,
+            "p99": float(np.percentile(rt[completed], 99)) if done else 0.0,
+            "max": float(rt[completed].max()) if done else 0.0,
+        },
+    }
+
+def run_lockstep(bag_path, config="avia.yaml", done_topic="/frame_timing", timeout=DEFAULT_TIMEOUT,
+                 launch=True, publish_clock=False, target_scan=None):
+    bag_name = Path(bag_path).stem
+    with open_bag(bag_path) as reader:
+        type_map = reader.topics()
+        imu_topics, lidar_topics = find_topics(type_map)
+        if not imu_topics or not lidar_topics:
+            print(f"Need one IMU and one LiDAR topic, found: {type_map}")
+            return None
+        imu_topic, lidar_topic = imu_topics[0], lidar_topics[0]
+        livox = type_map[lidar_topic] in LIVOX_TYPES
+        # PointCloud2 headers carry no scan end; assume one nominal period (10 Hz) past the header stamp
+        scan_period_ns = 0 if livox else 100_000_000
+
+        mapping_proc = None
+        if launch:
+            print(f"Launching FAST-LIO with config: {config}")
+            mapping_proc = subprocess.Popen(['ros2', 'launch', 'fast_lio', 'mapping.launch.py',
+                                             f'config_file:={config}', 'rviz:=false'],
+                                            stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT)
+
+        replayer = LockstepReplayer(imu_topic, type_map[imu_topic], lidar_topic, type_map[lidar_topic],
+                                    done_topic, timeout, publish_clock)
+        round_trips, completed = [], []
+        start = time.perf_counter()
+        try:
+            if not replayer.wait_for_subscribers():
+                print("Mapping node did not subscribe to the input topics in time.")
+                return None
+            print(f"Lockstep replay of {bag_name}: {lidar_topic} + {imu_topic}, waiting on {done_topic}")
+
+            total = reader.count([lidar_topic])
+            start = time.perf_counter()
+            for i, (imu_blobs, end, scan) in enumerate(lockstep_frames(reader, imu_topic, lidar_topic, livox, scan_period_ns), 1):
+                begin, _ = scan_span(scan, livox)
+                rt, ok = replayer.step(imu_blobs, begin, end, scan)
+                round_trips.append(rt)
+                completed.append(ok)
+                if i % 10 == 0 or i == total:
+                    elapsed = time.perf_counter() - start
+                    sys.stdout.write(f"\r{i}/{total} scans | {sum(completed) / elapsed:.1f} frames/s")
+                    sys.stdout.flush()
+            wall_time = time.perf_counter() - start
+        except KeyboardInterrupt:
+            print("\nInterrupted!")
+            wall_time = time.perf_counter() - start
+        finally:
+            replayer.close()
+            if mapping_proc and mapping_proc.poll() is None:
+                mapping_proc.send_signal(signal.SIGINT)
+                try:
+                    mapping_proc.wait(timeout=30)
+                except subprocess.TimeoutExpired:
+                    mapping_proc.kill()
+
+    summary = summarize(round_trips, np.asarray(completed, dtype=bool), wall_time)
+    summary.update(bag=str(bag_path), config=config, done_topic=done_topic)
+    if target_scan is not None and target_scan < len(round_trips):
+        summary["target_scan"] = {"scan": target_scan, "round_trip_ms": round_trips[target_scan] * 1000,
+                                  "completed": bool(completed[target_scan])}
+    RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+    out = RESULTS_DIR / f"{bag_name}_lockstep.json"
+    with open(out, "w") as f:
+        json.dump(summary, f, indent=2)
+
+    print(f"\n\n{summary['frames_completed']}/{summary['frames_sent']} frames in {summary['wall_time_s']:.1f} s: "
+          f"{summary['frames_per_s']:.2f} frames/s ({summary['timeouts']} timeouts)")
+    print(f"Round trip p50 {summary['round_trip_ms']['p50']:.1f} ms, p99 {summary['round_trip_ms']['p99']:.1f} ms")
+    print(f"Results saved to: {out}")
+    record_run("lockstep_replay", bag_name, config, dict(summary, frames=summary["frames_completed"]), RESULTS_DIR)
+    return summary
+
+def run_fixtures(manifest_path, config="avia.yaml", done_topic="/frame_timing", timeout=DEFAULT_TIMEOUT,
+                 launch=True, publish_clock=False):
+    """Replays each mini-bag of an outliers.json manifest (fresh mapping node per bag) and compares the outlier scan."""
+    manifest_path = Path(manifest_path)
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    rows = []
+    for entry in manifest["outliers"]:
+        print(f"\n=== {entry['bag']} (frame {entry['frame']}, {entry['latency_ms']:.1f} ms originally) ===")
+        summary = run_lockstep(manifest_path.parent / entry["bag"], config, done_topic, timeout, launch,
+                               publish_clock, entry["target_scan"])
+        target = (summary or {}).get("target_scan")
+        rows.append((entry, target))
+
+    print(f"\n{'Fixture':<28} {'Original':>10} {'Lockstep':>10}")
+    for entry, target in rows:
+        if target is None:
+            replayed = "missing"
+        elif not target["completed"]:
+            replayed = "timeout"
+        else:
+            replayed = f"{target['round_trip_ms']:.1f} ms"
+        print(f"{entry['bag']:<28} {entry['latency_ms']:>7.1f} ms {replayed:>10}")
+    return rows
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Closed-loop lockstep replay of a bag into FAST-LIO.")
+    parser.add_argument("bag", nargs="?", help="ROS 2 bag directory or .db3/.mcap file")
+    parser.add_argument("config", nargs="?", default="avia.yaml", help="FAST-LIO config file")
+    parser.add_argument("--done-topic", default="/frame_timing", choices=["/frame_timing", "/Odometry"],
+                        help="Per-frame output that releases the next scan (/frame_timing is published after the "
+                             "map update and scan publishing, /Odometry before them)")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT, help="Seconds to wait for a frame's output")
+    parser.add_argument("--no-launch", action="store_true", help="Use an already running mapping node")
+    parser.add_argument("--clock", action="store_true", help="Also publish /clock (for use_sim_time:=true)")
+    parser.add_argument("--fixtures", metavar="MANIFEST", help="Replay the mini-bags of an outlier_bags.py outliers.json")
+    args = parser.parse_args()
+    if args.fixtures:
+        # No bag with --fixtures: the single positional is the config file
+        run_fixtures(args.fixtures, args.bag or args.config, args.done_topic, args.timeout, not args.no_launch, args.clock)
+    elif args.bag:
+        run_lockstep(args.bag, args.config, args.done_topic, args.timeout, not args.no_launch, args.clock)
+    else:
+        parser.error("a bag or --fixtures MANIFEST is required")
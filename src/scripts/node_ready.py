@@ -0,0 +1,80 @@
+# Purpose: Readiness detection for fastlio_mapping, replacing the fixed sleeps before playback.
+#          The node is ready once it has live subscriptions on the config's lid_topic / imu_topic and advertises
+#          /map_save. Checked with an in-process rclpy graph query (no 'ros2 topic info' subprocesses).
+#          Usage: python3 node_ready.py [CONFIG_FILE] [--timeout SEC]   (exit code 0 = ready)
+
+import sys
+import time
+import argparse
+from pathlib import Path
+import yaml
+
+MAPPING_NODE = "laser_mapping"
+MAP_SAVE_SERVICE = "/map_save"
+DEFAULT_TIMEOUT = 60.0
+POLL_INTERVAL = 0.05
+
+def config_topics(config_file, config_path=None):
+    """(lid_topic, imu_topic) of a FAST-LIO config as absolute names (the launch file sets no namespace)."""
+    if config_path is None:
+        from ament_index_python.packages import get_package_share_directory
+        config_path = Path(get_package_share_directory("fast_lio")) / "config"
+    with open(Path(config_path) / config_file, "r") as f:
+        params = yaml.safe_load(f)["/**"]["ros__parameters"]
+    common = params.get("common", {})
+    # Same defaults as the node's declare_parameter calls
+    topics = (common.get("lid_topic", "/livox/lidar"), common.get("imu_topic", "/livox/imu"))
+    return tuple("/" + t.lstrip("/") for t in topics)
+
+class ReadinessProbe:
+    """Own rclpy context and node used only for graph queries; discovery runs without spinning."""
+
+    def __init__(self):
+        import rclpy
+
+        self.context = rclpy.Context()
+        rclpy.init(context=self.context)
+        self.node = rclpy.create_node("fastlio_readiness_probe", context=self.context)
+
+    def is_ready(self, topics):
+        for topic in topics:
+            if not any(info.node_name == MAPPING_NODE for info in self.node.get_subscriptions_info_by_topic(topic)):
+                return False
+        return any(name == MAP_SAVE_SERVICE for name, _ in self.node.get_service_names_and_types())
+
+    def wait(self, topics, timeout=DEFAULT_TIMEOUT, proc=None):
+        """Seconds until the node was ready, or None on timeout / when the launch process `proc` exits."""
+        start = time.monotonic()
+        while time.monotonic() - start < timeout:
+            if self.is_ready(topics):
+                return time.monotonic() - start
+            if proc is not None and proc.poll() is not None:
+                return None
+            time.sleep(POLL_INTERVAL)
+        return None
+
+    def close(self):
+        self.node.destroy_node()
+        self.context.try_shutdown()
+
+def wait_for_mapping_node(config_file, config_path=None, timeout=DEFAULT_TIMEOUT, proc=None):
+    """Blocks until fastlio_mapping is ready for input; returns the seconds waited or None if it never was."""
+    topics = config_topics(config_file, config_path)
+    probe = ReadinessProbe()
+    try:
+        return probe.wait(topics, timeout, proc)
+    finally:
+        probe.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Wait until fastlio_mapping subscribes to its inputs and serves /map_save.")
+    parser.add_argument("config", nargs="?", default="avia.yaml", help="FAST-LIO config file the node was launched with")
+    parser.add_argument("--config-path", help="Directory containing the config file (default: installed fast_lio config)")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT)
+    args = parser.parse_args()
+
+    waited = wait_for_mapping_node(args.config, args.config_path, args.timeout)
+    if waited is None:
+        print(f"fastlio_mapping not ready after {args.timeout:.0f} s")
+        sys.exit(1)
+    print(f"fastlio_mapping ready after {waited:.2f} s")
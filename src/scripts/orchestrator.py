@@ -0,0 +1,228 @@
+# Purpose: In-process ROS 2 side of the harness scripts, replacing the 'ros2 bag record / play / service call' CLIs.
+#          One rclpy context and executor thread serve the /map_save client (future + timeout), an /Odometry
+#          subscription that appends TUM lines while mapping runs, and an in-process bag recorder (raw CDR straight
+#          into rosbag2_py's SequentialWriter). Bags are played with rosbag2_py's Player in a small child
+#          interpreter: Humble's Player.play() blocks until the bag ends and has no cancel, so a child is what can be
+#          stopped with SIGINT and pinned with taskset. It starts without the ros2 CLI's entry-point scan.
+#          Usage: python3 orchestrator.py play BAG_PATH [--rate R] [--start-offset S] [--clock]   (the player child; normally via play())
+
+import sys
+import time
+import signal
+import argparse
+import threading
+import subprocess
+from pathlib import Path
+import numpy as np
+
+ODOMETRY_TOPIC = "/Odometry"
+ODOMETRY_TYPE = "nav_msgs/msg/Odometry"
+MAP_SAVE_SERVICE = "/map_save"
+# Types of the fastlio_mapping outputs the harness records
+OUTPUT_TYPES = {
+    "/Odometry": ODOMETRY_TYPE,
+    "/cloud_registered": "sensor_msgs/msg/PointCloud2",
+    "/cloud_registered_body": "sensor_msgs/msg/PointCloud2",
+    "/path": "nav_msgs/msg/Path",
+    "/frame_timing": "fast_lio/msg/FrameTiming",
+}
+# Same as the 'ros2 bag play --clock' default
+CLOCK_HZ = 40.0
+# Pending odometry is decoded and appended to the TUM file at this period
+TUM_FLUSH_PERIOD = 1.0
+STOP_TIMEOUT = 10.0
+
+class TrajectoryWriter:
+    """Raw /Odometry callback target; pending messages are decoded in batches and appended as TUM lines."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.file = open(self.path, "w")
+        self.pending = []
+        self.poses = []
+        self.lock = threading.Lock()
+
+    def on_message(self, data):
+        with self.lock:
+            self.pending.append(data)
+
+    def flush(self):
+        from bag_to_tum import decode_odometry_batch, decode_odometry_slow, TUM_LINE_FMT
+        from rosidl_runtime_py.utilities import get_message
+
+        with self.lock:
+            blobs, self.pending = self.pending, []
+        if not blobs:
+            return
+        tum = decode_odometry_batch(blobs)
+        if tum is None:
+            tum = decode_odometry_slow(blobs, get_message(ODOMETRY_TYPE))
+        self.file.write("".join(TUM_LINE_FMT % tuple(row) for row in tum.tolist()))
+        self.file.flush()
+        self.poses.append(tum)
+
+    def trajectory(self):
+        return np.concatenate(self.poses) if self.poses else np.empty((0, 8))
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+class BagRecorder:
+    """Writes raw subscriptions into a bag with rosbag2_py's SequentialWriter (receive time as the bag stamp)."""
+
+    def __init__(self, output_dir, topics, storage_id="sqlite3"):
+        import rosbag2_py
+
+        self.writer = rosbag2_py.SequentialWriter()
+        self.writer.open(rosbag2_py.StorageOptions(uri=str(output_dir), storage_id=storage_id),
+                         rosbag2_py.ConverterOptions(input_serialization_format="cdr", output_serialization_format="cdr"))
+        for topic, type_name in topics.items():
+            self.writer.create_topic(rosbag2_py.TopicMetadata(name=topic, type=type_name, serialization_format="cdr"))
+        self.counts = dict.fromkeys(topics, 0)
+
+    def callback(self, topic):
+        def on_message(data):
+            # Only the executor thread calls this, writes are never concurrent
+            if self.writer is not None:
+                self.writer.write(topic, data, time.time_ns())
+                self.counts[topic] += 1
+        return on_message
+
+    def close(self):
+        # Humble's SequentialWriter has no close(); metadata.yaml is written when it is destroyed
+        self.writer = None
+
+class Orchestrator:
+    """Own rclpy context and executor thread for one harness run; the mapping node itself is still launched."""
+
+    def __init__(self):
+        self.context = None
+        self.trajectory_writer = None
+        self.recorder = None
+
+    def start(self):
+        import rclpy
+        from rclpy.executors import SingleThreadedExecutor
+        from std_srvs.srv import Trigger
+
+        self.context = rclpy.Context()
+        rclpy.init(context=self.context)
+        self.node = rclpy.create_node("fastlio_orchestrator", context=self.context)
+        self.map_save_client = self.node.create_client(Trigger, MAP_SAVE_SERVICE)
+        self.executor = SingleThreadedExecutor(context=self.context)
+        self.executor.add_node(self.node)
+        self.thread = threading.Thread(target=self.executor.spin, daemon=True)
+        self.thread.start()
+        return self
+
+    def subscribe(self, topic, type_name, callback, depth=100, reliable=True):
+        """Raw subscription on the orchestrator node; reliable=False also matches best-effort (sensor) publishers."""
+        from rclpy.qos import QoSProfile, ReliabilityPolicy
+        from rosidl_runtime_py.utilities import get_message
+
+        qos = QoSProfile(depth=depth,
+                         reliability=ReliabilityPolicy.RELIABLE if reliable else ReliabilityPolicy.BEST_EFFORT)
+        # raw=True: serialized CDR bytes, nothing is deserialized in the callback
+        self.node.create_subscription(get_message(type_name), topic, callback, qos, raw=True)
+
+    def write_trajectory(self, path, topic=ODOMETRY_TOPIC):
+        """Appends every /Odometry pose to a TUM file during the run (no recorded bag to extract afterwards)."""
+        self.trajectory_writer = TrajectoryWriter(path)
+        self.subscribe(topic, ODOMETRY_TYPE, self.trajectory_writer.on_message)
+        self.node.create_timer(TUM_FLUSH_PERIOD, self.trajectory_writer.flush)
+        return self.trajectory_writer
+
+    def record(self, output_dir, topics):
+        """Records the given output topics (names from OUTPUT_TYPES) into a bag at output_dir."""
+        self.recorder = BagRecorder(output_dir, {t: OUTPUT_TYPES[t] for t in topics})
+        for topic in topics:
+            self.subscribe(topic, OUTPUT_TYPES[topic], self.recorder.callback(topic))
+        return self.recorder
+
+    def play(self, bag_path, rate=1.0, clock=False, cpus=None, start_offset=0.0):
+        """Starts the rosbag2_py player child; returns its Popen (poll() while playing, stop_process() to end early).
+
+        start_offset skips that many bag seconds (Humble's player has no duration; stop it to end a slice).
+        """
+        cmd = [sys.executable, str(Path(__file__).resolve()), "play", str(bag_path), "--rate", str(rate),
+               "--start-offset", str(start_offset)]
+        if clock:
+            cmd.append("--clock")
+        if cpus:
+            cmd = ["taskset", "-c", cpus] + cmd
+        return subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    def save_map(self, timeout=15.0):
+        """Calls /map_save and waits for the response; returns (success, message)."""
+        if not self.map_save_client.wait_for_service(timeout_sec=min(timeout, 5.0)):
+            return False, f"{MAP_SAVE_SERVICE} not available"
+        from std_srvs.srv import Trigger
+
+        done = threading.Event()
+        future = self.map_save_client.call_async(Trigger.Request())
+        future.add_done_callback(lambda _: done.set())
+        if not done.wait(timeout):
+            future.cancel()
+            return False, f"{MAP_SAVE_SERVICE} timed out after {timeout:.0f} s"
+        response = future.result()
+        return response.success, response.message
+
+    def trajectory(self):
+        return self.trajectory_writer.trajectory() if self.trajectory_writer else None
+
+    def close(self):
+        if self.context is None:
+            return
+        self.executor.shutdown()
+        self.thread.join(timeout=2)
+        if self.trajectory_writer:
+            self.trajectory_writer.close()
+        if self.recorder:
+            self.recorder.close()
+        self.node.destroy_node()
+        self.context.try_shutdown()
+        self.context = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+def stop_process(proc, timeout=STOP_TIMEOUT):
+    """SIGINT, then SIGKILL if the process (player child, launch) has not exited after timeout."""
+    if proc.poll() is not None:
+        return proc.returncode
+    proc.send_signal(signal.SIGINT)
+    try:
+        return proc.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        return proc.wait()
+
+def play_bag(bag_path, rate=1.0, clock=False, start_offset=0.0):
+    """Player child body: blocks until the bag is played (SIGINT ends it early via rclcpp's signal handler)."""
+    import rosbag2_py
+    from bag_access import resolve_bag
+
+    storage_id, _ = resolve_bag(bag_path)
+    storage = rosbag2_py.StorageOptions(uri=str(bag_path), storage_id=storage_id)
+    options = rosbag2_py.PlayOptions()
+    options.rate = rate
+    options.start_offset = start_offset  # Seconds from the bag start (the binding converts to ns)
+    options.clock_publish_frequency = CLOCK_HZ if clock else 0.0
+    options.disable_keyboard_controls = True
+    rosbag2_py.Player().play(storage, options)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="rosbag2_py player child of the harness orchestrator.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("play")
+    p.add_argument("bag", help="ROS 2 bag directory or .db3/.mcap file")
+    p.add_argument("--rate", type=float, default=1.0)
+    p.add_argument("--start-offset", type=float, default=0.0, help="Bag seconds skipped before playing")
+    p.add_argument("--clock", action="store_true", help="Publish /clock from the bag time")
+    args = parser.parse_args()
+
+    play_bag(args.bag, args.rate, args.clock, args.start_offset)
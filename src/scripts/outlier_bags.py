@@ -0,0 +1,196 @@
+# Purpose: Reproduction mini-bags around the worst latency outliers of a run.
+#          The top-K frames of the time log (math_time + io_time) are picked at least one window apart; for each one
+#          the IMU and LiDAR messages from `--warmup` seconds before to `--after` seconds past the frame are copied
+#          into a small .db3 bag through the source bag's timestamp index (sqlite) or chunk index (mcap), never a
+#          full pass. outliers.json lists the bags with the target scan, so lockstep_replay.py --fixtures can
+#          replay them as perf fixtures.
+#          Usage: python3 outlier_bags.py RESULT_DIR BAG_PATH [-k 5] [--warmup 10] [--after 2] [--output DIR]
+
+import sys
+import json
+import shutil
+import sqlite3
+import argparse
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import yaml
+from result_cache import load_table
+from bag_access import open_bag, read_metadata
+from stream_health import find_topics, scan_span, LIVOX_TYPES
+
+DEFAULT_K = 5
+# Seconds of input before the outlier: the map around the spike has to be rebuilt before the frame is meaningful
+DEFAULT_WARMUP = 10.0
+DEFAULT_AFTER = 2.0
+# Scans read from the start of the bag to estimate the receive-minus-header clock offset
+OFFSET_SCANS = 20
+# Extra receive-time margin around the window for transport jitter
+MARGIN = 0.5
+# The time log prints frame stamps with 8 decimals; a scan starting this close to the frame is the frame itself
+STAMP_TOLERANCE_NS = 1000
+MANIFEST_NAME = "outliers.json"
+
+BAG_SCHEMA = """
+CREATE TABLE schema (schema_version INTEGER PRIMARY KEY, ros_distro TEXT NOT NULL);
+CREATE TABLE topics (id INTEGER PRIMARY KEY, name TEXT NOT NULL, type TEXT NOT NULL,
+                     serialization_format TEXT NOT NULL, offered_qos_profiles TEXT NOT NULL);
+CREATE TABLE messages (id INTEGER PRIMARY KEY, topic_id INTEGER NOT NULL, timestamp INTEGER NOT NULL, data BLOB NOT NULL);
+CREATE INDEX timestamp_idx ON messages (timestamp ASC);
+INSERT INTO schema VALUES (3, 'humble');
+"""
+
+def frame_latencies(result_dir):
+    """(frame start stamps in s, latency in s) of a result directory: the C++ time log, else telemetry."""
+    result_dir = Path(result_dir)
+    log = result_dir / "fast_lio_time_log.csv"
+    if log.exists():
+        df = load_table(log)
+        latency = df["math_time"] + (df["io_time"] if "io_time" in df.columns else 0)
+        return df["time_stamp"].to_numpy(), latency.to_numpy()
+    found = sorted(result_dir.glob("frame_timing.csv")) + sorted(result_dir.glob("*_frame_timing.csv"))
+    if found:
+        df = pd.read_csv(found[0])
+        return df["lidar_beg_time"].to_numpy(), df["total_time"].to_numpy()
+    raise FileNotFoundError(f"No fast_lio_time_log.csv or frame_timing.csv in {result_dir}")
+
+def pick_outliers(stamps, latency, k, separation):
+    """Indices of the k slowest frames, skipping frames within `separation` s of one already picked."""
+    picked = []
+    for i in np.argsort(latency, kind="stable")[::-1]:
+        if all(abs(stamps[i] - stamps[j]) >= separation for j in picked):
+            picked.append(int(i))
+            if len(picked) == k:
+                break
+    return picked
+
+def clock_offset(reader, lidar_topic, livox):
+    """Median receive-minus-header offset (ns) of the first scans; header time -> bag time for the index reads."""
+    first, _ = reader.time_ranges()[lidar_topic]
+    offsets = []
+    for _, receive, data in reader.messages(topics=[lidar_topic], start=first):
+        begin, _ = scan_span(bytes(data), livox)
+        offsets.append(receive - begin)
+        if len(offsets) == OFFSET_SCANS:
+            break
+    return int(np.median(offsets))
+
+def write_mini_bag(output_dir, messages, topics, qos):
+    """Writes (topic, timestamp, data) rows into a Humble sqlite3 bag with its metadata.yaml."""
+    output_dir = Path(output_dir)
+    if output_dir.exists():
+        shutil.rmtree(output_dir)
+    output_dir.mkdir(parents=True)
+    db_name = f"{output_dir.name}_0.db3"
+    conn = sqlite3.connect(output_dir / db_name)
+    conn.executescript(BAG_SCHEMA)
+    ids = {}
+    for i, (name, msg_type) in enumerate(topics.items(), 1):
+        conn.execute("INSERT INTO topics VALUES (?, ?, ?, 'cdr', ?)", (i, name, msg_type, qos.get(name, "")))
+        ids[name] = i
+    counts = dict.fromkeys(topics, 0)
+    stamps = []
+
+    def rows():
+        for topic, timestamp, data in messages:
+            counts[topic] += 1
+            stamps.append(timestamp)
+            yield ids[topic], timestamp, bytes(data)
+
+    with conn:
+        conn.executemany("INSERT INTO messages (topic_id, timestamp, data) VALUES (?, ?, ?)", rows())
+    conn.close()
+
+    start, end = (min(stamps), max(stamps)) if stamps else (0, 0)
+    info = {
+        "version": 5,
+        "storage_identifier": "sqlite3",
+        "duration": {"nanoseconds": end - start},
+        "starting_time": {"nanoseconds_since_epoch": start},
+        "message_count": len(stamps),
+        "topics_with_message_count": [{
+            "topic_metadata": {"name": name, "type": msg_type, "serialization_format": "cdr",
+                               "offered_qos_profiles": qos.get(name, "")},
+            "message_count": counts[name],
+        } for name, msg_type in topics.items()],
+        "compression_format": "",
+        "compression_mode": "",
+        "relative_file_paths": [db_name],
+        "files": [{"path": db_name, "starting_time": {"nanoseconds_since_epoch": start},
+                   "duration": {"nanoseconds": end - start}, "message_count": len(stamps)}],
+    }
+    with open(output_dir / "metadata.yaml", "w") as f:
+        yaml.safe_dump({"rosbag2_bagfile_information": info}, f, sort_keys=False)
+    return counts
+
+def source_qos(bag_path):
+    """offered_qos_profiles per topic from the source metadata.yaml (empty for bare .db3/.mcap files)."""
+    meta = read_metadata(bag_path) if Path(bag_path).is_dir() else None
+    if not meta:
+        return {}
+    return {t["topic_metadata"]["name"]: t["topic_metadata"].get("offered_qos_profiles", "")
+            for t in meta.get("topics_with_message_count", [])}
+
+def extract_outliers(result_dir, bag_path, k=DEFAULT_K, warmup=DEFAULT_WARMUP, after=DEFAULT_AFTER, output_dir=None):
+    result_dir = Path(result_dir)
+    output_dir = Path(output_dir) if output_dir else result_dir / "outlier_bags"
+    stamps, latency = frame_latencies(result_dir)
+    picked = pick_outliers(stamps, latency, k, warmup + after)
+
+    entries = []
+    with open_bag(bag_path) as reader:
+        type_map = reader.topics()
+        imu_topics, lidar_topics = find_topics(type_map)
+        if not imu_topics or not lidar_topics:
+            raise ValueError(f"Need one IMU and one LiDAR topic, found: {type_map}")
+        imu_topic, lidar_topic = imu_topics[0], lidar_topics[0]
+        livox = type_map[lidar_topic] in LIVOX_TYPES
+        topics = {imu_topic: type_map[imu_topic], lidar_topic: type_map[lidar_topic]}
+        qos = source_qos(bag_path)
+        offset = clock_offset(reader, lidar_topic, livox)
+
+        for rank, i in enumerate(picked, 1):
+            target_ns = int(round(stamps[i] * 1e9))
+            start = target_ns - int((warmup + MARGIN) * 1e9) + offset
+            end = target_ns + int((after + MARGIN) * 1e9) + offset
+            name = f"{rank:02d}_frame{i}_{latency[i] * 1000:.0f}ms"
+            print(f"[{rank}/{len(picked)}] frame {i} ({latency[i] * 1000:.1f} ms) -> {name}")
+
+            # Only the time range is read, through the index; scans before the target are counted on the way
+            before = []
+            def window():
+                for topic, timestamp, data in reader.messages(topics=list(topics), start=start, end=end):
+                    if topic == lidar_topic:
+                        before.append(scan_span(bytes(data), livox)[0] < target_ns - STAMP_TOLERANCE_NS)
+                    yield topic, timestamp, data
+            counts = write_mini_bag(output_dir / name, window(), topics, qos)
+
+            entries.append({
+                "bag": name, "frame": i, "frame_time": float(stamps[i]), "latency_ms": float(latency[i] * 1000),
+                # Index of the outlier scan among the mini-bag's scans (what lockstep_replay reports on)
+                "target_scan": int(sum(before)), "warmup_s": warmup, "after_s": after,
+                "messages": counts,
+            })
+
+    manifest = {"result_dir": str(result_dir), "source_bag": str(bag_path), "imu_topic": imu_topic,
+                "lidar_topic": lidar_topic, "clock_offset_ns": offset, "outliers": entries}
+    with open(output_dir / MANIFEST_NAME, "w") as f:
+        json.dump(manifest, f, indent=2)
+    return output_dir, manifest
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cut reproduction mini-bags around a run's worst latency frames.")
+    parser.add_argument("result_dir", help="Result directory with fast_lio_time_log.csv (or frame_timing.csv)")
+    parser.add_argument("bag", help="Source bag the run replayed (directory or .db3/.mcap file)")
+    parser.add_argument("-k", type=int, default=DEFAULT_K, help="Number of outlier frames")
+    parser.add_argument("--warmup", type=float, default=DEFAULT_WARMUP, help="Seconds of input before the frame")
+    parser.add_argument("--after", type=float, default=DEFAULT_AFTER, help="Seconds of input after the frame")
+    parser.add_argument("--output", help="Default: RESULT_DIR/outlier_bags")
+    args = parser.parse_args()
+
+    try:
+        out, manifest = extract_outliers(args.result_dir, args.bag, args.k, args.warmup, args.after, args.output)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    print(f"{len(manifest['outliers'])} mini-bags and {MANIFEST_NAME} written to {out}")
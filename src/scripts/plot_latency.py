@@ -2,6 +2,8 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import sys
 import os
+from result_cache import load_table
+from latency_hist import LatencyHistogram
 
 def plot_latency(csv_file, output_image):
     print(f"Generating latency plot from: {csv_file}")
@@ -11,8 +13,8 @@ def plot_latency(csv_file, output_image):
         return
 
     try:
-        # Read CSV, handling potential spaces after commas
-        df = pd.read_csv(csv_file, skipinitialspace=True)
+        # Read CSV (through the columnar cache), handling potential spaces after commas
+        df = load_table(csv_file)
         
         if df.empty:
             print("Warning: CSV is empty. Skipping plot.")
@@ -55,12 +57,15 @@ def plot_latency(csv_file, output_image):
         plt.grid(True, linestyle=':', alpha=0.6)
         
         # Statistics Box
-        avg_val = total_time.mean()
-        max_val = total_time.max()
+        hist = LatencyHistogram()
+        hist.record(total_time.to_numpy() / 1000.0)
+        s = hist.summary()
         
         stats_text = (
-            f"Avg Total: {avg_val:.2f} ms\n"
-            f"Max Total: {max_val:.2f} ms"
+            f"p50 / p99:   {s['p50_ms']:.2f} / {s['p99_ms']:.2f} ms\n"
+            f"p99.9 / Max: {s['p99.9_ms']:.2f} / {s['max_ms']:.2f} ms\n"
+            f"Jitter:      {s['jitter_ms']:.2f} ms\n"
+            f"Over 100ms:  {s['over_deadline']} (longest run {s['longest_over_run']})"
         )
         
         if has_io:
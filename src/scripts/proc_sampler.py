@@ -0,0 +1,230 @@
+# Purpose: High-rate (50-100 Hz) per-thread resource sampler for the mapping node, read straight from /proc.
+#          Every sample records, per thread, CPU time (schedstat, ns), voluntary / involuntary context switches and
+#          minor / major faults, plus process RSS and read / write bytes, into a preallocated ring buffer.
+#          Samples can be aligned to frame start / end times to see what each frame cost.
+#          Usage: python3 proc_sampler.py [PID] [SECONDS]
+
+import os
+import sys
+import json
+import time
+import threading
+import numpy as np
+
+SAMPLE_HZ = 100
+MAX_THREADS = 32
+# Samples kept in memory; drain() at least this often or older samples are overwritten
+RING_SECONDS = 60
+# Thread list re-read every this many samples (OpenMP and ikd-tree rebuild threads appear lazily)
+THREAD_SCAN_EVERY = 20
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+THREAD_FIELDS = ["cpu_ns", "voluntary", "involuntary", "minflt", "majflt"]
+
+def sample_dtype(max_threads=MAX_THREADS):
+    """One sample: monotonic time, process counters and one column per thread slot (all cumulative)."""
+    return np.dtype([("t", "f8"), ("rss", "u8"), ("read_bytes", "u8"), ("write_bytes", "u8"),
+                     ("cpu_ns", "u8", (max_threads,)), ("voluntary", "u8", (max_threads,)),
+                     ("involuntary", "u8", (max_threads,)), ("minflt", "u8", (max_threads,)),
+                     ("majflt", "u8", (max_threads,))])
+
+def _read(fd):
+    return os.pread(fd, 4096, 0)
+
+def _status_value(text, key):
+    start = text.index(key) + len(key)
+    return int(text[start:text.index(b"\n", start)])
+
+class ProcSampler:
+    """Samples /proc/<pid> at a fixed rate in a background thread; drain() hands out new samples in order.
+
+    Threads are grouped as "main" (the spinning thread running the timer callback), "ros" (executor / DDS
+    threads already present when sampling starts) and "compute" (threads created later: OpenMP workers of
+    h_share_model and the ikd-tree rebuild thread). Start the sampler once the node is ready.
+    """
+
+    def __init__(self, pid, rate_hz=SAMPLE_HZ, ring_seconds=RING_SECONDS, max_threads=MAX_THREADS):
+        self.pid = pid
+        self.period = 1.0 / rate_hz
+        self.rate_hz = rate_hz
+        self.max_threads = max_threads
+        self.ring = np.zeros(int(rate_hz * ring_seconds), dtype=sample_dtype(max_threads))
+        self.current = np.zeros(1, dtype=self.ring.dtype)[0]
+        self.written = 0        # Samples written since start
+        self.drained = 0        # Samples handed out by drain()
+        self.lost = 0           # Samples overwritten before they were drained
+        self.threads = {}       # tid -> {"slot", "name", "group"}
+        self.fds = {}           # tid -> (stat, status, schedstat) descriptors
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.task_dir = f"/proc/{pid}/task"
+        self.proc_fds = (os.open(f"/proc/{pid}/statm", os.O_RDONLY), os.open(f"/proc/{pid}/io", os.O_RDONLY))
+        self.scans = 0
+
+    def _scan_threads(self):
+        try:
+            tids = [int(t) for t in os.listdir(self.task_dir)]
+        except OSError:
+            return
+        for tid in tids:
+            if tid in self.threads or len(self.threads) >= self.max_threads:
+                continue
+            base = f"{self.task_dir}/{tid}"
+            try:
+                fds = tuple(os.open(f"{base}/{name}", os.O_RDONLY) for name in ("stat", "status", "schedstat"))
+                with open(f"{base}/comm", "r") as f:
+                    name = f.read().strip()
+            except OSError:
+                continue  # Thread exited in between
+            group = "main" if tid == self.pid else ("ros" if self.scans == 0 else "compute")
+            self.threads[tid] = {"slot": len(self.threads), "name": name, "group": group}
+            self.fds[tid] = fds
+        self.scans += 1
+
+    def _read_thread(self, tid, fds, slot):
+        stat, status, schedstat = (_read(fd) for fd in fds)
+        # Fields after the ") " that closes comm: state is field 3, minflt 10, majflt 12
+        fields = stat[stat.rindex(b")") + 2:].split()
+        row = self.current
+        row["cpu_ns"][slot] = int(schedstat.split()[0])
+        row["minflt"][slot] = int(fields[7])
+        row["majflt"][slot] = int(fields[9])
+        row["voluntary"][slot] = _status_value(status, b"\nvoluntary_ctxt_switches:")
+        row["involuntary"][slot] = _status_value(status, b"\nnonvoluntary_ctxt_switches:")
+
+    def sample(self):
+        """Takes one sample into the ring; returns False once the process is gone."""
+        if self.written % THREAD_SCAN_EVERY == 0:
+            self._scan_threads()
+        row = self.current
+        try:
+            statm, io = (_read(fd) for fd in self.proc_fds)
+        except OSError:
+            return False
+        row["t"] = time.monotonic()
+        row["rss"] = int(statm.split()[1]) * PAGE_SIZE
+        row["read_bytes"] = _status_value(io, b"\nread_bytes:")
+        row["write_bytes"] = _status_value(io, b"\nwrite_bytes:")
+        for tid, fds in list(self.fds.items()):
+            try:
+                self._read_thread(tid, fds, self.threads[tid]["slot"])
+            except (OSError, ValueError):
+                # Exited thread: its last values stay in the row, so its deltas are zero from now on
+                for fd in self.fds.pop(tid):
+                    os.close(fd)
+
+        with self.lock:
+            self.ring[self.written % len(self.ring)] = row
+            self.written += 1
+        return True
+
+    def _run(self):
+        next_t = time.monotonic()
+        while not self.stop_event.is_set():
+            if not self.sample():
+                break
+            # Fixed schedule: a slow sample does not shift every later one
+            next_t += self.period
+            delay = next_t - time.monotonic()
+            if delay > 0:
+                self.stop_event.wait(delay)
+            else:
+                next_t = time.monotonic()
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join()
+        for fds in list(self.fds.values()) + [self.proc_fds]:
+            for fd in fds:
+                os.close(fd)
+        self.fds = {}
+        self.proc_fds = ()
+
+    def drain(self):
+        """Samples written since the last drain(), oldest first (a copy)."""
+        with self.lock:
+            start = max(self.drained, self.written - len(self.ring))
+            self.lost += start - self.drained
+            idx = np.arange(start, self.written) % len(self.ring)
+            chunk = self.ring[idx]
+            self.drained = self.written
+        return chunk
+
+    def thread_table(self):
+        return [dict(info, tid=tid) for tid, info in sorted(self.threads.items(), key=lambda t: t[1]["slot"])]
+
+    def save_meta(self, path):
+        with open(path, "w") as f:
+            json.dump({"pid": self.pid, "rate_hz": self.rate_hz, "max_threads": self.max_threads,
+                       "lost_samples": self.lost, "threads": self.thread_table()}, f, indent=2)
+
+def load_samples(samples_path, meta_path):
+    """Reads a file of drained chunks (ndarray.tofile) back with the thread table saved by save_meta()."""
+    with open(meta_path, "r") as f:
+        meta = json.load(f)
+    return np.fromfile(samples_path, dtype=sample_dtype(meta["max_threads"])), meta["threads"]
+
+def cpu_percent(samples):
+    """Process CPU % over a chunk of samples (100 = one full core)."""
+    if len(samples) < 2:
+        return 0.0
+    busy = np.diff(samples["cpu_ns"].sum(axis=1).astype(np.int64)[[0, -1]])[0] / 1e9
+    return busy / (samples["t"][-1] - samples["t"][0]) * 100
+
+def thread_summary(samples, threads):
+    """Per-thread totals over the run: CPU seconds, mean CPU %, context switches and faults."""
+    span = samples["t"][-1] - samples["t"][0] if len(samples) > 1 else 0.0
+    rows = []
+    for th in threads:
+        delta = {f: int(samples[f][-1, th["slot"]]) - int(samples[f][0, th["slot"]]) for f in THREAD_FIELDS}
+        rows.append({"tid": th["tid"], "name": th["name"], "group": th["group"],
+                     "cpu_s": delta["cpu_ns"] / 1e9, "cpu_percent": delta["cpu_ns"] / 1e9 / span * 100 if span else 0.0,
+                     "voluntary": delta["voluntary"], "involuntary": delta["involuntary"],
+                     "minflt": delta["minflt"], "majflt": delta["majflt"]})
+    return rows
+
+def frame_resources(samples, threads, frame_start, frame_end):
+    """Resources used inside each frame's [start, end] window (monotonic seconds), interpolated between samples.
+
+    Returns a dict of per-frame arrays: CPU ms per thread group, context switches, faults and I/O bytes.
+    """
+    t = samples["t"]
+    out = {}
+
+    def window(cumulative):
+        cumulative = cumulative.astype(np.float64)
+        return np.interp(frame_end, t, cumulative) - np.interp(frame_start, t, cumulative)
+
+    for group in ("main", "compute", "ros"):
+        slots = [th["slot"] for th in threads if th["group"] == group]
+        out[f"cpu_{group}_ms"] = window(samples["cpu_ns"][:, slots].sum(axis=1)) / 1e6 if slots else np.zeros(len(frame_end))
+    for field in ("voluntary", "involuntary", "minflt", "majflt"):
+        out[field] = window(samples[field].sum(axis=1))
+    out["read_bytes"] = window(samples["read_bytes"])
+    out["write_bytes"] = window(samples["write_bytes"])
+    # How much of the window the sampler actually covered (0 before the first / after the last sample)
+    out["covered"] = (frame_start >= t[0]) & (frame_end <= t[-1]) if len(t) else np.zeros(len(frame_end), bool)
+    return out
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python3 proc_sampler.py [PID] [SECONDS]")
+        sys.exit(1)
+    pid = int(sys.argv[1])
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 10.0
+    sampler = ProcSampler(pid).start()
+    time.sleep(seconds)
+    sampler.stop()
+    samples = sampler.drain()
+    print(f"{len(samples)} samples ({len(samples) / seconds:.1f} Hz), CPU {cpu_percent(samples):.1f} %, "
+          f"RSS {samples['rss'][-1] / 2**20:.1f} MB")
+    for row in thread_summary(samples, sampler.thread_table()):
+        print(f"  {row['tid']:>7} {row['name']:<16} {row['group']:<8} {row['cpu_percent']:6.1f} % "
+              f"vol {row['voluntary']:>6} invol {row['involuntary']:>6} minflt {row['minflt']:>7} majflt {row['majflt']:>4}")
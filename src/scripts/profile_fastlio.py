@@ -1,15 +1,18 @@
 #!/usr/bin/env python3
 import subprocess
-import re
-import os
 import time
 import sys
-import signal
 import psutil
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 import shutil  # Added for moving files
 from pathlib import Path
+from bag_info import bag_info
+from node_ready import wait_for_mapping_node
+from orchestrator import Orchestrator, stop_process
+import proc_sampler
+from results_db import record_run
 
 def get_mapping_pid():
     for proc in psutil.process_iter(['pid', 'name', 'cmdline']):
@@ -26,10 +29,8 @@ def run_profile(bag_path, config="avia.yaml"):
     
     # 2. Get bag duration for progress bar
     try:
-        info_proc = subprocess.run(['ros2', 'bag', 'info', bag_path], capture_output=True, text=True)
-        duration_match = re.search(r"Duration:\s+(\d+\.\d+)s", info_proc.stdout)
-        total_duration = float(duration_match.group(1)) if duration_match else 0
-    except Exception as e:
+        total_duration = bag_info(bag_path)["duration"]
+    except (OSError, ValueError) as e:
         print(f"Warning: Could not get bag duration: {e}")
         total_duration = 0
 
@@ -39,18 +40,23 @@ def run_profile(bag_path, config="avia.yaml"):
                                      f'config_file:={config}', 'use_sim_time:=true', 'rviz:=false'],
                                      stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT)
     
-    mapping_pid = None
     print("Waiting for node to start...")
-    while mapping_pid is None:
-        time.sleep(1)
-        mapping_pid = get_mapping_pid()
+    # Ready = subscribed to its inputs and serving /map_save, so the process is up as well
+    mapping_pid = get_mapping_pid() if wait_for_mapping_node(config, proc=mapping_launch) is not None else None
+    if mapping_pid is None:
+        print("FAST-LIO did not become ready, aborting.")
+        stop_process(mapping_launch)
+        return
     
-    p = psutil.Process(mapping_pid)
+    # Per-thread /proc samples at 100 Hz; drained to disk once per progress update
+    sampler = proc_sampler.ProcSampler(mapping_pid).start()
+    samples_file = open(results_dir / f"{bag_name}_proc_samples.bin", "wb")
+    last = None
 
     # 4. Start Playback
     print(f"Starting Bag Playback: {bag_name}")
-    play_proc = subprocess.Popen(['ros2', 'bag', 'play', bag_path, '--clock'], 
-                                 stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT)
+    orchestrator = Orchestrator().start()
+    play_proc = orchestrator.play(bag_path, clock=True)
 
     # 5. Monitoring Loop with Progress Bar
     stats = []
@@ -61,12 +67,18 @@ def run_profile(bag_path, config="avia.yaml"):
             elapsed = time.time() - start_time
             
             # Capture Metrics
-            try:
-                cpu = p.cpu_percent(interval=None) 
-                ram = p.memory_info().rss / (1024 * 1024) # MB
-            except psutil.NoSuchProcess:
-                break
-                
+            chunk = sampler.drain()
+            chunk.tofile(samples_file)
+            if not sampler.thread.is_alive():
+                break # Process died
+            if len(chunk) == 0:
+                time.sleep(1)
+                continue
+            span = chunk if last is None else np.concatenate([last[None], chunk])
+            last = chunk[-1]
+            cpu = proc_sampler.cpu_percent(span)
+            ram = chunk["rss"][-1] / (1024 * 1024) # MB
+
             stats.append([elapsed, cpu, ram])
             
             # Progress Bar Logic
@@ -84,25 +96,20 @@ def run_profile(bag_path, config="avia.yaml"):
     finally:
         # === NEW STEP: TRIGGER SAVE BEFORE KILLING ===
         print("\n\nPlayback finished. Triggering Map Save...")
-        try:
-            # Call the ROS 2 Service to save the map
-            # This respects the filename set in your YAML (e.g., ./RAM_TEST.pcd)
-            subprocess.run(
-                ['ros2', 'service', 'call', '/map_save', 'std_srvs/srv/Trigger'],
-                stdout=subprocess.DEVNULL, 
-                stderr=subprocess.DEVNULL,
-                timeout=15 # Wait up to 15 seconds for the save to complete
-            )
-            print("Service call sent!")
-        except subprocess.TimeoutExpired:
-            print("Warning: Map save timed out!")
-        except Exception as e:
-            print(f"Failed to trigger map save: {e}")
+        stop_process(play_proc)
+        # Call the ROS 2 Service to save the map
+        # This respects the filename set in your YAML (e.g., ./RAM_TEST.pcd)
+        saved, message = orchestrator.save_map(timeout=15) # Wait up to 15 seconds for the save to complete
+        print("Map saved!" if saved else f"Warning: Map save failed: {message}")
+        orchestrator.close()
 
         # Kill the node
         print("Stopping FAST-LIO node...")
-        os.kill(mapping_launch.pid, signal.SIGINT)
-        time.sleep(2) # Give it time to shut down cleanly
+        sampler.stop()
+        sampler.drain().tofile(samples_file)
+        samples_file.close()
+        sampler.save_meta(results_dir / f"{bag_name}_proc_samples.json")
+        stop_process(mapping_launch) # Give it time to shut down cleanly
 
     # 6. Final Plotting & Statistics Summary
     df = pd.DataFrame(stats, columns=['Time', 'CPU', 'RAM'])
@@ -124,6 +131,15 @@ def run_profile(bag_path, config="avia.yaml"):
     print(f" Final RAM Usage:  {final_ram:8.2f} MB")
     print("="*40 + "\n")
 
+    # Per-thread split: main (timer callback), compute (OpenMP / ikd-tree rebuild), ros (executor / DDS)
+    samples, threads = proc_sampler.load_samples(results_dir / f"{bag_name}_proc_samples.bin",
+                                                 results_dir / f"{bag_name}_proc_samples.json")
+    df_threads = pd.DataFrame(proc_sampler.thread_summary(samples, threads))
+    df_threads.to_csv(results_dir / f"{bag_name}_threads.csv", index=False)
+    if not df_threads.empty:
+        print(df_threads.groupby("group")[["cpu_percent", "voluntary", "involuntary", "minflt", "majflt"]].sum().round(1))
+        print()
+
     # Generate Plot
     fig, ax1 = plt.subplots(figsize=(12, 6))
     ax2 = ax1.twinx()
@@ -150,6 +166,9 @@ def run_profile(bag_path, config="avia.yaml"):
     else:
         print(f"WARNING: Could not find {source_pcd}. Did the YAML save path match?")
 
+    record_run("profile_fastlio", bag_name, config,
+               {"peak_cpu": float(peak_cpu), "avg_cpu": float(avg_cpu), "peak_ram_mb": float(peak_ram),
+                "final_ram_mb": float(final_ram)}, results_dir, resources=stats)
     print(f"Analysis complete. All files saved in {results_dir}")
 
 if __name__ == "__main__":
@@ -0,0 +1,213 @@
+# Purpose: Finds the highest playback rate (x real-time) FAST-LIO can sustain on a bag/config.
+#          Each trial relaunches the node, plays a slice of the bag at rate R (the orchestrator's rosbag2_py player
+#          child, started at the slice offset) and judges it from /frame_timing: frames processed vs scans
+#          delivered, and whether the per-frame lag keeps growing.
+#          The rate is bracketed by doubling, then bisected. One figure per bag/config is appended to
+#          realtime_capacity.csv next to benchmark_comparison.csv.
+#          Usage: python3 rate_search.py [BAG_PATH] [CONFIG_FILE]
+
+import csv
+import json
+import time
+import argparse
+import subprocess
+from pathlib import Path
+import numpy as np
+from bag_access import open_bag
+from bag_info import bag_info
+from stream_health import find_topics
+from telemetry import TelemetryListener
+from node_ready import wait_for_mapping_node
+from results_db import record_run
+from orchestrator import Orchestrator, stop_process
+
+RESULTS_BASE = Path("/root/ros2_ws/src/results/full_analysis_results")
+
+# The first scan and the map initialisation scan never produce a record
+INIT_FRAMES = 2
+MIN_PROCESSED_RATIO = 0.98
+# Lag growth (first vs last fifth of the trial) that counts as a growing backlog
+MAX_LAG_GROWTH = 0.1
+# Time given to in-flight frames after the player is stopped; backlogged frames arriving later do not count
+DRAIN_TIME = 1.0
+# Player start-up (interpreter, DDS discovery, bag open) allowed before the first scan must arrive
+PLAYER_START_TIMEOUT = 30.0
+
+def lag_growth(arrivals, scan_times, rate):
+    """Seconds by which output lags further behind the bag clock at the end of a trial than at its start.
+
+    lag = wall arrival - bag time / rate; it is flat when the node keeps up and grows linearly with a backlog.
+    """
+    if len(arrivals) < 10:
+        return 0.0
+    lag = (arrivals - arrivals[0]) - (scan_times - scan_times[0]) / rate
+    fifth = max(len(lag) // 5, 1)
+    return float(np.median(lag[-fifth:]) - np.median(lag[:fifth]))
+
+def wait_until(condition, proc, timeout):
+    """Polls condition() until it holds, the player exits or timeout passes; returns condition()."""
+    deadline = time.monotonic() + timeout
+    while not condition() and proc.poll() is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+def run_trial(bag_path, config, rate, offset, duration, lidar_topic, lidar_type):
+    """Plays `duration` bag seconds from `offset` at `rate` into a fresh mapping node and judges the result.
+
+    Frames are judged against the scans actually delivered on lidar_topic, and the slice is timed from the
+    first of them: player start-up does not eat into the slice, whatever the rate.
+    """
+    mapping_proc = subprocess.Popen(['ros2', 'launch', 'fast_lio', 'mapping.launch.py',
+                                     f'config_file:={config}', 'rviz:=false'],
+                                    stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT)
+    listener = TelemetryListener().start()
+    orchestrator = Orchestrator().start()
+    scans = []  # time.monotonic() of every scan the player delivered
+    orchestrator.subscribe(lidar_topic, lidar_type, lambda _: scans.append(time.monotonic()), depth=1000,
+                           reliable=False)
+    player = None
+    try:
+        if wait_for_mapping_node(config, proc=mapping_proc) is None:
+            raise RuntimeError("Mapping node did not become ready")
+
+        player = orchestrator.play(bag_path, rate=rate, start_offset=offset)
+        if not wait_until(lambda: scans, player, PLAYER_START_TIMEOUT):
+            raise RuntimeError(f"No scan on {lidar_topic} within {PLAYER_START_TIMEOUT:.0f} s of starting the player")
+        # Humble's player has no duration option; the slice ends when the player is stopped
+        wait_until(lambda: time.monotonic() >= scans[0] + duration / rate, player, duration / rate)
+        stop_process(player)
+        delivered = len(scans)
+        deadline = time.monotonic() + DRAIN_TIME
+        time.sleep(DRAIN_TIME)
+
+        frames = listener.frames()
+        arrivals = listener.arrival_times()[:len(frames)]
+    finally:
+        if player is not None:
+            stop_process(player)
+        orchestrator.close()
+        listener.stop()
+        stop_process(mapping_proc)
+
+    on_time = arrivals <= deadline
+    processed = int(np.sum(on_time))
+    expected = max(delivered - INIT_FRAMES, 1)
+    growth = lag_growth(arrivals[on_time], frames["lidar_beg_time"][on_time], rate)
+    total_ms = frames["total_time"][on_time] * 1000
+    trial = {
+        "rate": rate,
+        "delivered": delivered,
+        "processed": processed,
+        "processed_ratio": processed / expected,
+        "lag_growth_s": growth,
+        "p99_total_ms": float(np.percentile(total_ms, 99)) if len(total_ms) else 0.0,
+    }
+    trial["sustained"] = trial["processed_ratio"] >= MIN_PROCESSED_RATIO and growth <= MAX_LAG_GROWTH
+    return trial
+
+def find_max_rate(bag_path, config, offset=0.0, duration=60.0, min_rate=0.25, max_rate=16.0, tolerance=0.05):
+    """Brackets the sustainable rate by doubling from 1x, then bisects until hi / lo <= 1 + tolerance."""
+    info = bag_info(bag_path)
+    with open_bag(bag_path) as reader:
+        imu_topics, lidar_topics = find_topics(reader.topics())
+        if not imu_topics or not lidar_topics:
+            raise ValueError(f"Need one IMU and one LiDAR topic, found: {list(info['topics'])}")
+        lidar_topic = lidar_topics[0]
+        lidar_type = reader.topics()[lidar_topic]
+        duration = min(duration, info["duration"] - offset)
+        start_ns = int(info["start_ms"] * 1e6 + offset * 1e9)
+        # Scans in the slice (the trials count what is actually delivered)
+        published = reader.count([lidar_topic], start_ns, start_ns + int(duration * 1e9))
+
+    trials = []
+    def trial(rate):
+        t = run_trial(bag_path, config, rate, offset, duration, lidar_topic, lidar_type)
+        trials.append(t)
+        print(f"  {rate:6.2f}x: {t['processed']}/{t['delivered']} frames, lag growth {t['lag_growth_s'] * 1000:+.0f} ms, "
+              f"p99 {t['p99_total_ms']:.1f} ms -> {'OK' if t['sustained'] else 'FAIL'}")
+        return t["sustained"]
+
+    print(f"Rate search on {Path(bag_path).stem} ({config}): {duration:.0f} s slice from {offset:.0f} s, "
+          f"{published} scans on {lidar_topic}")
+    lo, hi = None, None
+    rate = 1.0
+    if trial(rate):
+        lo = rate
+        while lo < max_rate:
+            rate = min(lo * 2, max_rate)
+            if not trial(rate):
+                hi = rate
+                break
+            lo = rate
+    else:
+        hi = rate
+        while hi > min_rate:
+            rate = max(hi / 2, min_rate)
+            if trial(rate):
+                lo = rate
+                break
+            hi = rate
+
+    if lo is not None and hi is not None:
+        while hi / lo > 1 + tolerance:
+            rate = (lo * hi) ** 0.5  # Bisect in log space, rates are ratios
+            if trial(rate):
+                lo = rate
+            else:
+                hi = rate
+
+    return {
+        "bag": str(bag_path),
+        "config": config,
+        "offset_s": offset,
+        "duration_s": duration,
+        # None when even min_rate could not be sustained
+        "max_rate": lo,
+        "trials": trials,
+    }
+
+def save_result(result):
+    """Appends the capacity figure to realtime_capacity.csv and keeps the trials as JSON."""
+    RESULTS_BASE.mkdir(parents=True, exist_ok=True)
+    bag_name = Path(result["bag"]).stem
+    master_csv = RESULTS_BASE / "realtime_capacity.csv"
+    file_exists = master_csv.exists()
+    with open(master_csv, "a", newline="") as f:
+        writer = csv.writer(f)
+        if not file_exists:
+            writer.writerow(["Timestamp", "Bag Name", "Config", "Slice Start (s)", "Slice Duration (s)",
+                             "Max Rate (x real-time)", "Trials"])
+        writer.writerow([
+            time.strftime("%Y-%m-%d %H:%M:%S"),
+            bag_name,
+            result["config"],
+            f"{result['offset_s']:.1f}",
+            f"{result['duration_s']:.1f}",
+            f"{result['max_rate']:.2f}" if result["max_rate"] else "",
+            len(result["trials"]),
+        ])
+    out = RESULTS_BASE / f"{bag_name}_rate_search.json"
+    with open(out, "w") as f:
+        json.dump(result, f, indent=2)
+    return master_csv, out
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Search the maximum real-time rate FAST-LIO sustains on a bag.")
+    parser.add_argument("bag", help="ROS 2 bag directory or .db3/.mcap file")
+    parser.add_argument("config", nargs="?", default="velodyne.yaml", help="FAST-LIO config file")
+    parser.add_argument("--offset", type=float, default=0.0, help="Bag seconds skipped before the slice")
+    parser.add_argument("--duration", type=float, default=60.0, help="Bag seconds played per trial")
+    parser.add_argument("--min-rate", type=float, default=0.25)
+    parser.add_argument("--max-rate", type=float, default=16.0)
+    parser.add_argument("--tolerance", type=float, default=0.05, help="Stop when hi / lo <= 1 + tolerance")
+    args = parser.parse_args()
+
+    result = find_max_rate(args.bag, args.config, args.offset, args.duration,
+                           args.min_rate, args.max_rate, args.tolerance)
+    master_csv, out = save_result(result)
+    if result["max_rate"]:
+        print(f"\nMax sustainable rate: {result['max_rate']:.2f}x real-time")
+    else:
+        print(f"\nNot sustainable even at {args.min_rate}x real-time")
+    print(f"Added entry to {master_csv}, trials saved to {out}")
+    record_run("rate_search", args.bag, args.config, result, RESULTS_BASE)
@@ -1,16 +1,19 @@
 import subprocess
-import re
-import os
 import time
 import sys
-import signal
 from pathlib import Path
+from bag_info import bag_info
+from node_ready import wait_for_mapping_node
+from orchestrator import Orchestrator, stop_process
+import cloud_capture
 
-def run_and_record(bag_path, config="avia.yaml"):
+def run_and_record(bag_path, config="avia.yaml", capture="full"):
     # 1. Setup Paths
     bag_name = Path(bag_path).stem
     results_base = Path("/root/ros2_ws/src/results")
     output_bag_dir = results_base / f"{bag_name}_recorded_output"
+    tum_path = results_base / f"{bag_name}_trajectory.tum"
+    capture_dir = results_base / f"{bag_name}_cloud_capture"
     
     if output_bag_dir.exists():
         print(f" Warning: {output_bag_dir} already exists. Removing old data...")
@@ -18,12 +21,11 @@ def run_and_record(bag_path, config="avia.yaml"):
 
     # 2. Get bag duration for progress bar
     print(f" Analysig input bag: {bag_name}...")
-    info_proc = subprocess.run(['ros2', 'bag', 'info', bag_path], capture_output=True, text=True)
-    duration_match = re.search(r"Duration:\s+(\d+\.\d+)s", info_proc.stdout)
-    if not duration_match:
-        print("Could not determine bag duration. Check if the bag path is correct.")
+    try:
+        total_duration = bag_info(bag_path)["duration"]
+    except (OSError, ValueError) as e:
+        print(f"Could not determine bag duration ({e}). Check if the bag path is correct.")
         return
-    total_duration = float(duration_match.group(1))
 
     # 3. Start FAST-LIO (Headless)
     print(f"Launching FAST-LIO...")
@@ -31,21 +33,28 @@ def run_and_record(bag_path, config="avia.yaml"):
                    f'config_file:={config}', 'use_sim_time:=true', 'rviz:=false']
     mapping_proc = subprocess.Popen(mapping_cmd, stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT)
 
-    # Give FAST-LIO a moment to initialize its publishers
-    time.sleep(3)
+    # Wait until FAST-LIO subscribes to its inputs and serves /map_save
+    if wait_for_mapping_node(config, proc=mapping_proc) is None:
+        print("FAST-LIO did not become ready, aborting.")
+        stop_process(mapping_proc)
+        return
 
-    # 4. Start Recording Results
+    # 4. Start Recording Results (in-process subscriptions, no 'ros2 bag record')
     print(f"Recording topics to: {output_bag_dir}")
-    # Recording Odometry for APE, Cloud for map, and Path for visual summary
-    record_cmd = ['ros2', 'bag', 'record', '/Odometry', '/cloud_registered', '/path', 
-                  '-o', str(output_bag_dir)]
-    record_proc = subprocess.Popen(record_cmd, stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT)
+    orchestrator = Orchestrator().start()
+    # Recording Odometry for APE and Path for visual summary
+    orchestrator.record(output_bag_dir, ['/Odometry', '/path'])
+    # Cloud for map: chunked float32 files from a pinned capture process instead of the bag (cloud_capture.py pcd)
+    if capture_dir.exists():
+        subprocess.run(['rm', '-rf', str(capture_dir)])
+    capture_proc = cloud_capture.start_capture(capture_dir, capture, cpu=cloud_capture.capture_cpu())
+    # The TUM trajectory is written while mapping runs, ready for evo without extracting it from the bag
+    orchestrator.write_trajectory(tum_path)
 
     # 5. Play the Raw Data Bag
     print(f"Playing input bag...")
-    play_cmd = ['ros2', 'bag', 'play', bag_path, '--clock']
     # Start playback in background so we can track progress
-    play_proc = subprocess.Popen(play_cmd, stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT)
+    play_proc = orchestrator.play(bag_path, clock=True)
 
     # 6. Progress Bar Monitoring
     start_time = time.time()
@@ -73,22 +82,26 @@ def run_and_record(bag_path, config="avia.yaml"):
         # 7. Cleanup and Shutdown
         print(f"Playback finished. Wrapping up recording...")
         
-        # Kill record_proc first to ensure the bag is closed properly
-        os.kill(record_proc.pid, signal.SIGINT)
-        # Kill mapping
-        os.kill(mapping_proc.pid, signal.SIGINT)
-        # Kill playback if it's still running for some reason
-        if play_proc.poll() is None:
-            os.kill(play_proc.pid, signal.SIGINT)
-        
-        time.sleep(2)
+        # Stop playback if it's still running, then close the capture and the recorder so the bag is finalised
+        stop_process(play_proc)
+        if capture_proc:
+            stop_process(capture_proc)
+        orchestrator.close()
+        # Stop mapping
+        stop_process(mapping_proc)
+
         print(f"Done Results stored in: {output_bag_dir}")
+        print(f"Trajectory ({len(orchestrator.trajectory())} poses) stored in: {tum_path}")
+        stats = cloud_capture.load_capture_stats(capture_dir)
+        if stats:
+            print(cloud_capture.format_capture_stats(stats), end="")
 
 if __name__ == "__main__":
     if len(sys.argv) < 2:
-        print("Usage: python3 record_fastlio.py [BAG_PATH] [CONFIG]")
+        print("Usage: python3 record_fastlio.py [BAG_PATH] [CONFIG] [off|voxel|every-nth|full]")
         sys.exit(1)
     
     bag = sys.argv[1]
     cfg = sys.argv[2] if len(sys.argv) > 2 else "avia.yaml"
-    run_and_record(bag, cfg)
+    capture = sys.argv[3] if len(sys.argv) > 3 else "full"
+    run_and_record(bag, cfg, capture)
@@ -0,0 +1,115 @@
+# Purpose: Content-addressed cache for extracted trajectories, time logs and resource samples.
+#          Entries are stored as compressed .npz column files under the results directory and
+#          evicted least-recently-used once the cache grows past CACHE_MAX_BYTES.
+
+import os
+import hashlib
+import tempfile
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+CACHE_DIR = Path(os.environ.get("FASTLIO_CACHE_DIR", "/root/ros2_ws/src/results/.cache"))
+CACHE_MAX_BYTES = 2 * 1024**3
+# Bytes hashed from the head and tail of large data files (full hashing a 20 GB bag is slower than replaying it)
+SAMPLE_BYTES = 1024 * 1024
+CACHE_VERSION = b"v1"
+
+def _hash_file(h, path):
+    size = path.stat().st_size
+    h.update(path.name.encode())
+    h.update(str(size).encode())
+    with open(path, "rb") as f:
+        if size <= 2 * SAMPLE_BYTES:
+            h.update(f.read())
+        else:
+            h.update(f.read(SAMPLE_BYTES))
+            f.seek(-SAMPLE_BYTES, os.SEEK_END)
+            h.update(f.read(SAMPLE_BYTES))
+
+def bag_key(bag_path):
+    """Hash of a bag's metadata.yaml and its .db3/.mcap data files."""
+    bag_path = Path(bag_path)
+    h = hashlib.sha256(CACHE_VERSION)
+    if bag_path.is_file():
+        _hash_file(h, bag_path)
+    else:
+        files = [bag_path / "metadata.yaml"] + sorted(bag_path.glob("*.db3")) + sorted(bag_path.glob("*.mcap"))
+        for f in files:
+            if f.exists():
+                _hash_file(h, f)
+    return h.hexdigest()[:32]
+
+def file_key(path):
+    """Hash of a single (CSV) file."""
+    h = hashlib.sha256(CACHE_VERSION)
+    _hash_file(h, Path(path))
+    return h.hexdigest()[:32]
+
+class ResultCache:
+    def __init__(self, root=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+
+    def _path(self, key, kind):
+        return self.root / f"{key}_{kind}.npz"
+
+    def get(self, key, kind):
+        """Returns {column: array} for a cached entry, or None on a miss."""
+        path = self._path(key, kind)
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                arrays = {name: data[name] for name in data.files}
+        except (OSError, ValueError):
+            return None
+        # Refresh mtime so eviction is least-recently-used, not least-recently-written
+        os.utime(path)
+        return arrays
+
+    def put(self, key, kind, arrays):
+        self.root.mkdir(parents=True, exist_ok=True)
+        # Write to a temp file first so a crash never leaves a truncated entry behind
+        fd, tmp = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            np.savez_compressed(f, **arrays)
+        os.replace(tmp, self._path(key, kind))
+        self.evict()
+
+    def evict(self):
+        entries = sorted(self.root.glob("*.npz"), key=lambda p: p.stat().st_mtime)
+        total = sum(p.stat().st_size for p in entries)
+        while entries and total > self.max_bytes:
+            oldest = entries.pop(0)
+            total -= oldest.stat().st_size
+            oldest.unlink()
+
+def load_trajectory(bag_path, topic_name="/Odometry", cache=None):
+    """Returns the (N, 8) TUM array of a bag's odometry topic, extracting it only on a cache miss."""
+    from bag_to_tum import read_odometry
+
+    cache = cache or ResultCache()
+    key = bag_key(bag_path)
+    kind = "traj" + topic_name.replace("/", "_")
+    hit = cache.get(key, kind)
+    if hit is not None:
+        return hit["tum"]
+
+    tum = read_odometry(bag_path, topic_name)
+    if tum is not None:
+        cache.put(key, kind, {"tum": tum})
+    return tum
+
+def load_table(csv_path, cache=None):
+    """Loads a numeric CSV (time log, resources, latency) as a DataFrame through the cache."""
+    cache = cache or ResultCache()
+    key = file_key(csv_path)
+    hit = cache.get(key, "table")
+    if hit is not None:
+        return pd.DataFrame(hit)
+
+    df = pd.read_csv(csv_path, skipinitialspace=True)
+    df.columns = df.columns.str.strip()
+    # Only purely numeric tables are cached; anything else would need pickling
+    if all(np.issubdtype(t, np.number) for t in df.dtypes):
+        cache.put(key, "table", {c: df[c].to_numpy() for c in df.columns})
+    return df
@@ -0,0 +1,262 @@
+# Purpose: Embedded SQLite store for every harness run: run metadata (bag, config, parameters, git revision, summary),
+#          per-frame timings, resource samples and trajectory metrics, indexed by bag, config and time so that
+#          trend questions are answered by index lookups instead of loading every CSV.
+#          Usage: python3 results_db.py trend --config avia.yaml --metric p99_ms --last 30
+#                 python3 results_db.py runs [--bag NAME] [--config FILE] [--last N]
+#                 python3 results_db.py frames RUN_ID | sql "SELECT ..."
+
+import os
+import sys
+import json
+import time
+import socket
+import sqlite3
+import argparse
+import subprocess
+from pathlib import Path
+import numpy as np
+import yaml
+
+RESULTS_DB = Path(os.environ.get("FASTLIO_RESULTS_DB", "/root/ros2_ws/src/results/results.db"))
+CONFIG_DIR = Path("/root/ros2_ws/src/FAST_LIO_ROS2/config")
+
+# Summary figures kept as columns (indexed queries, trends); anything else goes to summary_json
+SUMMARY_COLUMNS = ["frames", "mean_ms", "p50_ms", "p90_ms", "p99_ms", "p999_ms", "max_ms", "jitter_ms",
+                   "over_deadline", "longest_over_run", "peak_ram_mb", "peak_cpu", "avg_cpu"]
+COUNT_COLUMNS = {"frames", "over_deadline", "longest_over_run"}
+# Summary keys that are not valid column names (LatencyHistogram.summary uses "p99.9_ms")
+SUMMARY_KEYS = {"p999_ms": "p99.9_ms"}
+FRAME_COLUMNS = ["lidar_beg_time", "imu_map_downsample", "match_time", "solve_time", "solve_h_time", "icp_time",
+                 "map_incre_time", "total_time", "publish_time", "scan_points", "down_points", "effect_points",
+                 "tree_size_end"]
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    started_at REAL NOT NULL,
+    script TEXT NOT NULL,
+    bag TEXT NOT NULL,
+    config TEXT,
+    git_rev TEXT,
+    host TEXT,
+    output_dir TEXT,
+    params_json TEXT,
+    summary_json TEXT,
+    {", ".join(f"{c} {'INTEGER' if c in COUNT_COLUMNS else 'REAL'}" for c in SUMMARY_COLUMNS)}
+);
+CREATE INDEX IF NOT EXISTS runs_bag ON runs (bag, started_at);
+CREATE INDEX IF NOT EXISTS runs_config ON runs (config, started_at);
+CREATE INDEX IF NOT EXISTS runs_started ON runs (started_at);
+CREATE TABLE IF NOT EXISTS frames (
+    run_id INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    idx INTEGER NOT NULL,
+    {", ".join(f"{c} REAL" for c in FRAME_COLUMNS)},
+    PRIMARY KEY (run_id, idx)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS resources (
+    run_id INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    t REAL NOT NULL,
+    cpu REAL,
+    rss_mb REAL,
+    PRIMARY KEY (run_id, t)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS trajectory_metrics (
+    run_id INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    value REAL,
+    PRIMARY KEY (run_id, name)
+) WITHOUT ROWID;
+"""
+
+def git_revision(path=Path(__file__).parent):
+    """Commit of the checkout the scripts run from, '+dirty' when there are local changes; None outside git."""
+    try:
+        rev = subprocess.run(["git", "-C", str(path), "rev-parse", "--short", "HEAD"],
+                             capture_output=True, text=True, timeout=5).stdout.strip()
+        dirty = subprocess.run(["git", "-C", str(path), "status", "--porcelain", "--untracked-files=no"],
+                               capture_output=True, text=True, timeout=5).stdout.strip()
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    return (rev + ("+dirty" if dirty else "")) or None
+
+def config_params(config_file, config_path=None):
+    """The ros__parameters of a FAST-LIO config, flattened to dotted keys (None if the file is not found)."""
+    path = Path(config_path or CONFIG_DIR) / config_file
+    if not path.exists():
+        return None
+    with open(path, "r") as f:
+        params = yaml.safe_load(f)["/**"]["ros__parameters"]
+
+    flat = {}
+    def walk(prefix, node):
+        for key, value in node.items():
+            if isinstance(value, dict):
+                walk(f"{prefix}{key}.", value)
+            else:
+                flat[prefix + key] = value
+    walk("", params)
+    return flat
+
+def trajectory_metrics(tum):
+    """Path length, duration and speed / angular-rate figures of an (N, 8) TUM trajectory."""
+    from timeline import trajectory_rates
+
+    tum = np.asarray(tum)
+    if len(tum) < 2:
+        return {}
+    step = np.linalg.norm(np.diff(tum[:, 1:4], axis=0), axis=1)
+    speed, rate = trajectory_rates(tum)
+    speed, rate = speed[np.isfinite(speed)], rate[np.isfinite(rate)]
+    return {
+        "duration_s": float(tum[-1, 0] - tum[0, 0]),
+        "path_length_m": float(step.sum()),
+        "mean_speed_mps": float(speed.mean()) if len(speed) else 0.0,
+        "max_speed_mps": float(speed.max()) if len(speed) else 0.0,
+        "max_angular_rate_dps": float(rate.max()) if len(rate) else 0.0,
+        # Start-to-end distance: drift on sequences that return to their start
+        "end_to_start_m": float(np.linalg.norm(tum[-1, 1:4] - tum[0, 1:4])),
+    }
+
+class ResultsStore:
+    """Thin wrapper around the SQLite file; WAL mode lets parallel matrix cells write at the same time."""
+
+    def __init__(self, path=RESULTS_DB):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(path), timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def add_run(self, script, bag, config=None, summary=None, output_dir=None, params=None, started_at=None):
+        """Inserts a run; summary keys in SUMMARY_COLUMNS become columns, the whole dict is kept as JSON."""
+        summary = summary or {}
+        if params is None and config:
+            params = config_params(config)
+        values = [summary.get(SUMMARY_KEYS.get(c, c)) for c in SUMMARY_COLUMNS]
+        with self.conn:
+            cur = self.conn.execute(
+                f"INSERT INTO runs (started_at, script, bag, config, git_rev, host, output_dir, params_json, summary_json, "
+                f"{', '.join(SUMMARY_COLUMNS)}) "
+                f"VALUES ({', '.join('?' * (9 + len(SUMMARY_COLUMNS)))})",
+                [started_at or time.time(), script, Path(bag).stem, config, git_revision(), socket.gethostname(),
+                 str(output_dir) if output_dir else None, json.dumps(params) if params else None,
+                 json.dumps(summary, default=float)] + values)
+        return cur.lastrowid
+
+    def add_frames(self, run_id, frames):
+        """Per-frame timings from a FrameTiming structured array (telemetry.decode_frames)."""
+        columns = [np.asarray(frames[c], dtype=np.float64) for c in FRAME_COLUMNS]
+        rows = zip(range(len(frames)), *(c.tolist() for c in columns))
+        with self.conn:
+            self.conn.executemany(f"INSERT INTO frames VALUES ({', '.join('?' * (2 + len(FRAME_COLUMNS)))})",
+                                  ((run_id,) + r for r in rows))
+
+    def add_resources(self, run_id, samples):
+        """Resource samples as (t, cpu %, rss MB) rows."""
+        with self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO resources VALUES (?, ?, ?, ?)",
+                                  ((run_id, float(t), float(c), float(r)) for t, c, r in samples))
+
+    def add_trajectory_metrics(self, run_id, metrics):
+        with self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO trajectory_metrics VALUES (?, ?, ?)",
+                                  ((run_id, k, float(v)) for k, v in metrics.items()))
+
+    def query(self, sql, args=()):
+        cur = self.conn.execute(sql, args)
+        return [d[0] for d in cur.description], cur.fetchall()
+
+def record_run(script, bag, config=None, summary=None, output_dir=None, frames=None, resources=None, tum=None,
+               params=None):
+    """One call per harness run; a store error is reported but never fails the run itself."""
+    try:
+        with ResultsStore() as store:
+            run_id = store.add_run(script, bag, config, summary, output_dir, params)
+            if frames is not None and len(frames):
+                store.add_frames(run_id, frames)
+            if resources:
+                store.add_resources(run_id, resources)
+            if tum is not None:
+                store.add_trajectory_metrics(run_id, trajectory_metrics(tum))
+        print(f"   -> Stored run {run_id} in {RESULTS_DB}")
+        return run_id
+    except (sqlite3.Error, OSError) as e:
+        print(f"   -> Warning: Could not write to results store: {e}")
+        return None
+
+def print_table(columns, rows):
+    widths = [max(len(str(c)), *(len(_fmt(r[i])) for r in rows)) if rows else len(str(c)) for i, c in enumerate(columns)]
+    print("  ".join(str(c).ljust(w) for c, w in zip(columns, widths)))
+    for r in rows:
+        print("  ".join(_fmt(v).ljust(w) for v, w in zip(r, widths)))
+
+def _fmt(v):
+    return f"{v:.3f}" if isinstance(v, float) else str(v)
+
+def _filters(args):
+    where, params = [], []
+    if args.bag:
+        where.append("bag = ?")
+        params.append(Path(args.bag).stem)
+    if args.config:
+        where.append("config = ?")
+        params.append(args.config)
+    if getattr(args, "script", None):
+        where.append("script = ?")
+        params.append(args.script)
+    return (" WHERE " + " AND ".join(where)) if where else "", params
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query the FAST-LIO results store.")
+    parser.add_argument("--db", type=Path, default=RESULTS_DB)
+    sub = parser.add_subparsers(dest="command", required=True)
+    for name in ("runs", "trend"):
+        p = sub.add_parser(name)
+        p.add_argument("--bag")
+        p.add_argument("--config")
+        p.add_argument("--script")
+        p.add_argument("--last", type=int, default=30, help="Most recent N runs")
+        if name == "trend":
+            p.add_argument("--metric", default="p99_ms", choices=SUMMARY_COLUMNS)
+    p = sub.add_parser("frames")
+    p.add_argument("run_id", type=int)
+    p = sub.add_parser("metrics")
+    p.add_argument("run_id", type=int)
+    p = sub.add_parser("sql")
+    p.add_argument("statement")
+    args = parser.parse_args()
+
+    if not args.db.exists():
+        print(f"No results store at {args.db}")
+        sys.exit(1)
+    store = ResultsStore(args.db)
+    if args.command in ("runs", "trend"):
+        where, params = _filters(args)
+        cols = ("id, datetime(started_at, 'unixepoch', 'localtime') AS started, script, bag, config, git_rev"
+                + (f", {args.metric}" if args.command == "trend" else ', frames, mean_ms, p99_ms, over_deadline'))
+        # Newest N through the (bag|config, started_at) index, printed oldest first
+        columns, rows = store.query(f"SELECT * FROM (SELECT {cols}, started_at FROM runs{where} "
+                                    f"ORDER BY started_at DESC LIMIT ?) ORDER BY started_at", params + [args.last])
+        print_table(columns[:-1], [r[:-1] for r in rows])
+        if args.command == "trend" and rows:
+            values = np.array([r[-2] for r in rows if r[-2] is not None], dtype=float)
+            if len(values) > 1:
+                slope = np.polyfit(np.arange(len(values)), values, 1)[0]
+                print(f"\n{args.metric}: first {values[0]:.3f}, last {values[-1]:.3f}, "
+                      f"min {values.min():.3f}, max {values.max():.3f}, slope {slope:+.3f} per run")
+    elif args.command == "frames":
+        print_table(*store.query("SELECT * FROM frames WHERE run_id = ? ORDER BY idx", (args.run_id,)))
+    elif args.command == "metrics":
+        print_table(*store.query("SELECT name, value FROM trajectory_metrics WHERE run_id = ?", (args.run_id,)))
+    else:
+        print_table(*store.query(args.statement))
+    store.close()
@@ -2,15 +2,29 @@ import subprocess
 import os
 import sys
 import time
-import signal
-import re
 import csv
+import json
+import fcntl
+import argparse
 import threading
 import psutil
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 import shutil
 from pathlib import Path
+from result_cache import load_table
+from bag_info import bag_info
+import stream_health
+from time_log_tail import TimeLogTailer
+from node_ready import wait_for_mapping_node
+import proc_sampler
+from latency_hist import LatencyHistogram, format_summary
+from telemetry import TelemetryListener, benchmark_table, dropped_records, save_frames_csv
+from results_db import record_run, config_params
+from orchestrator import Orchestrator, stop_process
+import cloud_capture
+from timeline import build_timeline, save_timeline
 
 # ==========================================
 # CONFIGURATION
@@ -19,18 +33,37 @@ RESULTS_BASE = Path("/root/ros2_ws/src/results/full_analysis_results")
 # The map name defined in your yaml (usually ./scans.pcd or ./RAM_TEST.pcd)
 EXPECTED_PCD_NAME = "Current_map.pcd" 
 FAST_LIO_LOG_PATH = Path("/root/ros2_ws/src/FAST_LIO_ROS2/Log/fast_lio_time_log.csv")
-BAG_TO_TUM_SCRIPT = Path(__file__).parent / "bag_to_tum.py"
 
 class FastLioAnalyzer:
-    def __init__(self, bag_path, config_file):
+    def __init__(self, bag_path, config_file, output_dir=None, config_path=None, cpus=None, log_path=FAST_LIO_LOG_PATH,
+                 capture="voxel", capture_voxel=cloud_capture.DEFAULT_VOXEL, capture_every=cloud_capture.DEFAULT_EVERY,
+                 capture_cpu=None):
         self.bag_path = Path(bag_path)
         self.bag_name = self.bag_path.stem
         self.config_file = config_file
-        self.output_dir = RESULTS_BASE / f"{self.bag_name}_FULL_ANALYSIS"
+        self.output_dir = Path(output_dir) if output_dir else RESULTS_BASE / f"{self.bag_name}_FULL_ANALYSIS"
+        # Directory holding config_file (default: the installed fast_lio share/config)
+        self.config_path = config_path
+        # CPU list ("4-7") the node, the player and this process (recorder, telemetry, sampler) are pinned to
+        self.cpus = cpus
+        self.log_path = Path(log_path)
         
         # Data Containers
-        self.latencies = []
+        # Per-frame latencies in fixed memory (soak tests), mergeable across runs
+        self.latency_hist = LatencyHistogram()
+        self.telemetry = TelemetryListener()
+        # Bag playback, /map_save and the live /Odometry -> TUM writer (no ros2 CLI subprocesses)
+        self.orchestrator = Orchestrator()
+        # /cloud_registered capture profile (off / voxel / every-nth / full), run in its own pinned process
+        self.capture = (capture, capture_voxel, capture_every)
+        # Core of the capture process; default: the highest core outside self.cpus (benchmark_matrix reserves one).
+        # Chosen before run() narrows this process's own affinity to self.cpus
+        self.capture_cpu = capture_cpu or cloud_capture.capture_cpu(cpus)
+        self.capture_dir = self.output_dir / "cloud_capture"
+        self.time_log = TimeLogTailer(self.log_path)
         self.resource_stats = []
+        self.frames = None
+        self.trajectory = None
         self.mapping_pid = None
         self.stop_event = threading.Event()
         self.total_duration = 0
@@ -41,69 +74,107 @@ class FastLioAnalyzer:
         self.output_dir.mkdir(parents=True, exist_ok=True)
 
     def get_bag_duration(self):
-        try:
-            res = subprocess.run(['ros2', 'bag', 'info', str(self.bag_path)], capture_output=True, text=True)
-            match = re.search(r"Duration:\s+(\d+\.\d+)s", res.stdout)
-            return float(match.group(1)) if match else 100.0
-        except:
-            return 100.0
-
-    def find_mapping_pid(self):
-        # Retry for 10 seconds to find the node
+        # Read in-process from metadata.yaml + the storage index (no 'ros2 bag info' subprocess)
+        return bag_info(self.bag_path)["duration"]
+
+    def find_mapping_pid(self, launch_pid):
+        # Retry for 10 seconds to find the node; only our own launch's children, other runs may be going on
         for _ in range(10):
-            for proc in psutil.process_iter(['pid', 'cmdline']):
-                if proc.info['cmdline'] and 'fastlio_mapping' in ' '.join(proc.info['cmdline']):
-                    return proc.info['pid']
+            try:
+                for proc in psutil.Process(launch_pid).children(recursive=True):
+                    if 'fastlio_mapping' in ' '.join(proc.cmdline()):
+                        return proc.pid
+            except psutil.Error:
+                return None
             time.sleep(1)
         return None
 
+    def pinned(self, cmd):
+        return ['taskset', '-c', self.cpus] + cmd if self.cpus else cmd
+
     def task_log_parser(self, process):
-        """Thread 1: Reads stdout line-by-line for Latency metrics"""
+        """Thread 1: Saves the node's stdout (timing comes from /frame_timing, not from these lines)"""
         log_path = self.output_dir / "process_log.txt"
-        csv_path = self.output_dir / "latency_data.csv"
-        
-        with open(log_path, "w") as f_log, open(csv_path, "w", newline="") as f_csv:
-            writer = csv.writer(f_csv)
-            writer.writerow(["match", "solve", "ICP", "total"]) # Simplified header
-            
-            # Regex for the timing line
-            pattern = r"match:\s*([\d\.]+).*solve:\s*([\d\.]+).*ICP:\s*([\d\.]+).*total:\s*([\d\.]+)"
-            
+
+        with open(log_path, "w") as f_log:
             while not self.stop_event.is_set():
                 line = process.stdout.readline()
                 if not line: break
-                
                 f_log.write(line) # Save full log
-                
-                if "ave total:" in line:
-                    match = re.search(pattern, line)
-                    if match:
-                        vals = [float(x) for x in match.groups()]
-                        writer.writerow(vals)
-                        self.latencies.append(vals[3]) # Index 3 is total time
+
+    def save_telemetry(self):
+        """Decodes the collected /frame_timing records and writes the per-frame and latency CSVs"""
+        frames = self.telemetry.frames()
+        self.telemetry.stop()
+        self.frames = frames
+        if len(frames) == 0:
+            print("   -> Warning: No /frame_timing records received (is publish.telemetry_en enabled?)")
+            return
+
+        dropped = dropped_records(frames)
+        if dropped:
+            print(f"   -> Warning: {dropped} telemetry records were dropped")
+
+        save_frames_csv(frames, self.output_dir / "frame_timing.csv")
+
+        # Same columns as the old stdout-derived file (ave match, ave solve, ICP, ave total)
+        table = benchmark_table(frames)
+        with open(self.output_dir / "latency_data.csv", "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["match", "solve", "ICP", "total"])
+            writer.writerows(table[:, [1, 2, 3, 5]].tolist())
+
+        # Per-frame t5 - t0, the same quantity as math_time in the C++ time log
+        self.latency_hist.record(frames["total_time"])
+        self.save_frame_resources(frames, self.telemetry.arrival_times()[:len(frames)])
+
+    def save_frame_resources(self, frames, arrivals):
+        """Aligns the /proc samples to frames: the record arrives at frame end, total + publish time before it began"""
+        samples_path = self.output_dir / "proc_samples.bin"
+        meta_path = self.output_dir / "proc_samples.json"
+        if not meta_path.exists():
+            return
+        samples, threads = proc_sampler.load_samples(samples_path, meta_path)
+        if len(samples) < 2:
+            return
+
+        pd.DataFrame(proc_sampler.thread_summary(samples, threads)).to_csv(self.output_dir / "thread_cpu.csv", index=False)
+        frame_end = arrivals
+        frame_start = arrivals - frames["total_time"] - frames["publish_time"]
+        per_frame = proc_sampler.frame_resources(samples, threads, frame_start, frame_end)
+        df = pd.DataFrame({"seq": frames["seq"], "lidar_beg_time": frames["lidar_beg_time"],
+                           "total_time": frames["total_time"], "arrival": arrivals, **per_frame})
+        df.to_csv(self.output_dir / "frame_resources.csv", index=False)
 
     def task_resource_monitor(self):
-        """Thread 2: Polls CPU/RAM every 0.5s"""
+        """Thread 2: Samples /proc per thread at 100 Hz; every 0.5s the new samples go to disk and the CPU/RAM plot"""
         while self.mapping_pid is None and not self.stop_event.is_set():
             time.sleep(0.5)
             
         if not self.mapping_pid: return
 
         try:
-            proc = psutil.Process(self.mapping_pid)
-            start_t = time.time()
-            
-            while not self.stop_event.is_set():
-                try:
-                    cpu = proc.cpu_percent(interval=None)
-                    ram = proc.memory_info().rss / (1024 * 1024) # MB
-                    elapsed = time.time() - start_t
-                    self.resource_stats.append([elapsed, cpu, ram])
-                except:
-                    break # Process died
-                time.sleep(0.5)
-        except psutil.NoSuchProcess:
-            return
+            sampler = proc_sampler.ProcSampler(self.mapping_pid).start()
+        except OSError:
+            return # Process died
+        start_t = time.monotonic()
+        last = None
+        with open(self.output_dir / "proc_samples.bin", "wb") as f:
+            while True:
+                stopping = self.stop_event.wait(0.5)
+                if stopping:
+                    sampler.stop()
+                chunk = sampler.drain()
+                chunk.tofile(f)
+                if len(chunk):
+                    span = chunk if last is None else np.concatenate([last[None], chunk])
+                    self.resource_stats.append([chunk["t"][-1] - start_t, proc_sampler.cpu_percent(span),
+                                                chunk["rss"][-1] / (1024 * 1024)])
+                    last = chunk[-1]
+                if stopping or not sampler.thread.is_alive():
+                    break
+        sampler.stop()
+        sampler.save_meta(self.output_dir / "proc_samples.json")
 
     def generate_report(self):
         print("\n\n Generating Final Report...")
@@ -135,114 +206,178 @@ class FastLioAnalyzer:
 
         # 2. Latency Stats (Prefer C++ Log if available)
         cpp_log_path = self.output_dir / "fast_lio_time_log.csv"
-        source_type = "STDOUT (Approximate)"
-        
+        source_type = "TELEMETRY (per frame)"
+        hist = self.latency_hist
+
         if cpp_log_path.exists():
             try:
-                df = pd.read_csv(cpp_log_path, skipinitialspace=True)
+                df = load_table(cpp_log_path)
                 # 'math_time' is usually the total processing time in the C++ log
                 if 'math_time' in df.columns:
                     lat_data = df['math_time']
                     if 'io_time' in df.columns:
                         lat_data = lat_data + df['io_time']
-                    total_frames = len(lat_data)
-                    avg_lat = lat_data.mean()
-                    max_lat = lat_data.max()
+                    hist = LatencyHistogram()
+                    hist.record(lat_data.to_numpy())
                     source_type = "C++ LOG (Accurate)"
-                else:
-                    # Fallback to stdout data
-                    total_frames = len(self.latencies)
-                    avg_lat = sum(self.latencies)/total_frames if total_frames > 0 else 0
-                    max_lat = max(self.latencies) if total_frames > 0 else 0
             except:
                 pass
-        else:
-            total_frames = len(self.latencies)
-            avg_lat = sum(self.latencies)/total_frames if total_frames > 0 else 0
-            max_lat = max(self.latencies) if total_frames > 0 else 0
-        
+
+        hist.save(self.output_dir / "latency_hist.json")
+        lat = hist.summary()
+        # Cost of the cloud capture process, reported so it can be subtracted from the run
+        capture = cloud_capture.load_capture_stats(self.capture_dir)
+
         summary = (
             f"========================================\n"
             f" FINAL RESULTS: {self.bag_name}\n"
             f"========================================\n"
-            f" Total Processed Frames: {total_frames}\n"
-            f" Avg Processing Time:    {avg_lat*1000:.2f} ms\n"
-            f" Max Processing Time:    {max_lat*1000:.2f} ms\n"
+            + format_summary(lat) +
             f" Data Source:            {source_type}\n"
             f"----------------------------------------\n"
             f" Peak CPU Usage:         {peak_cpu:.2f} %\n"
             f" Peak RAM Usage:         {peak_ram:.2f} MB\n"
             f" Avg CPU Usage:          {avg_cpu:.2f} %\n"
+            + (cloud_capture.format_capture_stats(capture) if capture else "") +
             f"========================================\n"
         )
         
         print(summary)
         with open(self.output_dir / "summary.txt", "w") as f:
             f.write(summary)
+        with open(self.output_dir / "summary.json", "w") as f:
+            json.dump({"bag": self.bag_name, "config": self.config_file, "frames": lat["frames"],
+                       "avg_latency_ms": lat["mean_ms"], "max_latency_ms": lat["max_ms"], "latency": lat,
+                       "peak_ram_mb": float(peak_ram), "peak_cpu": float(peak_cpu), "avg_cpu": float(avg_cpu),
+                       "data_source": source_type, "capture": capture}, f, indent=2)
             
-        self.update_global_history(total_frames, avg_lat, max_lat, peak_ram, peak_cpu, avg_cpu)
+        self.update_global_history(lat, peak_ram, peak_cpu, avg_cpu)
+        record_run("run_full_analysis", self.bag_name, self.config_file,
+                   dict(lat, peak_ram_mb=float(peak_ram), peak_cpu=float(peak_cpu), avg_cpu=float(avg_cpu),
+                        data_source=source_type, capture=capture),
+                   self.output_dir, self.frames, self.resource_stats, self.trajectory,
+                   config_params(self.config_file, self.config_path))
 
-    def update_global_history(self, frames, avg_lat, max_lat, peak_ram, peak_cpu, avg_cpu):
+    def update_global_history(self, lat, peak_ram, peak_cpu, avg_cpu):
         """Appends the results of this run to a master CSV for easy comparison."""
         master_csv = RESULTS_BASE / "benchmark_comparison.csv"
-        file_exists = master_csv.exists()
+        RESULTS_BASE.mkdir(parents=True, exist_ok=True)
+        header = ["Timestamp", "Bag Name", "Config", "Frames", "Avg Latency (ms)", "Max Latency (ms)", "Peak RAM (MB)",
+                  "Peak CPU (%)", "Avg CPU (%)", "P50 Latency (ms)", "P90 Latency (ms)", "P99 Latency (ms)",
+                  "P99.9 Latency (ms)", "Over Budget", "Longest Over-Budget Run", "Jitter (ms)"]
         
         try:
-            with open(master_csv, "a", newline="") as f:
+            with open(master_csv, "a+", newline="") as f:
+                # Concurrent runs (benchmark_matrix.py) append to the same file
+                fcntl.flock(f, fcntl.LOCK_EX)
+                f.seek(0)
+                rows = list(csv.reader(f))
                 writer = csv.writer(f)
+                if rows and rows[0] != header:
+                    # Older file without the percentile columns: rewrite it with the new header, old rows padded
+                    f.seek(0)
+                    f.truncate()
+                    writer.writerow(header)
+                    writer.writerows(r + [""] * (len(header) - len(r)) for r in rows[1:])
                 # Write Header if new file
-                if not file_exists:
-                    writer.writerow(["Timestamp", "Bag Name", "Config", "Frames", "Avg Latency (ms)", "Max Latency (ms)", "Peak RAM (MB)", "Peak CPU (%)", "Avg CPU (%)"])
+                elif not rows:
+                    writer.writerow(header)
                 
                 # Write Data
                 writer.writerow([
                     time.strftime("%Y-%m-%d %H:%M:%S"),
                     self.bag_name,
                     self.config_file,
-                    frames,
-                    f"{avg_lat*1000:.2f}",
-                    f"{max_lat*1000:.2f}",
+                    lat["frames"],
+                    f"{lat['mean_ms']:.2f}",
+                    f"{lat['max_ms']:.2f}",
                     f"{peak_ram:.2f}",
                     f"{peak_cpu:.2f}",
-                    f"{avg_cpu:.2f}"
+                    f"{avg_cpu:.2f}",
+                    f"{lat['p50_ms']:.2f}",
+                    f"{lat['p90_ms']:.2f}",
+                    f"{lat['p99_ms']:.2f}",
+                    f"{lat['p99.9_ms']:.2f}",
+                    lat["over_deadline"],
+                    lat["longest_over_run"],
+                    f"{lat['jitter_ms']:.2f}",
                 ])
             print(f"   -> Added entry to master comparison log: {master_csv}")
         except Exception as e:
             print(f"   -> Warning: Could not update master log: {e}")
 
     def run(self):
-        self.total_duration = self.get_bag_duration()
+        try:
+            self.total_duration = self.get_bag_duration()
+        except (OSError, ValueError) as e:
+            print(f"Could not read bag {self.bag_path}: {e}")
+            return
         print(f"Starting Full Analysis for {self.bag_name} ({self.total_duration:.1f}s)")
         print(f"Output: {self.output_dir}")
+        if self.cpus:
+            # The recorder, telemetry listener, TUM writer and /proc sampler run in this process: keep them on the
+            # run's own cores (threads started from here on inherit it), not on a neighbouring matrix cell's
+            os.sched_setaffinity(0, cloud_capture.cpu_list(self.cpus))
 
-        # 1. Start Recording (Background)
-        bag_out = self.output_dir / "recorded_bag"
+        # 0. Input stream health (IMU/LiDAR gaps, reorderings, scan coverage) before spending a full replay
+        try:
+            health, scans = stream_health.analyze_bag(self.bag_path)
+            stream_health.print_report(health)
+            stream_health.save_report(health, scans, self.output_dir / "stream_health")
+        except (OSError, ValueError) as e:
+            print(f"   -> Stream health check skipped: {e}")
+
+        # 1. Start Recording (in-process subscriptions); the trajectory goes straight to TUM for Evo
         print("   -> Starting Recorder...")
-        rec_cmd = ['ros2', 'bag', 'record', '/Odometry', '/cloud_registered', '/path', '-o', str(bag_out)]
-        proc_rec = subprocess.Popen(rec_cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        self.orchestrator.start()
+        self.orchestrator.record(self.output_dir / "recorded_bag", ['/path', '/frame_timing'])
+        self.orchestrator.write_trajectory(self.output_dir / f"{self.bag_name}_trajectory.tum")
+        # The registered cloud is not recorded at full density: decimated capture on a core the node does not use
+        profile, voxel, every = self.capture
+        proc_capture = cloud_capture.start_capture(self.capture_dir, profile, voxel, every, self.capture_cpu)
+        if proc_capture:
+            print(f"   -> Capturing /cloud_registered ({profile}) on CPU {self.capture_cpu or 'any'}")
 
-        # 2. Start FAST-LIO (Unbuffered)
+        # 2. Start FAST-LIO (Unbuffered), with the telemetry subscriber already listening
+        self.telemetry.start()
+        # The node streams its time log during the run; drop the previous run's file and follow the new one
+        self.log_path.unlink(missing_ok=True)
+        self.time_log.start()
         print(f"   -> Launching Node ({self.config_file})...")
         # stdbuf -oL forces line buffering so we can read logs instantly
-        launch_cmd = ['stdbuf', '-oL', 'ros2', 'launch', 'fast_lio', 'mapping.launch.py', 
-                      f'config_file:={self.config_file}', 'rviz:=false']
+        launch_cmd = self.pinned(['stdbuf', '-oL', 'ros2', 'launch', 'fast_lio', 'mapping.launch.py',
+                                  f'config_file:={self.config_file}', 'rviz:=false'])
+        if self.config_path:
+            launch_cmd.append(f'config_path:={self.config_path}')
         proc_mapping = subprocess.Popen(launch_cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
         
-        # 3. Find PID
-        self.mapping_pid = self.find_mapping_pid()
-        
-        # 4. Start Monitoring Threads
+        # 3. Start Monitoring Threads (the log thread also keeps the stdout pipe drained during startup)
         t_log = threading.Thread(target=self.task_log_parser, args=(proc_mapping,))
         t_res = threading.Thread(target=self.task_resource_monitor)
         t_log.start()
         t_res.start()
 
+        # 4. Wait until the node subscribes to its inputs and serves /map_save, then find its PID
+        print("   -> Waiting for node to initialise...")
+        waited = wait_for_mapping_node(self.config_file, self.config_path, proc=proc_mapping)
+        if waited is None:
+            print("   -> FAST-LIO did not become ready, aborting.")
+            self.stop_event.set()
+            stop_process(proc_mapping)
+            t_log.join()
+            t_res.join()
+            self.time_log.stop()
+            self.telemetry.stop()
+            if proc_capture:
+                stop_process(proc_capture)
+            self.orchestrator.close()
+            return
+        print(f"   -> Node ready after {waited:.2f} s")
+        self.mapping_pid = self.find_mapping_pid(proc_mapping.pid)
+
         # 5. Start Playback
-        print("Waiting 5 seconds for node to initialise...")
-        time.sleep(5) 
         print("   -> Playing Bag...")
-        play_cmd = ['ros2', 'bag', 'play', str(self.bag_path), '--clock']
-        proc_play = subprocess.Popen(play_cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        proc_play = self.orchestrator.play(self.bag_path, clock=True, cpus=self.cpus)
 
         # 6. Progress Bar Loop
         start_t = time.time()
@@ -253,7 +388,10 @@ class FastLioAnalyzer:
                 
                 # Dynamic Status Line
                 ram_str = f"{self.resource_stats[-1][2]:.0f}" if self.resource_stats else "0"
-                frames_str = f"{len(self.latencies)}"
+                frames_str = f"{self.telemetry.count()}"
+                live = self.time_log.stats()
+                if live["frames"]:
+                    frames_str += f" | Lat p50 {live['p50_ms']:.1f} p99 {live['p99_ms']:.1f} ms"
                 
                 bar = "█" * int(percent // 2) + "-" * (50 - int(percent // 2))
                 sys.stdout.write(f"\r|{bar}| {percent:.1f}% | RAM: {ram_str} MB | Frames: {frames_str}")
@@ -266,41 +404,44 @@ class FastLioAnalyzer:
         # 7. Cleanup
         print("\n\n Finishing Up...")
         
+        stop_process(proc_play)
+
         # Trigger Map Save
         print("   -> Triggering Map Save...")
-        try:
-            subprocess.run(['ros2', 'service', 'call', '/map_save', 'std_srvs/srv/Trigger'], 
-                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=10)
-        except: pass
+        saved, message = self.orchestrator.save_map(timeout=10)
+        if not saved:
+            print(f"   -> Warning: Map save failed: {message}")
 
         # Stop Threads
         self.stop_event.set()
         
-        # Kill Processes
-        os.kill(proc_play.pid, signal.SIGINT) if proc_play.poll() is None else None
-        os.kill(proc_rec.pid, signal.SIGINT)
-        os.kill(proc_mapping.pid, signal.SIGINT)
+        # Close the capture and the recorder (bag finalised, last TUM poses flushed), then stop the node
+        if proc_capture:
+            stop_process(proc_capture)
+        self.orchestrator.close()
+        stop_process(proc_mapping)
         
         # Wait for threads
         t_log.join()
         t_res.join()
+        # stdout has closed, so the node has flushed the last time log rows
+        self.time_log.stop()
+        self.save_telemetry()
         
         # Move Map File
         if Path(EXPECTED_PCD_NAME).exists():
             shutil.move(EXPECTED_PCD_NAME, self.output_dir / "final_map.pcd")
             print("   -> Map Saved successfully.")
             
-        # Extract Trajectory (TUM format) for Evo
-        if BAG_TO_TUM_SCRIPT.exists() and bag_out.exists():
-            tum_out = self.output_dir / f"{self.bag_name}_trajectory.tum"
-            print(f"   -> Extracting trajectory to {tum_out.name}...")
-            subprocess.run(['python3', str(BAG_TO_TUM_SCRIPT), str(bag_out), str(tum_out)],
-                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        # Trajectory (TUM format) for Evo, written while mapping ran
+        self.trajectory = self.orchestrator.trajectory()
+        print(f"   -> Trajectory: {len(self.trajectory)} poses in {self.bag_name}_trajectory.tum")
             
         # Copy C++ Log CSV and Generate Plot
-        if FAST_LIO_LOG_PATH.exists():
-            dest_csv = self.output_dir / "fast_lio_time_log.csv"
-            shutil.copy(FAST_LIO_LOG_PATH, dest_csv)
+        dest_csv = self.output_dir / "fast_lio_time_log.csv"
+        if self.log_path.exists():
+            if self.log_path != dest_csv:
+                shutil.copy(self.log_path, dest_csv)
             print(f"   -> Copied detailed C++ time log to {dest_csv}")
             
             # Call the separate plotting script
@@ -310,15 +451,30 @@ class FastLioAnalyzer:
                 subprocess.run(['python3', str(plot_script), str(dest_csv), str(plot_out)])
 
         self.generate_report()
+
+        # Everything above joined per frame on the LiDAR timestamp (timeline.py queries across runs)
+        try:
+            table = build_timeline(self.output_dir)
+            save_timeline(table, self.output_dir)
+            print(f"   -> Per-frame timeline: {len(table)} frames x {len(table.columns)} columns in timeline.npz")
+        except (OSError, ValueError, KeyError) as e:
+            print(f"   -> Warning: Could not build the timeline: {e}")
         print(f"DONE. All data in {self.output_dir}")
 
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage: python3 run_full_analysis.py [BAG_PATH] [CONFIG_FILE]")
-        sys.exit(1)
-        
-    bag = sys.argv[1]
-    cfg = sys.argv[2] if len(sys.argv) > 2 else "velodyne.yaml"
-    
-    analyzer = FastLioAnalyzer(bag, cfg)
+    parser = argparse.ArgumentParser(description="Full FAST-LIO analysis of one bag (latency, resources, map, trajectory).")
+    parser.add_argument("bag", help="ROS 2 bag directory or .db3/.mcap file")
+    parser.add_argument("config", nargs="?", default="velodyne.yaml", help="FAST-LIO config file")
+    parser.add_argument("--output-dir", help=f"Default: {RESULTS_BASE}/<bag>_FULL_ANALYSIS")
+    parser.add_argument("--config-path", help="Directory containing the config file (default: installed fast_lio config)")
+    parser.add_argument("--cpus", help="Pin the node, the player and this analyzer (recorder, telemetry, /proc sampler) to this CPU list (taskset syntax)")
+    parser.add_argument("--time-log", default=str(FAST_LIO_LOG_PATH), help="Where the node writes its time log (log_dir parameter)")
+    parser.add_argument("--capture", choices=cloud_capture.PROFILES, default="voxel", help="/cloud_registered capture profile")
+    parser.add_argument("--capture-voxel", type=float, default=cloud_capture.DEFAULT_VOXEL, help="Voxel size (m) of the 'voxel' profile")
+    parser.add_argument("--capture-every", type=int, default=cloud_capture.DEFAULT_EVERY, help="Frame stride of the 'every-nth' profile")
+    parser.add_argument("--capture-cpu", help="CPU of the capture process (default: highest CPU outside --cpus)")
+    args = parser.parse_args()
+
+    analyzer = FastLioAnalyzer(args.bag, args.config, args.output_dir, args.config_path, args.cpus, args.time_log,
+                               args.capture, args.capture_voxel, args.capture_every, args.capture_cpu)
     analyzer.run()
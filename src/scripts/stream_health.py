@@ -0,0 +1,235 @@
+# Purpose: Sensor-stream health check for FAST-LIO input bags.
+#          Loads the receive and header timestamps of the IMU and LiDAR topics as NumPy arrays and reports
+#          rate, period jitter, gaps, reorderings, clock jumps and the IMU coverage of every LiDAR scan
+#          (what sync_packages needs before it can process a scan).
+#          Usage: python3 stream_health.py [BAG_PATH] [OUTPUT_PREFIX]
+
+import sys
+import json
+import numpy as np
+from bag_access import open_bag
+
+IMU_TYPES = ("sensor_msgs/msg/Imu",)
+LIVOX_TYPES = ("livox_ros_driver2/msg/CustomMsg", "livox_ros_driver/msg/CustomMsg")
+LIDAR_TYPES = LIVOX_TYPES + ("sensor_msgs/msg/PointCloud2",)
+
+# Enough leading bytes for the CDR header, a frame_id of up to ~40 chars and the CustomMsg point_num
+HEAD_BYTES = 80
+# A CustomPoint is 19 bytes of CDR at the very end of the message; its first field is offset_time (ns)
+LIVOX_POINT_BYTES = 19
+# An interval longer than GAP_FACTOR x the median period counts as a gap
+GAP_FACTOR = 2.0
+# A jump of the receive-minus-header offset larger than this is treated as a clock jump
+CLOCK_JUMP_NS = 100_000_000
+PERCENTILES = (50, 90, 99)
+
+def _align(offset, size):
+    # CDR alignment is relative to the end of the 4-byte encapsulation header
+    return 4 + ((offset - 4 + size - 1) // size) * size
+
+def _head_matrix(heads):
+    # (N, HEAD_BYTES) uint8 view of the message heads, zero padded for short messages
+    return np.frombuffer(b"".join(bytes(h).ljust(HEAD_BYTES, b"\0") for h in heads),
+                         dtype=np.uint8).reshape(len(heads), HEAD_BYTES)
+
+def _gather_u32(mat, offsets):
+    # Little-endian uint32 at a per-row byte offset
+    cols = offsets[:, None] + np.arange(4)
+    return np.ascontiguousarray(mat[np.arange(len(mat))[:, None], cols]).view("<u4").ravel()
+
+def header_stamps(mat):
+    """std_msgs/Header stamps (ns) of every row of a head matrix."""
+    sec = mat[:, 4:8].copy().view("<i4").ravel().astype(np.int64)
+    nsec = mat[:, 8:12].copy().view("<u4").ravel().astype(np.int64)
+    return sec * 1_000_000_000 + nsec
+
+def livox_scan_ends(mat, tails, begin):
+    """Scan end = header stamp + offset_time of the last point (as FAST-LIO's avia handler computes it)."""
+    frame_len = mat[:, 12:16].copy().view("<u4").ravel().astype(np.int64)
+    # header.frame_id -> align 8 -> uint64 timebase -> uint32 point_num
+    point_num_offset = _align(16 + frame_len, 8) + 8
+    if np.any(point_num_offset + 4 > HEAD_BYTES):
+        raise ValueError("frame_id too long for HEAD_BYTES")
+    point_num = _gather_u32(mat, point_num_offset)
+    last_offset = np.frombuffer(b"".join(bytes(t)[:4].ljust(4, b"\0") for t in tails), dtype="<u4")
+    return begin + np.where(point_num > 0, last_offset, 0).astype(np.int64), point_num
+
+def scan_span(data, livox, period_ns=0):
+    """(begin_ns, end_ns) of a single raw scan message, computed the same way as for a whole bag."""
+    mat = _head_matrix([bytes(data[:HEAD_BYTES])])
+    begin = header_stamps(mat)
+    if livox:
+        end, _ = livox_scan_ends(mat, [bytes(data[-LIVOX_POINT_BYTES:])], begin)
+        return int(begin[0]), int(end[0])
+    return int(begin[0]), int(begin[0]) + period_ns
+
+def _percentiles(values):
+    if len(values) == 0:
+        return {f"p{p}": 0.0 for p in PERCENTILES + ("max",)}
+    stats = {f"p{p}": float(v) for p, v in zip(PERCENTILES, np.percentile(values, PERCENTILES))}
+    stats["max"] = float(values.max())
+    return stats
+
+def stream_stats(receive, header):
+    """Rate, period jitter, gaps, reorderings and clock jumps of one topic (arrays in receive order)."""
+    n = len(header)
+    if n < 2:
+        return {"count": n}
+    dt = np.diff(header)
+    period = float(np.median(dt[dt > 0])) if np.any(dt > 0) else 0.0
+    span = header.max() - header.min()
+    gap_mask = dt > GAP_FACTOR * period
+    offset = receive - header
+
+    return {
+        "count": n,
+        "rate_hz": (n - 1) / (span / 1e9) if span > 0 else 0.0,
+        "period_ms": period / 1e6,
+        "jitter_ms": _percentiles(np.abs(dt[dt > 0] - period) / 1e6),
+        "gaps": int(gap_mask.sum()),
+        "max_gap_ms": float(dt.max() / 1e6),
+        # Header stamp not increasing in the order the messages were received
+        "reorderings": int(np.sum(dt <= 0)),
+        "receive_latency_ms": _percentiles(offset / 1e6),
+        "clock_jumps": int(np.sum(np.abs(np.diff(offset)) > CLOCK_JUMP_NS)),
+        "gap_at_s": ((header[:-1][gap_mask] - header.min()) / 1e9).round(3).tolist()[:20],
+    }
+
+def scan_overlap(scan_begin, scan_end, imu):
+    """Per-scan IMU coverage: IMU samples inside [begin, end], whether IMU brackets the scan, and IMU gaps."""
+    imu = np.sort(imu)
+    lo = np.searchsorted(imu, scan_begin, side="left")
+    hi = np.searchsorted(imu, scan_end, side="right")
+    # sync_packages needs IMU up to the scan end and the propagation needs one sample before the scan
+    covered = (lo > 0) & (np.searchsorted(imu, scan_end, side="left") < len(imu))
+
+    # Scans overlapping an IMU gap: mark every scan between the gap's start and end
+    gap_hit = np.zeros(len(scan_begin), dtype=bool)
+    if len(imu) > 1:
+        g = np.diff(imu)
+        period = np.median(g[g > 0]) if np.any(g > 0) else 0
+        idx = np.nonzero(g > GAP_FACTOR * period)[0]
+        first = np.searchsorted(scan_end, imu[idx], side="left")
+        last = np.searchsorted(scan_begin, imu[idx + 1], side="left")
+        keep = first < last
+        first, last = first[keep], last[keep]
+        marks = np.zeros(len(scan_begin) + 1, dtype=np.int64)
+        np.add.at(marks, first, 1)
+        np.add.at(marks, last, -1)
+        gap_hit = np.cumsum(marks)[:-1] > 0
+    return hi - lo, covered, gap_hit
+
+def find_topics(type_map):
+    imu = [t for t, ty in type_map.items() if ty in IMU_TYPES]
+    lidar = [t for t, ty in type_map.items() if ty in LIDAR_TYPES]
+    return imu, lidar
+
+def analyze_bag(bag_path, imu_topic=None, lidar_topic=None):
+    """Returns (summary dict, per-scan structured array) for the IMU and LiDAR streams of a bag."""
+    with open_bag(bag_path) as reader:
+        type_map = reader.topics()
+        imu_topics, lidar_topics = find_topics(type_map)
+        imu_topic = imu_topic or (imu_topics[0] if imu_topics else None)
+        lidar_topic = lidar_topic or (lidar_topics[0] if lidar_topics else None)
+        if imu_topic is None or lidar_topic is None:
+            raise ValueError(f"Need one IMU and one LiDAR topic, found: {type_map}")
+        livox = type_map[lidar_topic] in LIVOX_TYPES
+
+        imu_recv, imu_heads, _ = reader.slices(imu_topic, HEAD_BYTES)
+        lid_recv, lid_heads, lid_tails = reader.slices(lidar_topic, HEAD_BYTES, LIVOX_POINT_BYTES if livox else 0)
+
+    imu_recv = np.asarray(imu_recv, dtype=np.int64)
+    lid_recv = np.asarray(lid_recv, dtype=np.int64)
+    imu_header = header_stamps(_head_matrix(imu_heads))
+    lid_mat = _head_matrix(lid_heads)
+    scan_begin = header_stamps(lid_mat)
+
+    if livox:
+        scan_end, points = livox_scan_ends(lid_mat, lid_tails, scan_begin)
+    else:
+        # PointCloud2 carries no per-scan end in the header; assume a scan spans one nominal period
+        dt = np.diff(scan_begin)
+        period = int(np.median(dt[dt > 0])) if np.any(dt > 0) else 0
+        scan_end, points = scan_begin + period, np.full(len(scan_begin), -1)
+
+    # Scans are matched against IMU in processing (header) order
+    order = np.argsort(scan_begin, kind="stable")
+    imu_count, covered, gap_hit = scan_overlap(scan_begin[order], scan_end[order], imu_header)
+
+    t0 = min(imu_header.min(), scan_begin.min()) if len(imu_header) and len(scan_begin) else 0
+    scans = np.empty(len(order), dtype=[("scan", "i8"), ("begin_s", "f8"), ("end_s", "f8"), ("points", "i8"),
+                                        ("imu_count", "i8"), ("imu_covered", "i1"), ("imu_gap", "i1")])
+    scans["scan"] = order
+    scans["begin_s"] = (scan_begin[order] - t0) / 1e9
+    scans["end_s"] = (scan_end[order] - t0) / 1e9
+    scans["points"] = points[order]
+    scans["imu_count"] = imu_count
+    scans["imu_covered"] = covered
+    scans["imu_gap"] = gap_hit
+
+    summary = {
+        "bag": str(bag_path),
+        "imu": dict(topic=imu_topic, **stream_stats(imu_recv, imu_header)),
+        "lidar": dict(topic=lidar_topic, **stream_stats(lid_recv, scan_begin)),
+        "scans": {
+            "count": len(scans),
+            "scan_duration_ms_p50": float(np.median(scan_end - scan_begin) / 1e6) if len(scans) else 0.0,
+            "imu_per_scan_p50": float(np.median(imu_count)) if len(scans) else 0.0,
+            "imu_per_scan_min": int(imu_count.min()) if len(scans) else 0,
+            "not_covered": int(np.sum(~covered)),
+            "with_imu_gap": int(np.sum(gap_hit)),
+            # Consecutive scans whose time spans overlap (begin before the previous scan's end)
+            "overlapping": int(np.sum(scan_begin[order][1:] < scan_end[order][:-1])),
+        },
+    }
+    return summary, scans
+
+def problems(summary):
+    """Human-readable list of the issues that typically trip sync_packages."""
+    issues = []
+    for name in ("imu", "lidar"):
+        s = summary[name]
+        if s.get("gaps"):
+            issues.append(f"{name}: {s['gaps']} gaps (largest {s['max_gap_ms']:.1f} ms)")
+        if s.get("reorderings"):
+            issues.append(f"{name}: {s['reorderings']} out-of-order header stamps")
+        if s.get("clock_jumps"):
+            issues.append(f"{name}: {s['clock_jumps']} clock jumps")
+    scans = summary["scans"]
+    if scans["not_covered"]:
+        issues.append(f"lidar: {scans['not_covered']} scans not bracketed by IMU")
+    if scans["with_imu_gap"]:
+        issues.append(f"lidar: {scans['with_imu_gap']} scans overlap an IMU gap")
+    return issues
+
+def save_report(summary, scans, output_prefix):
+    """Writes <prefix>.json (summary) and <prefix>_scans.csv (per-scan coverage)."""
+    with open(f"{output_prefix}.json", "w") as f:
+        json.dump(summary, f, indent=2)
+    np.savetxt(f"{output_prefix}_scans.csv", scans, delimiter=",", header=",".join(scans.dtype.names),
+               comments="", fmt=["%d", "%.6f", "%.6f", "%d", "%d", "%d", "%d"])
+
+def print_report(summary):
+    for name in ("imu", "lidar"):
+        s = summary[name]
+        if s["count"] < 2:
+            print(f"{name:<6} {s['topic']}: {s['count']} msgs")
+            continue
+        j = s["jitter_ms"]
+        print(f"{name:<6} {s['topic']}: {s['count']} msgs, {s['rate_hz']:.2f} Hz, "
+              f"jitter p50/p90/p99/max {j['p50']:.3f}/{j['p90']:.3f}/{j['p99']:.3f}/{j['max']:.3f} ms, "
+              f"{s['gaps']} gaps, {s['reorderings']} reorderings, {s['clock_jumps']} clock jumps")
+    sc = summary["scans"]
+    print(f"scans  {sc['count']} scans, {sc['imu_per_scan_p50']:.0f} IMU/scan (min {sc['imu_per_scan_min']}), "
+          f"{sc['not_covered']} not covered, {sc['with_imu_gap']} with IMU gap, {sc['overlapping']} overlapping")
+    for issue in problems(summary):
+        print(f"  WARNING: {issue}")
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python3 stream_health.py [BAG_PATH] [OUTPUT_PREFIX]")
+    else:
+        summary, scans = analyze_bag(sys.argv[1])
+        print_report(summary)
+        if len(sys.argv) > 2:
+            save_report(summary, scans, sys.argv[2])
@@ -0,0 +1,135 @@
+# Purpose: Consumes the per-frame timing records fastlio_mapping publishes on /frame_timing
+#          (fast_lio/msg/FrameTiming). The message has a fixed CDR layout, so records are received as raw
+#          bytes and decoded in batches with a single numpy.frombuffer instead of regex-parsing stdout.
+
+import time
+import threading
+import numpy as np
+
+TELEMETRY_TOPIC = "/frame_timing"
+TELEMETRY_TYPE = "fast_lio/msg/FrameTiming"
+
+# Field order must match msg/FrameTiming.msg: float64 fields first, then uint32, so CDR adds no padding
+FLOAT_FIELDS = ["lidar_beg_time", "lidar_end_time", "imu_map_downsample", "match_time", "solve_time",
+                "solve_h_time", "icp_time", "map_incre_time", "total_time", "publish_time", "kdtree_search_time",
+                "kdtree_delete_time", "kdtree_incremental_time"]
+UINT_FIELDS = ["seq", "scan_points", "down_points", "effect_points", "tree_size_st", "tree_size_end",
+               "add_points", "delete_points"]
+
+# One record as it sits on the wire: 4-byte CDR encapsulation header followed by the packed fields
+FRAME_DTYPE = np.dtype([("cdr_header", "V4")] + [(f, "<f8") for f in FLOAT_FIELDS] + [(f, "<u4") for f in UINT_FIELDS])
+
+# Columns of the "[ mapping ]: time: ..." stdout line, which the CSV outputs keep using
+BENCHMARK_COLUMNS = ["IMU_Map_Downsample", "ave_match", "ave_solve", "ave_ICP", "map_incre", "ave_total", "icp", "construct_H"]
+
+def decode_frames(blobs):
+    """Decodes raw FrameTiming messages into a structured array (one row per frame)."""
+    if not blobs:
+        return np.empty(0, dtype=FRAME_DTYPE)
+    if len(blobs) == 1:
+        # A single buffer is viewed in place, no copy at all
+        buf = blobs[0]
+    else:
+        buf = b"".join(blobs)
+    frames = np.frombuffer(buf, dtype=FRAME_DTYPE)
+    if len(frames) != len(blobs):
+        raise ValueError("Unexpected FrameTiming size, is fast_lio built with the same msg/FrameTiming.msg?")
+    return frames
+
+def dropped_records(frames):
+    """Number of records lost between publisher and subscriber (gaps in seq)."""
+    if len(frames) < 2:
+        return 0
+    return int(np.sum(np.diff(frames["seq"].astype(np.int64)) - 1))
+
+def running_mean(x):
+    return np.cumsum(x) / np.arange(1, len(x) + 1)
+
+def benchmark_table(frames):
+    """Rebuilds the values of the stdout timing line (running averages included) as an (N, 8) array."""
+    table = np.empty((len(frames), len(BENCHMARK_COLUMNS)))
+    table[:, 0] = frames["imu_map_downsample"]
+    table[:, 1] = running_mean(frames["match_time"])
+    table[:, 2] = running_mean(frames["solve_time"] + frames["solve_h_time"])
+    # "ave ICP" in the stdout line is t3 - t1: everything between downsampling and the map update
+    table[:, 3] = frames["total_time"] - frames["imu_map_downsample"] - frames["map_incre_time"]
+    table[:, 4] = frames["map_incre_time"]
+    table[:, 5] = running_mean(frames["total_time"])
+    table[:, 6] = running_mean(frames["icp_time"])
+    table[:, 7] = running_mean(frames["solve_time"])
+    return table
+
+def save_frames_csv(frames, path):
+    """Writes one row per frame with every FrameTiming field (what compare_results.py reads)."""
+    import csv
+
+    columns = FLOAT_FIELDS + UINT_FIELDS
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        writer.writerows(zip(*(frames[c].tolist() for c in columns)))
+
+def read_frames(bag_path, topic=TELEMETRY_TOPIC):
+    """Decodes the telemetry records of a recorded bag."""
+    from bag_access import open_bag
+
+    with open_bag(bag_path) as reader:
+        blobs = [bytes(data) for _, _, data in reader.messages(topics=[topic])]
+    return decode_frames(blobs)
+
+class TelemetryListener:
+    """Collects /frame_timing records in a background rclpy executor while a run is in progress."""
+
+    def __init__(self, topic=TELEMETRY_TOPIC, depth=1000):
+        self.topic = topic
+        self.depth = depth
+        self.blobs = []
+        self.arrivals = []
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def _on_record(self, data):
+        # raw=True hands over the serialized CDR bytes, nothing is deserialized per message
+        with self.lock:
+            self.blobs.append(data)
+            self.arrivals.append(time.monotonic())
+
+    def start(self):
+        import rclpy
+        from rclpy.executors import SingleThreadedExecutor
+        from rclpy.qos import QoSProfile, ReliabilityPolicy
+        from rosidl_runtime_py.utilities import get_message
+
+        self.context = rclpy.Context()
+        rclpy.init(context=self.context)
+        self.node = rclpy.create_node("fastlio_telemetry_listener", context=self.context)
+        qos = QoSProfile(depth=self.depth, reliability=ReliabilityPolicy.RELIABLE)
+        self.node.create_subscription(get_message(TELEMETRY_TYPE), self.topic, self._on_record, qos, raw=True)
+        self.executor = SingleThreadedExecutor(context=self.context)
+        self.executor.add_node(self.node)
+        self.thread = threading.Thread(target=self.executor.spin, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        if self.thread is None:
+            return
+        self.executor.shutdown()
+        self.node.destroy_node()
+        self.context.try_shutdown()
+        self.thread.join(timeout=2)
+        self.thread = None
+
+    def count(self):
+        with self.lock:
+            return len(self.blobs)
+
+    def frames(self):
+        with self.lock:
+            blobs = list(self.blobs)
+        return decode_frames(blobs)
+
+    def arrival_times(self):
+        """time.monotonic() at which each record arrived, aligned with frames()."""
+        with self.lock:
+            return np.array(self.arrivals)
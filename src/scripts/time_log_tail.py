@@ -0,0 +1,184 @@
+# Purpose: Live tailer for FAST-LIO's streamed fast_lio_time_log.csv.
+#          The node appends whole rows and flushes about once per second; this follows the file with inotify
+#          (falling back to polling) and keeps live latency statistics while a run is in progress.
+#          Usage: python3 time_log_tail.py [TIME_LOG_CSV]
+
+import io
+import os
+import sys
+import time
+import ctypes
+import select
+import struct
+import threading
+from collections import deque
+import numpy as np
+
+TIME_LOG_COLUMNS = ["time_stamp", "math_time", "scan point size", "incremental time", "search time", "delete size",
+                    "delete time", "tree size st", "tree size end", "add point size", "preprocess time", "io_time"]
+MATH_COL = TIME_LOG_COLUMNS.index("math_time")
+IO_COL = TIME_LOG_COLUMNS.index("io_time")
+
+# Frames kept for the rolling percentiles
+WINDOW_FRAMES = 600
+POLL_INTERVAL = 0.5
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_CREATE = 0x00000100
+IN_NONBLOCK = 0o4000
+
+class Inotify:
+    """Minimal ctypes inotify watch on a directory (no extra packages); None-safe on other platforms."""
+
+    def __init__(self, directory):
+        libc = ctypes.CDLL("libc.so.6", use_errno=True)
+        self.fd = libc.inotify_init1(IN_NONBLOCK)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        # Watch the directory: the node recreates the file at startup, a file watch would go stale
+        wd = libc.inotify_add_watch(self.fd, os.fsencode(directory), IN_MODIFY | IN_CLOSE_WRITE | IN_CREATE)
+        if wd < 0:
+            os.close(self.fd)
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {directory}")
+
+    def wait(self, name, timeout):
+        """Blocks until `name` in the watched directory changes (True) or the timeout expires (False)."""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return False
+        data = os.read(self.fd, 65536)
+        changed, offset = False, 0
+        while offset < len(data):
+            _, _, _, length = struct.unpack_from("iIII", data, offset)
+            event_name = data[offset + 16:offset + 16 + length].rstrip(b"\0")
+            changed |= event_name == os.fsencode(name)
+            offset += 16 + length
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+class TimeLogTailer:
+    """Follows a growing time log in a background thread and keeps running / rolling latency stats."""
+
+    def __init__(self, path, on_rows=None):
+        self.path = os.path.abspath(path)
+        self.on_rows = on_rows
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()
+        self.thread = None
+        self._reset()
+
+    def _reset(self):
+        self.offset = 0
+        self.partial = b""
+        self.header_seen = False
+        self.frames = 0
+        self.total_sum = 0.0
+        self.total_max = 0.0
+        self.window = deque(maxlen=WINDOW_FRAMES)
+
+    def read_new_rows(self):
+        """Reads whatever complete rows were appended since the last call, as an (N, 12) array."""
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return None
+        if size < self.offset:
+            # The node was restarted and truncated the file
+            with self.lock:
+                self._reset()
+        if size == self.offset:
+            return None
+
+        with open(self.path, "rb") as f:
+            f.seek(self.offset)
+            chunk = f.read(size - self.offset)
+        self.offset += len(chunk)
+
+        data = self.partial + chunk
+        end = data.rfind(b"\n") + 1
+        # Keep an unterminated last line for the next round
+        self.partial = data[end:]
+        lines = data[:end]
+        if not self.header_seen and lines:
+            lines = lines[lines.find(b"\n") + 1:]
+            self.header_seen = True
+        if not lines.strip():
+            return None
+        return np.loadtxt(io.BytesIO(lines), delimiter=",", ndmin=2)
+
+    def _consume(self, rows):
+        total = rows[:, MATH_COL] + rows[:, IO_COL]
+        with self.lock:
+            self.frames += len(rows)
+            self.total_sum += float(total.sum())
+            self.total_max = max(self.total_max, float(total.max()))
+            self.window.extend(total.tolist())
+        if self.on_rows:
+            self.on_rows(rows)
+
+    def stats(self):
+        """Live frame count, mean / max over the run and rolling p50 / p99 (ms) of math_time + io_time."""
+        with self.lock:
+            window = np.fromiter(self.window, dtype=float)
+            frames, total_sum, total_max = self.frames, self.total_sum, self.total_max
+        p50, p99 = np.percentile(window, [50, 99]) * 1000 if len(window) else (0.0, 0.0)
+        return {
+            "frames": frames,
+            "mean_ms": total_sum / frames * 1000 if frames else 0.0,
+            "max_ms": total_max * 1000,
+            "p50_ms": float(p50),
+            "p99_ms": float(p99),
+        }
+
+    def _run(self):
+        directory, name = os.path.split(self.path)
+        os.makedirs(directory, exist_ok=True)
+        try:
+            watch = Inotify(directory)
+        except OSError:
+            watch = None
+
+        while not self.stop_event.is_set():
+            rows = self.read_new_rows()
+            if rows is not None and len(rows):
+                self._consume(rows)
+            if watch:
+                # Wake up on writes to the log; the timeout only bounds how long stop() can take
+                watch.wait(name, POLL_INTERVAL)
+            else:
+                time.sleep(POLL_INTERVAL)
+
+        # Pick up the rows flushed on shutdown
+        rows = self.read_new_rows()
+        if rows is not None and len(rows):
+            self._consume(rows)
+        if watch:
+            watch.close()
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join()
+
+def format_stats(s):
+    return f"Frames: {s['frames']} | Lat avg {s['mean_ms']:.1f} p50 {s['p50_ms']:.1f} p99 {s['p99_ms']:.1f} max {s['max_ms']:.1f} ms"
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else "/root/ros2_ws/src/FAST_LIO_ROS2/Log/fast_lio_time_log.csv"
+    tailer = TimeLogTailer(path).start()
+    try:
+        while True:
+            sys.stdout.write("\r" + format_stats(tailer.stats()))
+            sys.stdout.flush()
+            time.sleep(1)
+    except KeyboardInterrupt:
+        tailer.stop()
+        print()
@@ -0,0 +1,226 @@
+# Purpose: Per-frame timeline of a run: telemetry stage timings, C++ time log columns, per-frame resources,
+#          process CPU / RSS at the frame and pose, speed and angular rate from the trajectory, joined on the LiDAR
+#          frame timestamp into one table saved as compressed .npz columns (timeline.npz) next to the run.
+#          Tables of many runs are loaded together for spike forensics:
+#          Usage: python3 timeline.py RUN_DIR [RUN_DIR ...] --where "total_ms > 50"
+#                     [--columns scan_points tree_size_end speed_mps cpu_percent] [--csv OUT]
+
+import sys
+import argparse
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+TIMELINE_NAME = "timeline.npz"
+# Poses are matched to frames by their stamp (lidar_end_time) within this window
+POSE_TOLERANCE = 0.05
+# Without lidar_end_time (time log only) the frame start is matched, one scan period earlier
+POSE_TOLERANCE_START = 0.2
+# Process CPU % at a frame is averaged over this window before the frame's record arrived
+CPU_WINDOW = 1.0
+DEFAULT_WHERE = "total_ms > 50"
+# run_full_analysis.py's latency_data.csv names for the stdout columns (match, solve and total are running means)
+# Per-frame latency of runs without telemetry, in order of preference, mapped onto total_ms (same t5 - t0 quantity)
+TOTAL_FALLBACKS = ["log_math_ms", "stage_ave_total_ms"]
+LATENCY_DATA_COLUMNS = {"match": "ave_match", "solve": "ave_solve", "ICP": "ave_ICP", "total": "ave_total"}
+DEFAULT_COLUMNS = ["frame_time", "total_ms", "scan_points", "down_points", "tree_size_end", "speed_mps",
+                   "angular_rate_dps", "cpu_percent", "rss_mb"]
+
+def _key(t):
+    # Frame timestamps printed with 8 decimals (time log) vs float64 (telemetry): join on whole microseconds
+    return np.rint(np.asarray(t, dtype=np.float64) * 1e6).astype(np.int64)
+
+def _ms_name(column):
+    """'search time' -> 'search_ms', 'scan point size' -> 'scan_point_size'."""
+    name = column.strip().replace(" ", "_")
+    return name[:-len("time")].rstrip("_") + "_ms" if name.endswith("time") else name
+
+def trajectory_rates(tum):
+    """Per pose of an (N, 8) TUM array: speed (m/s) and angular rate (deg/s) since the previous pose (NaN first)."""
+    tum = np.asarray(tum, dtype=np.float64)
+    speed = np.full(len(tum), np.nan)
+    rate = np.full(len(tum), np.nan)
+    if len(tum) < 2:
+        return speed, rate
+    dt = np.diff(tum[:, 0])
+    step = np.linalg.norm(np.diff(tum[:, 1:4], axis=0), axis=1)
+    # Rotation angle between consecutive quaternions (x y z w)
+    dots = np.abs(np.sum(tum[1:, 4:8] * tum[:-1, 4:8], axis=1))
+    angle = np.degrees(2 * np.arccos(np.clip(dots, 0.0, 1.0)))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        speed[1:] = np.where(dt > 0, step / dt, np.nan)
+        rate[1:] = np.where(dt > 0, angle / dt, np.nan)
+    return speed, rate
+
+def telemetry_columns(df):
+    """frame_timing.csv (telemetry.save_frames_csv): durations in ms, counts as they are."""
+    from telemetry import FLOAT_FIELDS, UINT_FIELDS
+
+    out = pd.DataFrame({"frame_time": df["lidar_beg_time"], "lidar_end_time": df["lidar_end_time"]})
+    for c in FLOAT_FIELDS[2:]:
+        out[c.removesuffix("_time") + "_ms"] = df[c] * 1000
+    for c in UINT_FIELDS:
+        out[c] = df[c]
+    return out
+
+def time_log_columns(df):
+    """fast_lio_time_log.csv: time_stamp is lidar_beg_time; the other columns get a log_ prefix, times in ms."""
+    out = pd.DataFrame({"frame_time": df["time_stamp"]})
+    for c in df.columns:
+        if c == "time_stamp":
+            continue
+        name = _ms_name(c)
+        out["log_" + name] = df[c] * 1000 if name.endswith("_ms") else df[c]
+    return out
+
+def stage_columns(df):
+    """Benchmark *_data.csv / latency_data.csv (stdout stage timings): per-frame ms, no timestamps."""
+    from compare_results import frames_from_benchmark
+
+    df = frames_from_benchmark(df.rename(columns=LATENCY_DATA_COLUMNS))
+    return pd.DataFrame({f"stage_{c}_ms": df[c] * 1000 for c in df.columns})
+
+def process_at_frames(run_dir, arrivals):
+    """Process CPU % over the CPU_WINDOW before each record arrived, and RSS (MB) at arrival."""
+    import proc_sampler
+
+    samples, _ = proc_sampler.load_samples(run_dir / "proc_samples.bin", run_dir / "proc_samples.json")
+    if len(samples) < 2:
+        return None
+    t = samples["t"]
+    busy = samples["cpu_ns"].sum(axis=1).astype(np.float64) / 1e9
+    start = np.maximum(arrivals - CPU_WINDOW, t[0])
+    span = arrivals - start
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cpu = np.where(span > 0, (np.interp(arrivals, t, busy) - np.interp(start, t, busy)) / span * 100, np.nan)
+    rss = np.interp(arrivals, t, samples["rss"].astype(np.float64)) / (1024 * 1024)
+    outside = (arrivals < t[0]) | (arrivals > t[-1])
+    cpu[outside] = np.nan
+    rss[outside] = np.nan
+    return cpu, rss
+
+def _find(run_dir, *patterns):
+    for pattern in patterns:
+        found = sorted(run_dir.glob(pattern))
+        if found:
+            return found[0]
+    return None
+
+def build_timeline(run_dir):
+    """Joins everything a run directory holds into one per-frame DataFrame (columns missing inputs are absent)."""
+    run_dir = Path(run_dir)
+    telemetry_csv = _find(run_dir, "frame_timing.csv", "*_frame_timing.csv")
+    time_log_csv = _find(run_dir, "fast_lio_time_log.csv")
+    stages_csv = _find(run_dir, "*_data.csv")
+
+    table = telemetry_columns(pd.read_csv(telemetry_csv)) if telemetry_csv else None
+    if time_log_csv:
+        log = time_log_columns(pd.read_csv(time_log_csv, skipinitialspace=True))
+        if table is None:
+            table = log
+        else:
+            log["key"] = _key(log.pop("frame_time"))
+            table["key"] = _key(table["frame_time"])
+            table = table.merge(log.drop_duplicates("key"), on="key", how="outer")
+            table["frame_time"] = table["frame_time"].fillna(table["key"] / 1e6)
+            table = table.drop(columns="key").sort_values("frame_time", kind="mergesort").reset_index(drop=True)
+    if stages_csv and table is None:
+        # The stdout line has no timestamp, so it is only used when nothing timestamped exists: a positional join
+        # would shift every later frame after a missing one, and with telemetry it is the same data again
+        table = stage_columns(pd.read_csv(stages_csv, skipinitialspace=True))
+    if table is None:
+        raise FileNotFoundError(f"No frame_timing.csv, fast_lio_time_log.csv or *_data.csv in {run_dir}")
+
+    resources_csv = _find(run_dir, "frame_resources.csv")
+    if resources_csv and "frame_time" in table:
+        res = pd.read_csv(resources_csv).drop(columns=["seq", "total_time"], errors="ignore")
+        res["key"] = _key(res.pop("lidar_beg_time"))
+        table["key"] = _key(table["frame_time"])
+        table = table.merge(res.drop_duplicates("key"), on="key", how="left").drop(columns="key")
+        if "arrival" in table and (run_dir / "proc_samples.json").exists():
+            at_frames = process_at_frames(run_dir, table["arrival"].to_numpy())
+            if at_frames is not None:
+                table["cpu_percent"], table["rss_mb"] = at_frames
+
+    tum_path = _find(run_dir, "*_trajectory.tum", "*.tum")
+    if tum_path and "frame_time" in table:
+        tum = np.loadtxt(tum_path, ndmin=2)
+        if len(tum):
+            speed, rate = trajectory_rates(tum)
+            poses = pd.DataFrame({"pose_time": tum[:, 0], "x": tum[:, 1], "y": tum[:, 2], "z": tum[:, 3],
+                                  "speed_mps": speed, "angular_rate_dps": rate}).sort_values("pose_time")
+            # Odometry is stamped with lidar_end_time; the time log only has the frame start
+            stamp = table["lidar_end_time"] if "lidar_end_time" in table else table["frame_time"]
+            order = np.argsort(stamp.to_numpy(), kind="mergesort")
+            left = pd.DataFrame({"row": order, "stamp": stamp.to_numpy()[order]}).dropna()
+            joined = pd.merge_asof(left, poses, left_on="stamp", right_on="pose_time", direction="nearest",
+                                   tolerance=POSE_TOLERANCE if "lidar_end_time" in table else POSE_TOLERANCE_START)
+            joined = joined.set_index("row").drop(columns=["stamp", "pose_time"])
+            table = table.join(joined)
+
+    table.insert(0, "frame", np.arange(len(table)))
+    return with_total(table)
+
+def with_total(table):
+    """Fills total_ms from the time log or stdout stage latency where telemetry is missing (--where uses it)."""
+    for column in TOTAL_FALLBACKS:
+        if column in table:
+            table["total_ms"] = table[column] if "total_ms" not in table else table["total_ms"].fillna(table[column])
+    return table
+
+def save_timeline(table, run_dir):
+    path = Path(run_dir) / TIMELINE_NAME
+    np.savez_compressed(path, **{c: table[c].to_numpy(dtype=np.float64 if table[c].dtype == object else None)
+                                 for c in table.columns})
+    return path
+
+def load_timeline(run_dir):
+    """The run's timeline, rebuilt when timeline.npz is missing or older than any of its inputs."""
+    run_dir = Path(run_dir)
+    path = run_dir / TIMELINE_NAME
+    inputs = [p for p in run_dir.iterdir() if p.suffix in (".csv", ".tum", ".bin", ".json")]
+    if path.exists() and all(p.stat().st_mtime <= path.stat().st_mtime for p in inputs):
+        with np.load(path, allow_pickle=False) as data:
+            # Timelines saved before total_ms was filled in get it here
+            return with_total(pd.DataFrame({name: data[name] for name in data.files}))
+    table = build_timeline(run_dir)
+    save_timeline(table, run_dir)
+    return table
+
+def load_timelines(run_dirs):
+    """Timelines of several runs in one table, with a 'run' column naming the directory."""
+    tables = []
+    for run_dir in run_dirs:
+        try:
+            tables.append(load_timeline(run_dir).assign(run=Path(run_dir).name))
+        except (OSError, ValueError) as e:
+            print(f"Skipping {run_dir}: {e}")
+    return pd.concat(tables, ignore_index=True) if tables else pd.DataFrame()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query per-frame timelines of one or more runs.")
+    parser.add_argument("runs", nargs="+", type=Path, help="Run directories (full analysis / benchmark results)")
+    parser.add_argument("--where", default=DEFAULT_WHERE, help="pandas query over the timeline columns ('' = all frames)")
+    parser.add_argument("--columns", nargs="+", default=DEFAULT_COLUMNS, help="Columns to show (missing ones are skipped)")
+    parser.add_argument("--csv", type=Path, help="Write the selected frames (all columns) to this CSV")
+    args = parser.parse_args()
+
+    table = load_timelines([r for r in args.runs if r.is_dir()])
+    if table.empty:
+        print("No timelines found")
+        sys.exit(1)
+    try:
+        selected = table.query(args.where) if args.where else table
+    except pd.errors.UndefinedVariableError as e:
+        print(f"Cannot evaluate --where '{args.where}': {e}")
+        print("Available columns: " + ", ".join(table.columns))
+        sys.exit(1)
+    print(f"{len(selected)} of {len(table)} frames in {table['run'].nunique()} run(s) match '{args.where}'")
+    if args.csv:
+        selected.to_csv(args.csv, index=False)
+        print(f"Saved to {args.csv}")
+    if selected.empty:
+        sys.exit(0)
+    columns = ["run", "frame"] + [c for c in args.columns if c in selected.columns and c not in ("run", "frame")]
+    with pd.option_context("display.max_rows", 200, "display.width", 200):
+        print(selected[columns].to_string(index=False, float_format=lambda v: f"{v:.3f}"))